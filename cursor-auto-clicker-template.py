@@ -18,464 +18,3195 @@ Cursor Auto Accept - 全屏图像模板匹配监听程序
 创建时间: 2024
 """
 
-import cv2
-import numpy as np
-import pyautogui
-import win32gui
-import win32con
-import win32api
 import time
 import threading
 import logging
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
+import logging.handlers
+import queue
 import os
+import sys
 import json
-from datetime import datetime
+import argparse
+import bisect
+import hashlib
+import importlib
+import shutil
+import signal
+import socket
+import struct
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+try:
+    from multiprocessing import shared_memory  # Python 3.8+
+except ImportError:
+    shared_memory = None
+
+
+class LazyModule:
+    """延迟导入的模块代理：首次访问属性时才导入模块，之后的属性读写都转发给已导入的模块
+    
+    代理自身只保存模块名和模块对象（通过 object.__getattribute__ 读取，不经过转发），
+    不复制模块字典，模块之后新增或修改的属性也能读到。
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = object.__getattribute__(self, '_module')
+        if module is None:
+            module = importlib.import_module(object.__getattribute__(self, '_name'))
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def available(self):
+        """模块能否导入（可选依赖在无图形界面的环境中可能导入失败）"""
+        try:
+            self._load()
+            return True
+        except Exception:
+            return False
+
+
+# 重量级依赖延迟导入：窗口先显示，OpenCV/NumPy 在后台解码模板时才加载；
+# 无界面模式和基准测试不会加载 Tkinter/PIL
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+tk = LazyModule('tkinter')
+ttk = LazyModule('tkinter.ttk')
+filedialog = LazyModule('tkinter.filedialog')
+messagebox = LazyModule('tkinter.messagebox')
+Image = LazyModule('PIL.Image')
+ImageTk = LazyModule('PIL.ImageTk')
+ImageDraw = LazyModule('PIL.ImageDraw')
+
+# 以下依赖只在 Windows 桌面环境可用；无图形界面的 Linux 上（回放截图、基准测试）允许缺失
+pyautogui = LazyModule('pyautogui')
+win32gui = LazyModule('win32gui')
+win32con = LazyModule('win32con')
+win32api = LazyModule('win32api')
+
+# 启动时不应加载的重量级模块（--benchmark-startup 检查）
+HEAVY_MODULES = ('cv2', 'numpy', 'tkinter', 'PIL', 'pyautogui', 'win32gui', 'win32con', 'win32api')
+
+
+def enable_dpi_awareness():
+    """声明进程 DPI 感知，使截图和点击使用物理像素坐标
+    
+    pyautogui 在 Windows 上导入时会做同样的声明；改为延迟导入后需要在创建窗口之前显式调用，
+    否则窗口和截图坐标会在 pyautogui 首次导入时发生变化。
+    """
+    if sys.platform != 'win32':
+        return
+    try:
+        import ctypes
+        ctypes.windll.user32.SetProcessDPIAware()
+    except Exception:
+        pass
+
+
+# 匹配通道模式 -> 模板字典中对应的图像键
+MATCH_MODES = {
+    'color': 'image',   # BGR 三通道（原始方式）
+    'gray': 'gray',     # 单通道灰度，匹配计算量约为彩色的 1/3
+    'edge': 'edge',     # 边缘图，对主题配色变化不敏感
+}
+
+
+def edge_map(gray):
+    """边缘图：Canny 边缘稍作膨胀，容忍抗锯齿造成的 1 像素偏差"""
+    edges = cv2.Canny(gray, 50, 150)
+    return cv2.dilate(edges, np.ones((3, 3), dtype=np.uint8))
+
+
+def template_variants(image, mask=None):
+    """模板加载时一次性预处理出各匹配通道的版本；有遮罩时一并放入（各通道共用同一遮罩）"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    variants = {'gray': gray, 'edge': edge_map(gray)}
+    if mask is not None:
+        variants['mask'] = mask
+    return variants
+
+
+# 遮罩旁路文件后缀：与模板同名的 <名称>.mask.png，白色为参与匹配的区域，黑色为忽略的可变区域
+MASK_SUFFIX = '.mask.png'
+
+
+def mask_path_for(path):
+    """模板对应的遮罩旁路文件路径"""
+    return os.path.splitext(path)[0] + MASK_SUFFIX
+
+
+def is_mask_file(path):
+    """是否为遮罩旁路文件（不能作为模板加载）"""
+    return path.lower().endswith(MASK_SUFFIX)
+
+
+def trim_masked(image, mask):
+    """遮罩二值化（255 参与匹配，0 忽略）并裁掉四周完全忽略的边缘，返回 (图像, 遮罩)；
+    遮罩全部参与匹配或全部忽略时返回的遮罩为 None（按普通模板匹配）"""
+    if mask is None:
+        return image, None
+    mask = np.where(mask >= 128, 255, 0).astype(np.uint8)
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return image, None
+    x, y, w, h = cv2.boundingRect(points)
+    image = np.ascontiguousarray(image[y:y + h, x:x + w])
+    mask = np.ascontiguousarray(mask[y:y + h, x:x + w])
+    return image, (None if mask.all() else mask)
+
+
+def decode_template(data, mask_data=None):
+    """解码模板图片，返回 (BGR 图像, 遮罩)；遮罩来自 PNG 透明通道和/或遮罩旁路文件（两者都有时取交集），
+    无法解码时图像为 None"""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None, None
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255.0 / np.iinfo(image.dtype).max)
+    
+    mask = None
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        mask = image[:, :, 3]
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    
+    if mask_data is not None:
+        mask_image = cv2.imdecode(np.frombuffer(mask_data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if mask_image is not None and mask_image.shape == image.shape[:2]:
+            mask = mask_image if mask is None else cv2.min(mask, mask_image)
+    return trim_masked(image, mask)
+
+
+def read_template_file(path, data=None):
+    """读取模板图片（data 为已读取的文件内容）和它的遮罩旁路文件，返回 (BGR 图像, 遮罩)"""
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    mask_data = None
+    mask_path = mask_path_for(path)
+    if os.path.exists(mask_path):
+        with open(mask_path, 'rb') as f:
+            mask_data = f.read()
+    return decode_template(data, mask_data)
+
+
+def match_template(image, template, mask=None):
+    """TM_CCOEFF_NORMED 匹配得分图；有遮罩时只比较遮罩内的像素
+    
+    遮罩匹配在与模板相关性无法定义的平坦区域会得到 inf/nan，统一置为 0，避免被 minMaxLoc 当成最高分。
+    """
+    if mask is None:
+        return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+    result[~np.isfinite(result)] = 0
+    return result
+
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_NO_RECENT_TEXT = "📅 24小时内没有日志记录\n\n💡 提示：可以取消勾选上方的'只保留24小时日志'来查看所有日志"
+
+
+def parse_log_time(line):
+    """解析日志行开头的时间戳（格式：2024-12-09 15:30:25,123），续行等无时间戳的行返回 None"""
+    if len(line) > 19 and line[4] == '-' and line[7] == '-':
+        try:
+            return datetime.strptime(line[:19], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+    return None
+
+
+def drop_lines_before(text, cutoff):
+    """丢弃 cutoff 之前的日志行：只解析到第一条不早于 cutoff 的日志为止"""
+    lines = text.splitlines(True)
+    for index, line in enumerate(lines):
+        log_time = parse_log_time(line)
+        if log_time is not None and log_time >= cutoff:
+            return ''.join(lines[index:])
+    return ''
+
+
+def read_log_text(log_file, start, end):
+    """读取日志文件 [start, end) 字节区间；start 不在行首时丢弃不完整的首行，返回 (文本, 实际起始偏移)"""
+    with open(log_file, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+            start = f.tell()
+        data = f.read(max(0, end - start))
+    return data.decode('utf-8', errors='replace'), start
+
+
+def log_segments(log_file):
+    """日志文件及其轮转备份（log.N … log.1, log，从旧到新），返回 [(路径, 起始偏移, 大小)]
+    
+    起始偏移是把各文件按时间顺序首尾相接后的全局偏移，查看器用它把备份和当前日志当作一个连续的日志读取。
+    """
+    paths = [log_file]
+    number = 1
+    while os.path.exists("{}.{}".format(log_file, number)):
+        paths.insert(0, "{}.{}".format(log_file, number))
+        number += 1
+    
+    segments = []
+    offset = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0  # 文件不存在，或在枚举之后被轮转/删除
+        segments.append((path, offset, size))
+        offset += size
+    return segments
+
+
+def read_log_range(segments, start, end):
+    """按全局偏移读取 [start, end) 区间（可跨越多个轮转文件），start 不在行首时丢弃不完整的首行，返回 (文本, 实际起始偏移)"""
+    parts = []
+    actual_start = None
+    for path, offset, size in segments:
+        local_start, local_end = max(start - offset, 0), min(end - offset, size)
+        if local_start >= local_end:
+            continue
+        try:
+            text, local_start = read_log_text(path, local_start, local_end)
+        except OSError:
+            continue  # 文件在枚举之后被轮转或删除
+        if actual_start is None:
+            actual_start = offset + local_start
+        parts.append(text)
+    return ''.join(parts), (actual_start if actual_start is not None else end)
+
+
+def log_offset_for(segments, timestamp, log_index):
+    """返回不晚于 timestamp 的最后一个检查点的全局偏移：从最新的文件往前找第一个检查点不晚于 timestamp 的文件
+    
+    当前日志使用 log_index，轮转备份使用随备份一起轮转的索引文件（缺失时扫描一次重建）。
+    """
+    for path, offset, size in reversed(segments):
+        index = log_index if path == log_index.log_file else LogIndex(path)
+        first = index.first_timestamp()
+        if first is not None and first <= timestamp:
+            return offset + index.offset_for(timestamp)
+    return 0
+
+
+class LogIndex:
+    """日志索引：旁路文件（日志文件名 + .idx）记录 时间戳 -> 字节偏移 的检查点
+    
+    写日志时每隔 interval 秒记录一次检查点，按时间过滤日志时直接定位到对应偏移，
+    不再逐行解析整个日志文件。索引缺失或与日志文件不一致时扫描一次日志重建。
+    """
+
+    def __init__(self, log_file, interval=60):
+        self.log_file = log_file
+        self.index_file = log_file + '.idx'
+        self.interval = interval
+        self._entries = None        # [(时间戳, 字节偏移)]，首次使用时加载
+        self._last_time = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """加载索引文件（调用方持有锁），偏移超出日志大小说明日志被清空过，需要重建"""
+        size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        entries = []
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        try:
+                            entries.append((float(parts[0]), int(parts[1])))
+                        except ValueError:
+                            pass
+        
+        if size and (not entries or entries[-1][1] > size):
+            entries = self._rebuild()
+        elif not size:
+            entries = []
+        self._entries = entries
+        self._last_time = entries[-1][0] if entries else None
+
+    def _rebuild(self):
+        """扫描日志文件重建索引：每分钟的第一条日志记录一个检查点"""
+        entries = []
+        offset = 0
+        last_minute = None
+        with open(self.log_file, 'rb') as f:
+            for raw in f:
+                minute = raw[:16]
+                if minute != last_minute and len(raw) > 19 and raw[4:5] == b'-' and raw[7:8] == b'-':
+                    log_time = parse_log_time(raw[:19].decode('ascii', errors='replace') + ' ')
+                    if log_time is not None:
+                        entries.append((log_time.timestamp(), offset))
+                        last_minute = minute
+                offset += len(raw)
+        
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            f.writelines("{:.3f} {}\n".format(timestamp, position) for timestamp, position in entries)
+        return entries
+
+    def record(self, timestamp, offset):
+        """写日志前调用：距上个检查点超过 interval 秒时记录新的检查点"""
+        if self._last_time is not None and timestamp - self._last_time < self.interval:
+            return
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            if self._last_time is not None and timestamp - self._last_time < self.interval:
+                return
+            self._entries.append((timestamp, offset))
+            self._last_time = timestamp
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write("{:.3f} {}\n".format(timestamp, offset))
+
+    def first_timestamp(self):
+        """第一个检查点的时间戳，日志为空时返回 None"""
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            return self._entries[0][0] if self._entries else None
+
+    def reset(self):
+        """日志文件轮转或清空后丢弃索引"""
+        with self._lock:
+            self._entries = []
+            self._last_time = None
+            try:
+                os.remove(self.index_file)
+            except OSError:
+                pass
+
+    def offset_for(self, timestamp):
+        """返回不晚于 timestamp 的最后一个检查点的字节偏移（从该位置开始读取即可覆盖 timestamp 之后的全部日志）"""
+        with self._lock:
+            size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+            if self._entries is None or (self._entries and self._entries[-1][1] > size):
+                self._load()
+            position = bisect.bisect_right([entry[0] for entry in self._entries], timestamp)
+            return self._entries[position - 1][1] if position else 0
+
+
+class IndexedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """按大小轮转的文件日志处理器，写入时同步维护日志索引；轮转时索引文件随日志一起改名（log.idx -> log.1.idx）"""
+
+    def __init__(self, filename, log_index, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.log_index = log_index
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.log_index.record(record.created, self.stream.tell())
+            logging.FileHandler.emit(self, record)
+        except Exception:
+            self.handleError(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.backupCount > 0:
+            # 与日志文件的改名顺序一致；没有索引的文件删掉目标位置的旧索引，避免备份用上别的文件的索引
+            sources = ["{}.{}.idx".format(self.baseFilename, number) for number in range(1, self.backupCount)]
+            sources.insert(0, self.log_index.index_file)
+            for number in range(self.backupCount, 0, -1):
+                source = sources[number - 1]
+                target = "{}.{}.idx".format(self.baseFilename, number)
+                if os.path.exists(source):
+                    os.replace(source, target)
+                elif os.path.exists(target):
+                    os.remove(target)
+        self.log_index.reset()
+
+
+class BufferedLogHandler(logging.Handler):
+    """调用线程的日志处理器：只合并消息参数后追加到 deque（无锁，不唤醒后台线程）
+    
+    logging.handlers.QueueHandler 每条日志都复制记录并通过条件变量唤醒监听线程，
+    监听线程随即和调用线程争抢 GIL，写日志反而比同步写文件更慢；这里由 BatchLogWriter 定时批量取出。
+    """
+
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.records.append(record)
+        except Exception:
+            self.handleError(record)
+
+
+class BatchLogWriter:
+    """后台日志写入线程：每隔 flush_interval 秒取出缓冲的全部日志记录，交给文件/控制台处理器写入
+    
+    接口与 QueueListener 一致：start() 启动，stop() 写完剩余日志后退出。
+    """
+
+    def __init__(self, records, *handlers, flush_interval=0.1):
+        self.records = records
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.drain()
+        self.drain()
+
+    def drain(self):
+        """写入缓冲中的全部日志记录（按处理器级别过滤）"""
+        while True:
+            try:
+                record = self.records.popleft()
+            except IndexError:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        """结束后台线程并写完剩余日志"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.drain()
+
+
+def create_async_file_logging(log_file, max_bytes=5 * 1024 * 1024, backup_count=3, console=True, log_index=None):
+    """创建异步文件日志：调用线程只把日志记录放入缓冲，由后台线程定时批量写入按大小轮转的日志文件
+    
+    传入 log_index 时写入过程中同步维护日志索引（在后台线程中完成）。
+    返回 (缓冲处理器, 后台写入器, 文件处理器)，写入器需要调用 start()，退出前调用 stop() 写完剩余日志。
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    if log_index is not None:
+        file_handler = IndexedRotatingFileHandler(
+            log_file, log_index, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+    
+    records = deque()
+    writer = BatchLogWriter(records, *handlers)
+    
+    # 缓冲处理器只合并消息参数，时间和级别由文件/控制台处理器格式化
+    buffer_handler = BufferedLogHandler(records)
+    buffer_handler.setFormatter(logging.Formatter('%(message)s'))
+    return buffer_handler, writer, file_handler
+
+
+class UiLogSink:
+    """界面日志缓冲：任意线程无锁追加日志行（deque 的 append/popleft 是线程安全的），
+    由界面线程定时批量取出写入 Tk 文本框；界面来不及刷新时只保留最新的 maxlen 行"""
+
+    def __init__(self, maxlen=1000):
+        self._lines = deque(maxlen=maxlen)
+
+    def append(self, line):
+        self._lines.append(line)
+
+    def drain(self):
+        """取出全部待显示的日志行"""
+        lines = []
+        while True:
+            try:
+                lines.append(self._lines.popleft())
+            except IndexError:
+                return lines
+
+
+class LogViewer:
+    """增量日志查看器：通过日志索引定位起始位置，刷新时只读取新追加的内容，滚动到顶部时再加载更早的内容
+    
+    轮转备份（log.1 … log.N）和当前日志按时间顺序当作一个连续的日志，偏移均为全局偏移（见 log_segments）。
+    """
+
+    CHUNK_BYTES = 256 * 1024  # 每次加载的最大字节数
+
+    def __init__(self, text_widget, log_file, log_index, only_24h_var):
+        self.text_widget = text_widget
+        self.log_file = log_file
+        self.log_index = log_index
+        self.only_24h_var = only_24h_var
+        self.start_offset = 0   # 已加载内容的起始偏移
+        self.end_offset = 0     # 已加载内容的结束偏移
+        self.min_offset = 0     # 可加载的最早偏移（24小时过滤时为24小时前的检查点）
+        self.cutoff = None      # 24小时过滤的时间下限
+        self.current_size = 0   # 上次读取时当前日志文件的大小（变小说明日志已轮转或被清空）
+        self.segments = []
+        self._loading = False
+
+    def _insert(self, index, text):
+        """插入文本（只读文本框临时解除只读）"""
+        state = self.text_widget.cget('state')
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.insert(index, text)
+        self.text_widget.config(state=state)
+
+    def attach_scrollbar(self, scrollbar):
+        """关联滚动条：滚动到顶部时自动加载更早的日志"""
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(first) <= 0.0 and self.start_offset > self.min_offset and not self._loading:
+                self._loading = True
+                self.text_widget.after_idle(self.load_earlier)
+        self.text_widget.configure(yscrollcommand=on_scroll)
+
+    def reload(self):
+        """重新加载：24小时过滤时从索引定位的偏移开始，最多加载最后 CHUNK_BYTES 字节"""
+        state = self.text_widget.cget('state')
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.config(state=state)
+        
+        self.segments = log_segments(self.log_file)
+        path, offset, self.current_size = self.segments[-1]
+        size = offset + self.current_size
+        self.cutoff = None
+        self.min_offset = 0
+        if self.only_24h_var.get():
+            self.cutoff = datetime.now() - timedelta(hours=24)
+            self.min_offset = log_offset_for(self.segments, self.cutoff.timestamp(), self.log_index)
+        
+        text, self.start_offset = read_log_range(self.segments, max(self.min_offset, size - self.CHUNK_BYTES), size)
+        if self.cutoff is not None and self.start_offset <= self.min_offset:
+            text = drop_lines_before(text, self.cutoff)
+        self.end_offset = size
+        
+        if self.cutoff is not None and not text:
+            text = LOG_NO_RECENT_TEXT
+        self._insert(tk.END, text)
+        self.text_widget.see(tk.END)
+
+    def refresh(self):
+        """增量刷新：只读取上次读取之后追加的内容；日志被清空、轮转或删除时重新加载"""
+        try:
+            current_size = os.path.getsize(self.log_file)
+        except OSError:
+            # 日志文件被删除，或正在轮转（当前日志已改名、新文件尚未创建）
+            self.reload()
+            return
+        if current_size < self.current_size:
+            self.reload()
+            return
+        if current_size > self.current_size:
+            if self.text_widget.get(1.0, "1.end") == LOG_NO_RECENT_TEXT.split('\n')[0]:
+                self.reload()
+                return
+            path, offset, size = self.segments[-1]
+            self.segments[-1] = (path, offset, current_size)
+            text, start = read_log_range(self.segments, self.end_offset, offset + current_size)
+            self.current_size = current_size
+            self.end_offset = offset + current_size
+            self._insert(tk.END, text)
+            self.text_widget.see(tk.END)
+
+    def load_earlier(self):
+        """向前加载一段更早的日志，插入到顶部并保持当前可见位置"""
+        try:
+            if self.start_offset <= self.min_offset:
+                return
+            text, start = read_log_range(self.segments, max(self.min_offset, self.start_offset - self.CHUNK_BYTES), self.start_offset)
+            if self.cutoff is not None and start <= self.min_offset:
+                text = drop_lines_before(text, self.cutoff)
+            self.start_offset = start
+            if text:
+                self._insert("1.0", text)
+                self.text_widget.yview("{}.0".format(text.count('\n') + 1))
+        finally:
+            self._loading = False
+
+
+class DetectionStats:
+    """检测统计：记录截图次数、模板匹配次数和命中次数，用于计算每秒速率"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """重置计数（每次开始监听时调用）"""
+        self.started_at = time.time()
+        self.captures = 0
+        self.matches = 0
+        self.hits = 0
+        self.skipped = 0   # 画面未变化而跳过匹配的帧数
+        self.partial = 0   # 只在变化区域内匹配的帧数
+
+    def record_capture(self):
+        self.captures += 1
+
+    def record_skip(self):
+        self.skipped += 1
+
+    def record_partial(self):
+        self.partial += 1
+
+    def record_match(self, hit=False):
+        self.matches += 1
+        if hit:
+            self.hits += 1
+
+    def rates(self):
+        """返回 (截图帧/秒, 模板匹配次/秒)"""
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return self.captures / elapsed, self.matches / elapsed
+
+    def summary(self):
+        """生成统计摘要文本"""
+        capture_rate, match_rate = self.rates()
+        text = "截图: {:.1f}帧/秒 | 匹配: {:.1f}次/秒 | 命中: {}".format(capture_rate, match_rate, self.hits)
+        if self.skipped or self.partial:
+            text += " | 静止跳过: {:.0%} | 局部匹配: {:.0%}".format(
+                self.skipped / max(self.captures, 1), self.partial / max(self.captures, 1))
+        return text
+
+
+class TemplateTracker:
+    """逐模板检测状态机和结果缓存
+
+    状态：absent（未出现）→ appearing（连续命中不足 confirm_frames 帧）→ confirmed（已确认，可以点击）
+    → clicked（已点击）→ cooldown（冷却中，跳过该模板的匹配）→ 冷却结束回到 absent，需要重新出现并确认。
+    每个模板保留最近一次匹配结果及其帧签名：同一画面（签名差异不超过 pixel_threshold）直接复用结果，不重新匹配。
+    """
+
+    ABSENT = 'absent'
+    APPEARING = 'appearing'
+    CONFIRMED = 'confirmed'
+    CLICKED = 'clicked'
+    COOLDOWN = 'cooldown'
+
+    def __init__(self, confirm_frames=1, pixel_threshold=12):
+        self.confirm_frames = confirm_frames    # 连续命中多少帧后确认（1 为发现即确认）
+        self.pixel_threshold = pixel_threshold  # 帧签名像素灰度差超过该值视为不同画面
+        self.reset()
+
+    def reset(self):
+        """清空全部状态和缓存结果（每次开始监听时调用）"""
+        self._states = {}   # 模板路径 -> {'state', 'hits', 'until', 'reported'}
+        self._results = {}  # 模板路径 -> (帧签名, 截图原点, 匹配结果)
+        self.reused = 0     # 复用缓存结果的次数
+        self.skipped = 0    # 冷却中跳过匹配的次数
+
+    def _entry(self, key):
+        entry = self._states.get(key)
+        if entry is None:
+            entry = self._states[key] = {'state': self.ABSENT, 'hits': 0, 'until': 0.0, 'reported': False}
+        return entry
+
+    def state(self, key):
+        """模板当前状态"""
+        return self._entry(key)['state']
+
+    def cooling(self, templates, now=None):
+        """返回冷却中的模板索引（本帧跳过匹配）；冷却结束的模板回到 absent"""
+        now = time.time() if now is None else now
+        indices = []
+        for index, template_info in enumerate(templates):
+            entry = self._states.get(template_info['path'])
+            if entry is None or entry['state'] not in (self.CLICKED, self.COOLDOWN):
+                continue
+            if now < entry['until']:
+                entry['state'] = self.COOLDOWN
+                indices.append(index)
+            else:
+                entry.update(state=self.ABSENT, hits=0, reported=False)
+        self.skipped += len(indices)
+        return indices
+
+    def same_frame(self, a, b):
+        """两个帧签名是否为同一画面"""
+        return a is b or (a.shape == b.shape and not (cv2.absdiff(a, b) > self.pixel_threshold).any())
+
+    def has_result(self, key, signature, origin):
+        """同一画面（且截图原点相同）上是否已有匹配结果（不计入复用次数）"""
+        if signature is None:
+            return False
+        cached = self._results.get(key)
+        return cached is not None and cached[1] == origin and self.same_frame(cached[0], signature)
+
+    def cached(self, key, signature, origin):
+        """同一画面（且截图原点相同）上已有的匹配结果，没有时返回 None"""
+        if not self.has_result(key, signature, origin):
+            return None
+        self.reused += 1
+        return self._results[key][2]
+
+    def store(self, key, signature, origin, result):
+        """保存模板在该画面上的匹配结果"""
+        if signature is not None:
+            self._results[key] = (signature, origin, result)
+
+    def observe(self, key, hit):
+        """记录模板在本帧是否命中，返回更新后的状态（已点击/冷却中的模板不受影响）"""
+        entry = self._entry(key)
+        if entry['state'] in (self.CLICKED, self.COOLDOWN):
+            return entry['state']
+        if hit:
+            entry['hits'] += 1
+            entry['state'] = self.CONFIRMED if entry['hits'] >= self.confirm_frames else self.APPEARING
+        else:
+            entry.update(state=self.ABSENT, hits=0, reported=False)
+        return entry['state']
+
+    def appearing(self):
+        """是否有刚出现、等待确认的模板（需要尽快采样下一帧）"""
+        return any(entry['state'] == self.APPEARING for entry in self._states.values())
+
+    def take_confirmed(self):
+        """返回新确认且尚未报告过的模板路径，并标记为已报告（每次出现只报告一次）"""
+        keys = []
+        for key, entry in self._states.items():
+            if entry['state'] == self.CONFIRMED and not entry['reported']:
+                entry['reported'] = True
+                keys.append(key)
+        return keys
+
+    def mark_clicked(self, key, cooldown, now=None):
+        """模板已点击：冷却 cooldown 秒，期间跳过该模板的匹配"""
+        now = time.time() if now is None else now
+        self._entry(key).update(state=self.CLICKED, hits=0, until=now + cooldown)
+        self._results.pop(key, None)
+
+    def back_off(self, key, seconds, now=None):
+        """点击未生效：短暂跳过该模板的匹配，到期后回到 absent，重新出现并确认后再点击"""
+        now = time.time() if now is None else now
+        self._entry(key).update(state=self.COOLDOWN, hits=0, until=now + seconds)
+        self._results.pop(key, None)
+
+    def summary(self):
+        """生成结果复用统计文本"""
+        return "结果复用: {} | 冷却跳过: {}".format(self.reused, self.skipped)
+
+
+class PollScheduler:
+    """自适应采样调度：点击后或画面变化时快速采样，画面静止时按指数退避降低采样频率，
+    同时按 CPU 预算限制检测耗时占比（每帧耗时为 busy 时，至少休眠 busy * (1 - 预算) / 预算）
+    
+    busy 取监听线程本帧消耗的 CPU 时间（time.thread_time），截图等待、点击确认的轮询休眠不计入预算。
+    """
+
+    def __init__(self, min_interval=0.05, max_interval=1.0, backoff=1.5, cpu_budget=0.3,
+                 pixel_threshold=12, fps_window=5.0):
+        self.min_interval = min_interval        # 活跃时的采样间隔（秒）
+        self.max_interval = max_interval        # 静止时退避的最大采样间隔（秒）
+        self.backoff = backoff                  # 每个静止帧间隔放大的倍数
+        self.cpu_budget = cpu_budget            # 检测耗时占比上限（0~1）
+        self.pixel_threshold = pixel_threshold  # 帧签名像素灰度差超过该值视为画面变化
+        self.fps_window = fps_window            # 统计有效帧率的时间窗口（秒）
+        self._wake = threading.Event()          # 停止监听时唤醒休眠中的监听线程
+        self.reset()
+
+    def reset(self):
+        """恢复到活跃状态并清空帧率统计（每次开始监听时调用）"""
+        self._wake.clear()
+        self.interval = self.min_interval
+        self._signature = None
+        self._tick_started = time.perf_counter()
+        self._tick_cpu = time.thread_time()
+        self._ticks = deque()
+
+    def begin_tick(self):
+        """一帧检测开始：记录时间用于计算检测耗时和有效帧率"""
+        now = time.perf_counter()
+        self._tick_started = now
+        self._tick_cpu = time.thread_time()
+        self._ticks.append(now)
+        while self._ticks and now - self._ticks[0] > self.fps_window:
+            self._ticks.popleft()
+
+    def observe(self, signature):
+        """比较帧签名，画面变化时切换到快速采样，返回画面是否变化"""
+        previous = self._signature
+        self._signature = signature
+        changed = (previous is None or previous.shape != signature.shape
+                   or bool((cv2.absdiff(signature, previous) > self.pixel_threshold).any()))
+        if changed:
+            self.activity()
+        return changed
+
+    def activity(self):
+        """检测到活动（点击或画面变化）：恢复最快采样"""
+        self.interval = self.min_interval
+
+    def idle(self):
+        """画面静止：采样间隔按指数退避"""
+        self.interval = min(self.max_interval, self.interval * self.backoff)
+
+    def delay(self, interval=None):
+        """计算本帧结束后的休眠时间：取采样间隔和 CPU 预算要求的最小休眠中较大者"""
+        # 线程 CPU 时间只在调用 begin_tick 的线程上有意义，用墙钟耗时兜底
+        busy = min(max(time.thread_time() - self._tick_cpu, 0.0), time.perf_counter() - self._tick_started)
+        budget = min(max(self.cpu_budget, 0.01), 1.0)
+        budget_sleep = busy * (1.0 - budget) / budget
+        return max(self.interval if interval is None else interval, budget_sleep)
+
+    def wait(self, interval=None):
+        """按调度结果休眠（可被 wake 提前唤醒），返回计划休眠时间"""
+        delay = self.delay(interval)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def sleep(self, seconds):
+        """休眠指定秒数，调用 wake 后立即返回"""
+        self._wake.wait(seconds)
+
+    def wake(self):
+        """唤醒休眠中的监听线程（停止监听时调用，让线程尽快退出）"""
+        self._wake.set()
+
+    def fps(self):
+        """最近 fps_window 秒内的有效采样帧率"""
+        ticks = self._ticks
+        if len(ticks) < 2 or time.perf_counter() - ticks[-1] > self.fps_window:
+            return 0.0
+        return (len(ticks) - 1) / max(ticks[-1] - ticks[0], 1e-6)
+
+    def summary(self):
+        """生成调度状态摘要文本"""
+        return "有效帧率: {:.1f} fps | 采样间隔: {:.0f} ms".format(self.fps(), self.interval * 1000)
+
+
+class HotPathProfiler:
+    """热路径计时：记录监听循环每帧各阶段（截图、帧差、颜色转换、逐模板匹配、点击、点击确认、休眠）的耗时
+    
+    每个阶段只保留最近 window 个样本，用于计算滚动分位数；trace_frames 大于 0 时额外保留最近若干帧的逐阶段耗时，
+    可导出为 JSON/CSV。计时只用 perf_counter 和 deque，关闭时 record() 直接返回。
+    """
+
+    STAGE_LABELS = {
+        'tick': '整帧(含休眠)',
+        'capture': '截图',
+        'diff': '帧差',
+        'convert': '颜色转换',
+        'match': '匹配(合计)',
+        'click': '点击',
+        'verify': '点击确认',
+        'sleep': '休眠',
+    }
+
+    def __init__(self, window=500, trace_frames=2000):
+        self.enabled = True
+        self.window = window              # 每个阶段保留的样本数（滚动分位数窗口）
+        self.trace_frames = trace_frames  # 逐帧轨迹保留的帧数（0 表示不保留）
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空样本和轨迹（每次开始监听时调用）"""
+        with self._lock:
+            self._samples = {}
+            self._counts = {}
+            self._trace = deque(maxlen=self.trace_frames or None)
+        self._frame = 0
+        self._tick = None
+        self._tick_started = None
+
+    def begin_tick(self):
+        """一帧开始：结束上一帧（上一帧耗时包含其后的休眠）并开始记录本帧"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.end_tick(now)
+        self._frame += 1
+        self._tick_started = now
+        self._tick = {'frame': self._frame, 'time': time.time(), 'stages': {}}
+
+    def end_tick(self, now=None):
+        """结束当前帧并写入轨迹（停止监听时调用，补上最后一帧）"""
+        if self._tick is None:
+            return
+        now = time.perf_counter() if now is None else now
+        self.record('tick', now - self._tick_started)
+        if self.trace_frames:
+            self._trace.append(self._tick)
+        self._tick = None
+
+    def record(self, stage, seconds):
+        """记录一个阶段的耗时（秒）；同一帧内同一阶段多次出现时在轨迹中累加"""
+        if not self.enabled:
+            return
+        samples = self._samples.get(stage)
+        if samples is None:
+            with self._lock:
+                samples = self._samples.setdefault(stage, deque(maxlen=self.window))
+                self._counts.setdefault(stage, 0)
+        samples.append(seconds)
+        self._counts[stage] += 1
+        tick = self._tick
+        if tick is not None and stage != 'tick':
+            stages = tick['stages']
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @staticmethod
+    def percentile(sorted_values, q):
+        """最近秩分位数（sorted_values 已排序且非空）"""
+        rank = -(-q * len(sorted_values) // 100)  # 向上取整
+        index = min(len(sorted_values) - 1, max(0, int(rank) - 1))
+        return sorted_values[index]
+
+    @classmethod
+    def stage_label(cls, stage):
+        """阶段显示名：逐模板匹配显示为“匹配: 模板名”"""
+        if stage.startswith('match:'):
+            return "匹配: {}".format(stage[len('match:'):])
+        return cls.STAGE_LABELS.get(stage, stage)
+
+    def snapshot(self):
+        """返回各阶段统计行（毫秒）：stage, label, count, mean, p50, p95, p99, max；固定阶段在前，逐模板匹配在后"""
+        with self._lock:
+            items = [(stage, list(samples), self._counts[stage]) for stage, samples in self._samples.items()]
+        order = list(self.STAGE_LABELS)
+        items.sort(key=lambda item: (order.index(item[0]) if item[0] in order else len(order), item[0]))
+        
+        rows = []
+        for stage, values, count in items:
+            if not values:
+                continue
+            values = sorted(value * 1000 for value in values)
+            rows.append({
+                'stage': stage,
+                'label': self.stage_label(stage),
+                'count': count,
+                'mean': sum(values) / len(values),
+                'p50': self.percentile(values, 50),
+                'p95': self.percentile(values, 95),
+                'p99': self.percentile(values, 99),
+                'max': values[-1],
+            })
+        return rows
+
+    def summary(self):
+        """生成关键阶段的耗时摘要文本（均值/P95）"""
+        parts = []
+        for row in self.snapshot():
+            if row['stage'] in ('capture', 'convert', 'match', 'click', 'verify'):
+                parts.append("{} {:.1f}/{:.1f} ms".format(row['label'], row['mean'], row['p95']))
+        return "耗时(均值/P95): " + ", ".join(parts) if parts else ""
+
+    def export(self, path):
+        """导出逐帧轨迹：.csv 每行一帧一个阶段（frame, time, stage, ms），其他扩展名导出 JSON（含统计行），返回导出帧数"""
+        with self._lock:
+            trace = list(self._trace)
+        
+        if path.lower().endswith('.csv'):
+            import csv
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame', 'time', 'stage', 'ms'])
+                for tick in trace:
+                    stamp = datetime.fromtimestamp(tick['time']).isoformat(timespec='milliseconds')
+                    for stage, seconds in tick['stages'].items():
+                        writer.writerow([tick['frame'], stamp, stage, "{:.3f}".format(seconds * 1000)])
+        else:
+            data = {
+                'exported_at': datetime.now().isoformat(timespec='seconds'),
+                'summary': [dict(row, **{key: round(row[key], 3) for key in ('mean', 'p50', 'p95', 'p99', 'max')})
+                            for row in self.snapshot()],
+                'frames': [{
+                    'frame': tick['frame'],
+                    'time': datetime.fromtimestamp(tick['time']).isoformat(timespec='milliseconds'),
+                    'ms': {stage: round(seconds * 1000, 3) for stage, seconds in tick['stages'].items()},
+                } for tick in trace],
+            }
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        return len(trace)
+
+
+class SessionRecorder:
+    """会话录制：把监听循环的截图和每帧的决策写入录制目录，用于离线复现漏点/误点
+
+    每次开始监听创建一个会话目录 session_YYYYmmdd_HHMMSS：
+      session.json   录制时的检测设置、模板列表和检测模式
+      events.jsonl   每帧一行：相对时间、使用的截图文件、变化区域、截图原点、当前模板索引和决策（跳过/未命中/点击/移动）
+      frame_*.png    截图（只在画面变化时保存，静止帧引用上一张截图）
+    PNG 编码和写文件在后台线程完成；写入跟不上时丢弃截图（对应帧回放时跳过），不阻塞监听线程。
+    录制目录总大小超过 budget_bytes 时按环形缓冲删除最旧的内容：先删除旧会话，再删除当前会话最早的截图。
+    """
+
+    SESSION_FILE = 'session.json'
+    EVENTS_FILE = 'events.jsonl'
+
+    def __init__(self, record_dir='recordings', budget_bytes=500 * 1024 * 1024, max_pending=8):
+        self.record_dir = record_dir
+        self.budget_bytes = budget_bytes
+        self.max_pending = max_pending
+        self.session_dir = None
+        self._queue = None
+        self._thread = None
+
+    @staticmethod
+    def path_size(path):
+        """文件或目录占用的字节数"""
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
+
+    def start(self, settings, mode):
+        """创建会话目录并启动写入线程；settings 为引擎配置字典，mode 为 test / batch / current"""
+        os.makedirs(self.record_dir, exist_ok=True)
+
+        # 已有会话按目录名（时间）排序，超出预算时最先删除
+        self._entries = deque()
+        self._total_bytes = 0
+        for name in sorted(os.listdir(self.record_dir)):
+            path = os.path.join(self.record_dir, name)
+            if name.startswith('session_') and os.path.isdir(path):
+                size = self.path_size(path)
+                self._entries.append((path, size))
+                self._total_bytes += size
+
+        name = "session_{}".format(datetime.now().strftime("%Y%m%d_%H%M%S"))
+        self.session_dir = os.path.join(self.record_dir, name)
+        suffix = 1
+        while os.path.exists(self.session_dir):
+            suffix += 1
+            self.session_dir = os.path.join(self.record_dir, "{}_{}".format(name, suffix))
+        os.makedirs(self.session_dir)
+
+        with open(os.path.join(self.session_dir, self.SESSION_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'mode': mode,
+                'settings': settings,
+            }, f, indent=2, ensure_ascii=False)
+
+        self.ticks = 0
+        self.frames = 0
+        self.dropped = 0
+        self.evicted = 0
+        self._frame_name = None
+        self._regions = None
+        self._origin = (0, 0)
+        self._started = time.perf_counter()
+        self._pending = threading.Semaphore(self.max_pending)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+        return self.session_dir
+
+    def begin_frame(self, frame_source, raw, changed, regions=None, origin=(0, 0)):
+        """一帧截图完成：画面变化时把截图交给写入线程（拷贝一份，截图后端可能复用缓冲区）
+
+        origin 为截图左上角的虚拟桌面坐标（多显示器），决策中的坐标都是虚拟桌面坐标。
+        """
+        self.ticks += 1
+        self._regions = regions
+        self._origin = origin
+        if not changed and self._frame_name is not None:
+            return
+        if not self._pending.acquire(blocking=False):
+            self.dropped += 1
+            self._frame_name = None
+            return
+        self.frames += 1
+        self._frame_name = "frame_{:06d}.png".format(self.frames)
+        self._queue.put(('frame', self._frame_name, np.array(frame_source.to_bgr(raw), copy=True)))
+
+    def record(self, action, template_index=0, **details):
+        """记录本帧的决策：skip（画面静止跳过）/ none（未命中）/ click / move（测试模式移动鼠标）"""
+        event = {
+            'tick': self.ticks,
+            't': round(time.perf_counter() - self._started, 4),
+            'frame': self._frame_name,
+            'regions': None if self._regions is None else [list(region) for region in self._regions],
+            'template_index': template_index,
+            'origin': list(self._origin),
+            'action': action,
+        }
+        event.update(details)
+        self._queue.put(('event', event))
+
+    def stop(self):
+        """写完队列中剩余的截图和事件并结束写入线程"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def summary(self):
+        """生成录制摘要文本"""
+        return "录制: {} 帧 / {} 张截图 | 丢弃: {} | 超出预算删除: {} | {:.1f} MB".format(
+            self.ticks, self.frames, self.dropped, self.evicted, self._total_bytes / (1024 * 1024))
+
+    def _writer(self):
+        """写入线程：PNG 编码（低压缩级别，优先速度）、追加事件并执行磁盘预算"""
+        events_path = os.path.join(self.session_dir, self.EVENTS_FILE)
+        with open(events_path, 'a', encoding='utf-8') as events:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                if item[0] == 'event':
+                    events.write(json.dumps(item[1], ensure_ascii=False) + "\n")
+                    continue
+
+                kind, name, image = item
+                try:
+                    ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+                    if ok:
+                        path = os.path.join(self.session_dir, name)
+                        with open(path, 'wb') as f:
+                            f.write(encoded.tobytes())
+                        self._entries.append((path, len(encoded)))
+                        self._total_bytes += len(encoded)
+                finally:
+                    self._pending.release()
+
+                # 环形缓冲：删除最旧的会话/截图，直到总大小回到预算内（至少保留刚写入的截图）
+                while self._total_bytes > self.budget_bytes and len(self._entries) > 1:
+                    path, size = self._entries.popleft()
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    elif os.path.exists(path):
+                        os.remove(path)
+                    self._total_bytes -= size
+                    self.evicted += 1
+                events.flush()
+
+
+class PyramidMatcher:
+    """图像金字塔匹配：先在缩小的屏幕和模板上粗定位候选位置，再在原分辨率的小邻域内精确确认"""
+
+    def __init__(self, scale=0.5, coarse_margin=0.2, max_candidates=5, min_template_side=8):
+        self.scale = scale                      # 粗匹配缩放比例
+        self.coarse_margin = coarse_margin      # 粗匹配阈值 = 匹配阈值 - 该余量（缩小后置信度会下降）
+        self.max_candidates = max_candidates    # 每个模板最多确认的候选位置数
+        self.min_template_side = min_template_side  # 缩小后模板边长低于该值时退回全量匹配
+        
+        # 当前帧的缩小图缓存（持有原图引用，保证同一帧只缩放一次）
+        self._frame_ref = None
+        self._small_frame = None
+
+    def begin_frame(self):
+        """开始新的一帧：截图后端可能复用同一块内存，需要清空缩小图缓存"""
+        self._frame_ref = None
+        self._small_frame = None
+
+    def small_frame(self, image):
+        """获取当前帧的缩小图（同一帧多个模板共用）"""
+        if image is not self._frame_ref:
+            self._small_frame = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            self._frame_ref = image
+        return self._small_frame
+
+    def small_template(self, template_info, variant='image'):
+        """获取模板的缩小版本（按匹配通道缓存在模板字典中；variant 为 'mask' 时缩小遮罩）"""
+        cache_key = 'pyramid_' + variant
+        cached = template_info.get(cache_key)
+        if cached is None or cached[0] != self.scale:
+            template = template_info[variant]
+            interpolation = cv2.INTER_NEAREST if variant == 'mask' else cv2.INTER_AREA
+            small = cv2.resize(template, None, fx=self.scale, fy=self.scale, interpolation=interpolation)
+            cached = (self.scale, small)
+            template_info[cache_key] = cached
+        return cached[1]
+
+    def match(self, image, template_info, threshold, variant='image'):
+        """金字塔匹配，返回 (最大置信度, 左上角坐标)，与 cv2.matchTemplate + minMaxLoc 的结果一致"""
+        template = template_info[variant]
+        mask = template_info.get('mask')
+        th, tw = template.shape[:2]
+        
+        # 模板太小时缩放会丢失细节，直接全量匹配
+        if min(th, tw) * self.scale < self.min_template_side:
+            return self.exhaustive_match(image, template, mask)
+        
+        small_image = self.small_frame(image)
+        small_template = self.small_template(template_info, variant)
+        small_mask = None if mask is None else self.small_template(template_info, 'mask')
+        sh, sw = small_template.shape[:2]
+        if small_image.shape[0] < sh or small_image.shape[1] < sw:
+            return self.exhaustive_match(image, template, mask)
+        
+        # 粗匹配：在缩小图上找出候选位置
+        coarse = match_template(small_image, small_template, small_mask)
+        coarse_threshold = threshold - self.coarse_margin
+        candidates = []
+        best_coarse = 0
+        for _ in range(self.max_candidates):
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(coarse)
+            best_coarse = max(best_coarse, max_val)
+            if max_val < coarse_threshold:
+                break
+            candidates.append(max_loc)
+            # 抑制该候选周围区域，避免重复确认同一位置
+            cx, cy = max_loc
+            coarse[max(0, cy - sh // 2):cy + sh // 2 + 1, max(0, cx - sw // 2):cx + sw // 2 + 1] = -1
+        
+        if not candidates:
+            return best_coarse, None
+        
+        # 精确确认：只在原分辨率的候选邻域内匹配
+        pad = int(np.ceil(1.0 / self.scale)) + 2
+        height, width = image.shape[:2]
+        best_val, best_loc = -1.0, None
+        for cx, cy in candidates:
+            x0 = max(0, int(cx / self.scale) - pad)
+            y0 = max(0, int(cy / self.scale) - pad)
+            x1 = min(width, int(cx / self.scale) + pad + tw)
+            y1 = min(height, int(cy / self.scale) + pad + th)
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            
+            result = match_template(image[y0:y1, x0:x1], template, mask)
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            if max_val > best_val:
+                best_val = max_val
+                best_loc = (x0 + max_loc[0], y0 + max_loc[1])
+        
+        return best_val, best_loc
+
+    @staticmethod
+    def exhaustive_match(image, template, mask=None):
+        """全量匹配（原始实现）：在整幅图像上逐像素匹配，mask 为模板遮罩（可选）"""
+        result = match_template(image, template, mask)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        return max_val, max_loc
+
+
+class RoiCache:
+    """区域缓存：记录每个模板上次命中的矩形，下次优先在其扩展邻域内搜索，未命中再全屏扫描
+    
+    邻域第一次未命中（按钮已消失或移动）就移除该缓存，之后直接全屏扫描，
+    不必在 ttl 过期前每帧都先搜索一次旧邻域；按钮再次出现并命中时重新记录。
+    """
+
+    def __init__(self, margin=48, ttl=300):
+        self.margin = margin            # 搜索窗口在上次命中矩形四周扩展的像素
+        self.ttl = ttl                  # 缓存有效期（秒），超过该时间未再命中则过期
+        self.entries = {}               # (模板路径, 缩放比例) -> (x, y, w, h, 最后命中时间)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, image_shape):
+        """返回扩展后的搜索窗口 (x0, y0, x1, y1)，无缓存或已过期时返回 None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        
+        x, y, w, h, last_hit = entry
+        if time.time() - last_hit > self.ttl:
+            del self.entries[key]
+            return None
+        
+        height, width = image_shape[:2]
+        x0, y0 = max(0, x - self.margin), max(0, y - self.margin)
+        x1, y1 = min(width, x + w + self.margin), min(height, y + h + self.margin)
+        if x1 - x0 < w or y1 - y0 < h:
+            return None
+        return x0, y0, x1, y1
+
+    def store(self, key, loc, size):
+        """记录模板命中的矩形"""
+        w, h = size
+        self.entries[key] = (loc[0], loc[1], w, h, time.time())
+
+    def record(self, key, hit):
+        """记录一次邻域搜索的结果（只在 lookup 返回了搜索窗口时调用），未命中时移除该缓存"""
+        if hit:
+            self.hits += 1
+            return
+        self.misses += 1
+        self.entries.pop(key, None)
+
+    def summary(self):
+        """生成缓存统计文本"""
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0.0
+        return "区域缓存命中: {}/{} ({:.0%})".format(self.hits, total, ratio)
+
+
+class FrameChangeDetector:
+    """帧差检测：比较新帧与上一帧的缩小灰度签名，画面静止时跳过匹配，只把变化的区块交给匹配器"""
+
+    def __init__(self, downscale=8, pixel_threshold=12, tile_size=128, max_changed_ratio=0.5, max_static_age=5.0):
+        self.downscale = downscale                  # 签名缩小倍数
+        self.pixel_threshold = pixel_threshold      # 签名像素灰度差超过该值视为变化
+        self.tile_size = tile_size                  # 变化区块边长（原图像素）
+        self.max_changed_ratio = max_changed_ratio  # 变化区块占比超过该值时直接全屏匹配
+        self.max_static_age = max_static_age        # 距上次全屏匹配超过该时间（秒）强制全屏匹配一次
+        self.reset()
+
+    def reset(self):
+        """清空比较基准，下一帧执行全屏匹配"""
+        self._baseline = None
+        self._full_checked_at = 0
+
+    def signature(self, frame):
+        """计算帧签名：缩小后的灰度图"""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, width // self.downscale), max(1, height // self.downscale)),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+        return small
+
+    def changed_regions(self, frame):
+        """返回 (签名, 变化区域)：变化区域为 None 表示需要全屏匹配，为空列表表示画面未变化"""
+        signature = self.signature(frame)
+        baseline = self._baseline
+        if (baseline is None or baseline.shape != signature.shape
+                or time.time() - self._full_checked_at > self.max_static_age):
+            return signature, None
+        
+        changed = cv2.absdiff(signature, baseline) > self.pixel_threshold
+        if not changed.any():
+            return signature, []
+        
+        # 按区块汇总变化像素
+        cell = max(1, self.tile_size // self.downscale)
+        rows = -(-changed.shape[0] // cell)
+        cols = -(-changed.shape[1] // cell)
+        padded = np.zeros((rows * cell, cols * cell), dtype=bool)
+        padded[:changed.shape[0], :changed.shape[1]] = changed
+        tiles = padded.reshape(rows, cell, cols, cell).any(axis=(1, 3))
+        
+        if tiles.mean() > self.max_changed_ratio:
+            return signature, None
+        
+        # 相邻变化区块合并为矩形区域（原图坐标）
+        height, width = frame.shape[:2]
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(tiles.astype(np.uint8), connectivity=8)
+        regions = []
+        for label in range(1, count):
+            tx, ty, tw, th = (int(value) for value in stats[label][:4])
+            regions.append((tx * self.tile_size, ty * self.tile_size,
+                            min(width, (tx + tw) * self.tile_size), min(height, (ty + th) * self.tile_size)))
+        return signature, regions
+
+    def commit(self, signature, full):
+        """该帧已完成检测且没有命中，作为下一帧的比较基准"""
+        self._baseline = signature
+        if full:
+            self._full_checked_at = time.time()
+
+
+class MultiScaleMatcher:
+    """多尺度匹配（DPI 自适应）：缓存模板的各缩放版本，记住每个模板/显示器命中的缩放比例并优先尝试
+    
+    已知比例（或同一显示器上其他模板命中的比例）每帧都会尝试；其余比例只在未命中且距上次
+    扫描超过 sweep_interval 秒时才完整扫描一遍，避免每帧都做全尺度扫描。只匹配变化区域的帧
+    （sweep=False）不做全尺度扫描：画面持续变化时几乎每帧都是这种帧，全尺度扫描由帧差检测
+    定期强制的全屏帧完成。
+    """
+
+    def __init__(self, scales=(1.0, 1.25, 1.5, 1.75, 2.0, 0.8, 0.67), sweep_interval=10.0):
+        self.scales = tuple(scales)
+        self.sweep_interval = sweep_interval
+        self.template_scales = {}   # (模板路径, 显示器) -> 命中的缩放比例
+        self.monitor_scales = {}    # 显示器 -> 最近一次命中的缩放比例
+        self._last_sweep = {}       # (模板路径, 显示器) -> 上次全尺度扫描时间
+
+    def scaled_template(self, template_info, scale):
+        """获取模板在指定缩放比例下的版本（含各匹配通道，缓存在模板字典中）"""
+        if scale == 1.0:
+            return template_info
+        
+        cache = template_info.setdefault('scaled', {})
+        scaled_info = cache.get(scale)
+        if scaled_info is None:
+            image = template_info['image']
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            resized = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+            mask = template_info.get('mask')
+            if mask is not None:
+                mask = cv2.resize(mask, resized.shape[1::-1], interpolation=cv2.INTER_NEAREST)
+            scaled_info = {
+                'name': template_info['name'],
+                'path': template_info['path'],
+                'scale': scale,
+                'image': resized,
+                **template_variants(resized, mask)
+            }
+            cache[scale] = scaled_info
+        return scaled_info
+
+    def preferred_scales(self, key, monitor):
+        """优先尝试的缩放比例：模板自身命中过的比例，否则为显示器比例和原始比例"""
+        if key in self.template_scales:
+            return [self.template_scales[key]]
+        preferred = [self.monitor_scales.get(monitor, 1.0), 1.0]
+        return list(dict.fromkeys(preferred))
+
+    def match(self, image, template_info, threshold, match_fn, monitor=None, sweep=True):
+        """按缓存的比例顺序匹配，返回 (最大置信度, 左上角坐标, (宽, 高))；sweep 为 False 时只尝试优先比例"""
+        if monitor is None:
+            monitor = image.shape[:2]
+        key = (template_info['path'], monitor)
+        height, width = image.shape[:2]
+        best = (-1.0, None, template_info['image'].shape[1::-1])
+        
+        preferred = self.preferred_scales(key, monitor)
+        scales = list(preferred)
+        now = time.time()
+        if sweep and now - self._last_sweep.get(key, 0) >= self.sweep_interval:
+            self._last_sweep[key] = now
+            scales += [scale for scale in self.scales if scale not in preferred]
+        
+        for scale in scales:
+            scaled_info = self.scaled_template(template_info, scale)
+            th, tw = scaled_info['image'].shape[:2]
+            if th > height or tw > width:
+                continue
+            
+            max_val, max_loc = match_fn(scaled_info)
+            if max_val > threshold and max_loc is not None:
+                self.template_scales[key] = scale
+                self.monitor_scales[monitor] = scale
+                return max_val, max_loc, (tw, th)
+            if max_val > best[0]:
+                best = (max_val, max_loc, (tw, th))
+        return best
+
+
+class TemplateAtlas:
+    """模板图集：把尺寸相近、外观相似的模板（同一按钮的不同版本、语言、主题）归为一组，共用一次粗匹配
+    
+    每组以成员中心裁剪到共同尺寸后的平均图作为原型，每帧只在缩小图上用原型做一次粗匹配得到候选位置，
+    组内各模板只在候选位置的原分辨率邻域内确认；同组再增加一个模板只多几次小窗口匹配，而不是一次整屏扫描。
+    画面与成员的相关系数为 a、成员与原型为 s 时，画面与原型的相关系数不低于 cos(acos(a) + acos(s))，
+    以此作为组的粗匹配阈值。原型的粗匹配分数可能略低于成员自己的粗匹配，所以粗匹配分数最高的
+    max_candidates 个位置总是确认，之后的位置不低于组阈值时才确认，总数不超过 max_candidates + 组内模板数。
+    成组要求成员两两之间（缩小后）的相关系数不低于 min_similarity，外观不同的按钮不会因为尺寸相近而合并。
+    不与其他模板成组的模板返回 None，由调用方按普通金字塔匹配处理。
+    """
+
+    def __init__(self, pyramid_matcher, scale_matcher, min_similarity=0.8, min_area_ratio=0.8, min_coarse_side=10):
+        self.pyramid_matcher = pyramid_matcher  # 共用其缩小比例、粗匹配余量和当前帧的缩小图
+        self.scale_matcher = scale_matcher      # 多尺度匹配时按同一缩放比例的模板版本分组
+        self.min_similarity = min_similarity    # 成员两两之间（缩小图）的最低相关系数
+        self.min_area_ratio = min_area_ratio    # 共同尺寸至少保留每个成员面积的比例
+        # 缩小后共同尺寸的最小边长：过细的模板（如单行文字）粗匹配分数随采样相位波动，原型只对应一种相位，不参与分组
+        self.min_coarse_side = min_coarse_side
+        self._templates = []
+        self._groups = {}       # (缩放比例, 匹配通道) -> {模板路径: 组}
+        self._small_ref = None
+        self._candidates = {}   # id(组) -> (最高粗匹配置信度, 候选位置)，当前帧有效
+        self.shared = 0         # 复用同组粗匹配结果的次数
+
+    def groups(self, templates, scale=1.0, variant='image'):
+        """返回指定缩放比例和匹配通道下的分组 {模板路径: 组}（模板列表变化时重新分组）"""
+        if len(templates) != len(self._templates) or any(a is not b for a, b in zip(templates, self._templates)):
+            self._templates = list(templates)
+            self._groups = {}
+            self._candidates = {}
+        key = (scale, variant)
+        if key not in self._groups:
+            scaled = [self.scale_matcher.scaled_template(template_info, scale) for template_info in templates]
+            self._groups[key] = {
+                member['path']: group for group in self.build_groups(scaled, variant) for member in group['members']}
+        return self._groups[key]
+
+    def build_groups(self, templates, variant):
+        """贪心分组：模板依次尝试加入已有的组，加入后共同尺寸和原型相似度仍满足要求时加入，否则自成一组；
+        只返回两个及以上模板的组"""
+        groups = []
+        for template_info in templates:
+            for index, group in enumerate(groups):
+                candidate = self.make_group(group['members'] + [template_info], variant)
+                if candidate is not None:
+                    groups[index] = candidate
+                    break
+            else:
+                groups.append({'members': [template_info]})
+        return [group for group in groups if len(group['members']) > 1]
+
+    def make_group(self, members, variant):
+        """由成员计算原型：第一个成员中心裁剪到共同尺寸，其余成员在与之最相关的位置裁剪（对齐宽度不同的版本），
+        裁剪结果取平均（遮罩取交集）；不满足成组条件时返回 None"""
+        heights = [member[variant].shape[0] for member in members]
+        widths = [member[variant].shape[1] for member in members]
+        ch, cw = min(heights), min(widths)
+        scale = self.pyramid_matcher.scale
+        if min(ch, cw) * scale < max(self.min_coarse_side, self.pyramid_matcher.min_template_side):
+            return None
+        if any(ch * cw < self.min_area_ratio * h * w for h, w in zip(heights, widths)):
+            return None
+        
+        offsets = {}
+        crops = []
+        mask = np.full((ch, cw), 255, dtype=np.uint8)
+        for member, h, w in zip(members, heights, widths):
+            if not crops:
+                dx, dy = (w - cw) // 2, (h - ch) // 2
+            else:
+                seed_mask = None if members[0].get('mask') is None else mask
+                dx, dy = cv2.minMaxLoc(match_template(member[variant], crops[0], seed_mask))[3]
+            offsets[member['path']] = (dx, dy)
+            crops.append(member[variant][dy:dy + ch, dx:dx + cw])
+            if member.get('mask') is not None:
+                mask = cv2.min(mask, member['mask'][dy:dy + ch, dx:dx + cw])
+        if np.count_nonzero(mask) < 0.5 * mask.size:
+            return None
+        
+        prototype = np.mean(crops, axis=0).round().astype(crops[0].dtype)
+        coarse = cv2.resize(prototype, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        coarse_mask = None
+        if not mask.all():
+            coarse_mask = cv2.resize(mask, coarse.shape[1::-1], interpolation=cv2.INTER_NEAREST)
+        
+        # 成员两两之间的相关系数决定能否成组，成员与原型的最低相关系数决定组的粗匹配阈值
+        smalls = [cv2.resize(crop, coarse.shape[1::-1], interpolation=cv2.INTER_AREA) for crop in crops]
+        for index, small in enumerate(smalls):
+            for other in smalls[index + 1:]:
+                if float(match_template(small, other, coarse_mask)[0, 0]) < self.min_similarity:
+                    return None
+        similarity = min(float(match_template(small, coarse, coarse_mask)[0, 0]) for small in smalls)
+        return {'members': members, 'offsets': offsets, 'coarse': coarse, 'coarse_mask': coarse_mask,
+                'similarity': similarity}
+
+    def candidates(self, image, group, threshold):
+        """组在当前帧的 (最高粗匹配置信度, 候选位置)，同一帧内组内各模板共用；图像小于原型时返回 None"""
+        small_image = self.pyramid_matcher.small_frame(image)
+        if small_image is not self._small_ref:
+            self._small_ref = small_image
+            self._candidates = {}
+        cached = self._candidates.get(id(group))
+        if cached is not None:
+            self.shared += 1
+            return cached
+        
+        coarse = group['coarse']
+        sh, sw = coarse.shape[:2]
+        if small_image.shape[0] < sh or small_image.shape[1] < sw:
+            return None
+        
+        response = match_template(small_image, coarse, group['coarse_mask'])
+        member_threshold = min(1.0, max(0.0, threshold - self.pyramid_matcher.coarse_margin))
+        coarse_threshold = np.cos(min(np.pi, np.arccos(member_threshold) + np.arccos(min(1.0, group['similarity']))))
+        candidates = []
+        best_coarse = -1.0
+        for rank in range(self.pyramid_matcher.max_candidates + len(group['members'])):
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(response)
+            best_coarse = max(best_coarse, max_val)
+            if max_val <= -1 or (max_val < coarse_threshold and rank >= self.pyramid_matcher.max_candidates):
+                break
+            candidates.append(max_loc)
+            cx, cy = max_loc
+            response[max(0, cy - sh // 2):cy + sh // 2 + 1, max(0, cx - sw // 2):cx + sw // 2 + 1] = -1
+        
+        cached = self._candidates[id(group)] = (best_coarse, candidates)
+        return cached
+
+    def match(self, image, templates, template_info, threshold, variant='image'):
+        """在组的候选位置邻域内确认模板，返回 (最大置信度, 左上角坐标)；模板不属于任何组时返回 None"""
+        group = self.groups(templates, template_info.get('scale', 1.0), variant).get(template_info['path'])
+        if group is None:
+            return None
+        found = self.candidates(image, group, threshold)
+        if found is None:
+            return None
+        best_coarse, candidates = found
+        if not candidates:
+            return best_coarse, None
+        
+        template, mask = template_info[variant], template_info.get('mask')
+        th, tw = template.shape[:2]
+        dx, dy = group['offsets'][template_info['path']]
+        scale = self.pyramid_matcher.scale
+        pad = int(np.ceil(1.0 / scale)) + 2
+        height, width = image.shape[:2]
+        best_val, best_loc = -1.0, None
+        for cx, cy in candidates:
+            x = int(cx / scale) - dx
+            y = int(cy / scale) - dy
+            x0, y0 = max(0, x - pad), max(0, y - pad)
+            x1, y1 = min(width, x + pad + tw), min(height, y + pad + th)
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(match_template(image[y0:y1, x0:x1], template, mask))
+            if max_val > best_val:
+                best_val = max_val
+                best_loc = (x0 + max_loc[0], y0 + max_loc[1])
+        return best_val, best_loc
+
+    def summary(self):
+        """生成图集统计文本"""
+        return "图集共用粗匹配: {}".format(self.shared)
+
+
+class TemplateCache:
+    """模板编译缓存：把模板的各匹配通道、金字塔缩小图和多尺度版本保存为未压缩的 .npz
+    
+    缓存文件以 内容哈希 + 预处理参数 命名。索引文件记录 路径 -> (修改时间, 文件大小, 内容哈希)，
+    修改时间和大小未变时不必重新计算哈希；同时记录每个缓存文件中各数组的偏移、形状和类型，
+    命中时整个文件内存映射一次，数组直接取视图，不再解码图片、重新预处理或解析 .npy 头。
+    """
+
+    VERSION = 2
+    ARRAY_KEYS = ('image', 'gray', 'edge')
+    OPTIONAL_KEYS = ('mask',)
+
+    def __init__(self, cache_dir='template_cache'):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self._index = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self):
+        """读取索引（调用方持有锁）：{'paths': {路径: 文件信息}, 'layouts': {缓存文件名: 数组布局}}"""
+        if self._index is None:
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            self._index.setdefault('paths', {})
+            self._index.setdefault('layouts', {})
+        return self._index
+
+    def _save_index(self):
+        """写入索引（调用方持有锁，先写临时文件再替换）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_file = self.index_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(temp_file, self.index_file)
+
+    def content_hash(self, path):
+        """返回 (内容哈希, 文件内容)；修改时间和大小与索引一致时直接使用索引中的哈希，文件内容为 None"""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._load_index()['paths'].get(key)
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                return entry['sha1'], None
+        
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self._load_index()['paths'][key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest}
+            self._save_index()
+        return digest, data
+
+    def cache_name(self, digest, pyramid_scale, scales):
+        """缓存文件名：预处理参数变化时使用不同的文件"""
+        params = "{}|{:g}|{}".format(self.VERSION, pyramid_scale, ",".join("{:g}".format(scale) for scale in scales))
+        params_digest = hashlib.sha1(params.encode('utf-8')).hexdigest()[:8]
+        return "{}-{}.npz".format(digest, params_digest)
+
+    @staticmethod
+    def flatten(template_info, prefix=''):
+        """把模板字典中的数组展开为 {名称: 数组}（多尺度版本用 'scaled/比例/' 前缀）"""
+        arrays = {}
+        for key in TemplateCache.ARRAY_KEYS:
+            arrays[prefix + key] = template_info[key]
+        for key in TemplateCache.OPTIONAL_KEYS:
+            if key in template_info:
+                arrays[prefix + key] = template_info[key]
+        for key, value in template_info.items():
+            if key.startswith('pyramid_'):
+                arrays[prefix + key] = value[1]
+        for scale, scaled_info in template_info.get('scaled', {}).items():
+            arrays.update(TemplateCache.flatten(scaled_info, "{}scaled/{!r}/".format(prefix, scale)))
+        return arrays
+
+    @staticmethod
+    def unflatten(arrays, name, path, pyramid_scale):
+        """由展开的数组重建模板字典"""
+        template_info = {'name': name, 'path': path, 'scaled': {}}
+        for key, array in arrays.items():
+            parts = key.split('/')
+            target = template_info
+            if parts[0] == 'scaled':
+                scale = float(parts[1])
+                target = template_info['scaled'].setdefault(scale, {'name': name, 'path': path, 'scale': scale})
+                key = parts[2]
+            target[key] = (pyramid_scale, array) if key.startswith('pyramid_') else array
+        return template_info
+
+    @staticmethod
+    def read_layout(npz_path):
+        """解析未压缩 .npz 中各数组的 (数据偏移, 形状, 类型)，用于之后直接映射"""
+        layout = {}
+        with zipfile.ZipFile(npz_path) as archive, open(npz_path, 'rb') as f:
+            for member in archive.infolist():
+                if member.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError("缓存文件不是未压缩的 npz: {}".format(npz_path))
+                
+                # 本地文件头 30 字节，之后是文件名和扩展字段，再之后是 .npy 数据
+                f.seek(member.header_offset)
+                name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+                f.seek(member.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                if fortran_order:
+                    raise ValueError("缓存数组不是 C 连续: {}".format(member.filename))
+                layout[member.filename[:-len('.npy')]] = [f.tell(), list(shape), dtype.str]
+        return layout
+
+    @staticmethod
+    def map_arrays(npz_path, layout):
+        """整个缓存文件内存映射一次（写时复制），按布局返回各数组的视图"""
+        buffer = np.memmap(npz_path, dtype=np.uint8, mode='c')
+        arrays = {}
+        for name, (offset, shape, dtype_str) in layout.items():
+            dtype = np.dtype(dtype_str)
+            count = int(np.prod(shape)) if shape else 1
+            array = buffer[offset:offset + count * dtype.itemsize].view(dtype=dtype, type=np.ndarray)
+            arrays[name] = array.reshape(shape)
+        return arrays
+
+    def load(self, path, pyramid_scale, scales, mask_path=None):
+        """读取模板：返回 (模板字典或 None, 内容哈希, 文件内容或 None)，未命中时调用方用返回的文件内容解码
+        
+        mask_path 为遮罩旁路文件时，内容哈希同时覆盖遮罩文件（修改遮罩后重新编译）。
+        """
+        digest, data = self.content_hash(path)
+        if mask_path is not None:
+            digest = hashlib.sha1((digest + self.content_hash(mask_path)[0]).encode('ascii')).hexdigest()
+        name = self.cache_name(digest, pyramid_scale, scales)
+        npz_path = os.path.join(self.cache_dir, name)
+        with self._lock:
+            layout = self._load_index()['layouts'].get(name)
+        if layout is not None and os.path.exists(npz_path):
+            try:
+                template_info = self.unflatten(self.map_arrays(npz_path, layout), os.path.basename(path), path, pyramid_scale)
+                self.hits += 1
+                return template_info, digest, data
+            except (OSError, ValueError):
+                pass
+        self.misses += 1
+        return None, digest, data
+
+    def store(self, digest, template_info, pyramid_scale, scales):
+        """保存编译后的模板并记录数组布局（先写临时文件再替换，避免读取到写了一半的缓存）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        name = self.cache_name(digest, pyramid_scale, scales)
+        npz_path = os.path.join(self.cache_dir, name)
+        temp_path = npz_path[:-len('.npz')] + '.tmp.npz'
+        np.savez(temp_path, **{key: np.ascontiguousarray(array) for key, array in self.flatten(template_info).items()})
+        layout = self.read_layout(temp_path)
+        os.replace(temp_path, npz_path)
+        with self._lock:
+            self._load_index()['layouts'][name] = layout
+            self._save_index()
+
+    def summary(self):
+        """生成缓存命中统计文本"""
+        return "模板缓存命中: {}/{}".format(self.hits, self.hits + self.misses)
+
+
+# 工作进程中已连接的共享内存（名称 -> SharedMemory），截图缓冲区重建后自动切换
+_worker_shared_frames = {}
+
+
+def _attach_shared_frame(name):
+    """工作进程：连接主进程创建的截图共享内存"""
+    shm = _worker_shared_frames.get(name)
+    if shm is None:
+        for old in _worker_shared_frames.values():
+            old.close()
+        _worker_shared_frames.clear()
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_shared_frames[name] = shm
+    return shm
+
+
+def _parallel_match_job(shm_name, shape, dtype, rect, template, mask=None):
+    """工作进程：在共享截图的指定条带内匹配模板（mask 为模板遮罩），返回 (最大置信度, 左上角坐标)"""
+    shm = _attach_shared_frame(shm_name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    x0, y0, x1, y1 = rect
+    result = match_template(frame[y0:y1, x0:x1], template, mask)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    return max_val, (x0 + max_loc[0], y0 + max_loc[1])
+
+
+class ParallelMatchEngine:
+    """多进程匹配引擎：截图写入共享内存（不经过 pickle），按 模板 或 模板×屏幕条带 拆分任务分发给工作进程
+    
+    split 为 'template' 时每个模板一个任务；为 'tile' 时每个模板再按行切成 workers 个条带；
+    'auto' 在模板数少于工作进程数时按条带拆分，否则按模板拆分。
+    """
+
+    def __init__(self, workers=None, split='auto', min_pixels=1280 * 720):
+        if shared_memory is None:
+            raise RuntimeError("多进程匹配需要 Python 3.8 及以上版本")
+        self.workers = workers or os.cpu_count() or 1
+        self.split = split
+        self.min_pixels = min_pixels    # 小于该像素数的图像（区域缓存窗口、变化区域）直接在本进程匹配
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._shm = None
+        self._frame_ref = None
+        self._frame_shape = None
+        self._frame_dtype = None
+
+    def begin_frame(self):
+        """开始新的一帧：下一次匹配时重新写入共享内存"""
+        self._frame_ref = None
+
+    def _publish_frame(self, image):
+        """把截图写入共享内存（同一帧只写一次）"""
+        if image is self._frame_ref:
+            return
+        if self._shm is None or self._shm.size < image.nbytes:
+            self._release_shared_memory()
+            self._shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        shared = np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm.buf)
+        np.copyto(shared, image)
+        self._frame_ref = image
+        self._frame_shape = image.shape
+        self._frame_dtype = image.dtype.str
+
+    def _split_rects(self, image_shape, template_shape, bands):
+        """按行切分匹配位置，每个条带向下多取模板高度-1行，保证覆盖条带内的所有匹配位置"""
+        height, width = image_shape[:2]
+        th = template_shape[0]
+        positions = height - th + 1
+        band = -(-positions // bands)
+        rects = []
+        for start in range(0, positions, band):
+            rects.append((0, start, width, min(height, start + band + th - 1)))
+        return rects
+
+    def match(self, image, templates, masks=None):
+        """并行匹配多个模板（masks 为与模板一一对应的遮罩列表，可省略），返回每个模板的 (最大置信度, 左上角坐标)"""
+        self._publish_frame(image)
+        if masks is None:
+            masks = [None] * len(templates)
+        
+        split = self.split
+        if split == 'auto':
+            split = 'tile' if len(templates) < self.workers else 'template'
+        bands = self.workers if split == 'tile' else 1
+        
+        futures = []
+        for index, (template, mask) in enumerate(zip(templates, masks)):
+            for rect in self._split_rects(image.shape, template.shape, bands):
+                futures.append((index, self._executor.submit(
+                    _parallel_match_job, self._shm.name, self._frame_shape, self._frame_dtype, rect, template, mask)))
+        
+        results = [(-1.0, None)] * len(templates)
+        for index, future in futures:
+            max_val, max_loc = future.result()
+            if max_val > results[index][0]:
+                results[index] = (max_val, max_loc)
+        return results
+
+    def _release_shared_memory(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+            self._frame_ref = None
+
+    def close(self):
+        """关闭工作进程并释放共享内存"""
+        self._executor.shutdown(wait=True)
+        self._release_shared_memory()
+
+
+class FrameSource:
+    """截图后端基类：grab_raw() 返回后端原始格式的图像，to_bgr() 转换为匹配用的 BGR 图像
+    
+    为了减少内存分配，后端可以复用同一块缓冲区，调用方需要在下一次截图前用完上一帧。
+    region 参数格式与 pyautogui 一致：(left, top, width, height)。
+    """
+
+    name = 'base'
+
+    def grab_raw(self, region=None):
+        raise NotImplementedError
+
+    def to_bgr(self, raw):
+        raise NotImplementedError
+
+    def to_gray(self, raw):
+        """原始图像直接转换为灰度（灰度匹配模式下跳过 BGR 中间图像）"""
+        return cv2.cvtColor(self.to_bgr(raw), cv2.COLOR_BGR2GRAY)
+
+    def grab(self, region=None):
+        """截图并转换为 BGR 图像"""
+        return self.to_bgr(self.grab_raw(region))
+
+    def close(self):
+        """释放后端资源"""
+        pass
+
+
+class PyAutoGuiFrameSource(FrameSource):
+    """pyautogui 截图后端（原始实现）：经过 PIL 图像，每帧两次整屏拷贝"""
+
+    name = 'pyautogui'
 
-class CursorTemplateClicker:
     def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("Cursor 自动执行-Cursor Auto Accept")
-        self.root.geometry("900x600")
+        if not pyautogui.available():
+            raise RuntimeError("pyautogui 不可用（需要图形桌面环境）")
+
+    def grab_raw(self, region=None):
+        if region is not None:
+            # 区域可能位于副显示器（坐标可为负数），需要按整个虚拟桌面截图（pyscreeze 的 allScreens 参数）
+            try:
+                return np.array(pyautogui.screenshot(region=region, allScreens=True))
+            except TypeError:
+                pass
+        return np.array(pyautogui.screenshot(region=region))
+
+    def to_bgr(self, raw):
+        return cv2.cvtColor(raw, cv2.COLOR_RGB2BGR)
+
+    def to_gray(self, raw):
+        return cv2.cvtColor(raw, cv2.COLOR_RGB2GRAY)
+
+
+class GdiFrameSource(FrameSource):
+    """Windows GDI 原生截图后端：BitBlt + GetDIBits 直接写入复用的 BGRA NumPy 缓冲区，不经过 PIL
+    
+    位图和缓冲区按截图尺寸缓存（最多 max_buffers 种尺寸）：点击确认只截取按钮附近的小区域，
+    整屏截图和小区域截图交替进行时各自复用自己的缓冲区，不会每次点击都释放并重建整屏缓冲区。
+    """
+
+    name = 'gdi'
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+
+    def __init__(self, max_buffers=4):
+        if sys.platform != 'win32':
+            raise RuntimeError("GDI 截图后端只支持 Windows")
+        
+        import ctypes
+        from ctypes import wintypes
+        
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [
+                ('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD), ('biCompression', wintypes.DWORD),
+                ('biSizeImage', wintypes.DWORD), ('biXPelsPerMeter', wintypes.LONG), ('biYPelsPerMeter', wintypes.LONG),
+                ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD)
+            ]
+        
+        self._ctypes = ctypes
+        self._user32 = ctypes.windll.user32
+        self._gdi32 = ctypes.windll.gdi32
+        self._bitmap_info = BITMAPINFOHEADER()
+        
+        # 句柄在64位系统上是指针宽度，必须声明类型避免被截断
+        handle = ctypes.c_void_p
+        self._user32.GetDC.restype = handle
+        self._user32.GetDC.argtypes = [handle]
+        self._user32.ReleaseDC.argtypes = [handle, handle]
+        self._gdi32.CreateCompatibleDC.restype = handle
+        self._gdi32.CreateCompatibleDC.argtypes = [handle]
+        self._gdi32.CreateCompatibleBitmap.restype = handle
+        self._gdi32.CreateCompatibleBitmap.argtypes = [handle, ctypes.c_int, ctypes.c_int]
+        self._gdi32.SelectObject.restype = handle
+        self._gdi32.SelectObject.argtypes = [handle, handle]
+        self._gdi32.DeleteObject.argtypes = [handle]
+        self._gdi32.DeleteDC.argtypes = [handle]
+        self._gdi32.BitBlt.argtypes = [handle, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                       handle, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        self._gdi32.GetDIBits.argtypes = [handle, handle, wintypes.UINT, wintypes.UINT,
+                                          ctypes.c_void_p, ctypes.c_void_p, wintypes.UINT]
+        
+        self._screen_dc = None
+        self._memory_dc = None
+        self.max_buffers = max(2, max_buffers)  # 至少 2 种：当前选入 DC 的位图不会被淘汰
+        self._bitmap = None
+        self._buffers = {}       # (宽, 高) -> {'bitmap', 'raw'(BGRA), 'bgr', 'gray'}，按最近使用排序
+        self._size = None        # 当前选入内存 DC 的位图尺寸
+        self._buffer = None      # 当前尺寸的 BGRA 缓冲区（复用）
+
+    def _ensure_buffers(self, width, height):
+        """按截图尺寸取出（或创建）GDI 位图和 NumPy 缓冲区，并选入内存 DC"""
+        size = (width, height)
+        if self._size == size:
+            return
+        if self._screen_dc is None:
+            self._screen_dc = self._user32.GetDC(None)
+            self._memory_dc = self._gdi32.CreateCompatibleDC(self._screen_dc)
+        
+        entry = self._buffers.pop(size, None)
+        if entry is None:
+            while len(self._buffers) >= self.max_buffers:
+                self._gdi32.DeleteObject(self._buffers.pop(next(iter(self._buffers)))['bitmap'])
+            entry = {
+                'bitmap': self._gdi32.CreateCompatibleBitmap(self._screen_dc, width, height),
+                'raw': np.empty((height, width, 4), dtype=np.uint8),
+                'bgr': np.empty((height, width, 3), dtype=np.uint8),
+                'gray': np.empty((height, width), dtype=np.uint8),
+            }
+        self._buffers[size] = entry
+        self._gdi32.SelectObject(self._memory_dc, entry['bitmap'])
+        
+        info = self._bitmap_info
+        info.biSize = self._ctypes.sizeof(info)
+        info.biWidth = width
+        info.biHeight = -height  # 负高度表示自上而下的位图，与 NumPy 行顺序一致
+        info.biPlanes = 1
+        info.biBitCount = 32
+        info.biCompression = 0  # BI_RGB
+        
+        self._bitmap = entry['bitmap']
+        self._buffer = entry['raw']
+        self._size = size
+
+    def _entry_for(self, raw):
+        """原始截图所属的缓存项（不是本后端的缓冲区时返回 None）"""
+        entry = self._buffers.get(raw.shape[1::-1]) if raw.ndim == 3 else None
+        return entry if entry is not None and entry['raw'] is raw else None
+
+    def grab_raw(self, region=None):
+        if region is None:
+            region = (0, 0, self._user32.GetSystemMetrics(0), self._user32.GetSystemMetrics(1))
+        left, top, width, height = [int(value) for value in region]
+        self._ensure_buffers(width, height)
+        
+        self._gdi32.BitBlt(self._memory_dc, 0, 0, width, height,
+                           self._screen_dc, left, top, self.SRCCOPY | self.CAPTUREBLT)
+        self._gdi32.GetDIBits(self._memory_dc, self._bitmap, 0, height,
+                              self._buffer.ctypes.data, self._ctypes.byref(self._bitmap_info), 0)
+        return self._buffer
+
+    def to_bgr(self, raw):
+        entry = self._entry_for(raw)
+        if entry is not None:
+            return cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=entry['bgr'])
+        return cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR)
+
+    def to_gray(self, raw):
+        entry = self._entry_for(raw)
+        if entry is not None:
+            return cv2.cvtColor(raw, cv2.COLOR_BGRA2GRAY, dst=entry['gray'])
+        return cv2.cvtColor(raw, cv2.COLOR_BGRA2GRAY)
+
+    def _release_bitmaps(self):
+        for entry in self._buffers.values():
+            self._gdi32.DeleteObject(entry['bitmap'])
+        self._buffers = {}
+        self._bitmap = None
+        self._buffer = None
+        self._size = None
+
+    def close(self):
+        self._release_bitmaps()
+        if self._memory_dc is not None:
+            self._gdi32.DeleteDC(self._memory_dc)
+            self._memory_dc = None
+        if self._screen_dc is not None:
+            self._user32.ReleaseDC(None, self._screen_dc)
+            self._screen_dc = None
+
+
+class ReplayFrameSource(FrameSource):
+    """回放截图后端：按文件名顺序循环读取目录中的截图（或单张图片），无需显示器即可运行整个检测流程"""
+
+    name = 'replay'
+
+    def __init__(self, path=None, frames=None, loop=True):
+        self.loop = loop
+        self.index = 0
+        if frames is not None:
+            self.frames = list(frames)
+        else:
+            if not path:
+                raise RuntimeError("回放截图后端需要指定截图文件或目录 (replay_path)")
+            if os.path.isdir(path):
+                names = sorted(name for name in os.listdir(path) if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')))
+                paths = [os.path.join(path, name) for name in names]
+            else:
+                paths = [path]
+            self.frames = [image for image in (cv2.imread(p) for p in paths) if image is not None]
+        if not self.frames:
+            raise RuntimeError("回放截图后端没有可用的截图: {}".format(path))
+
+    def grab_raw(self, region=None):
+        if self.index >= len(self.frames):
+            if not self.loop:
+                raise EOFError("回放截图已全部读取")
+            self.index = 0
+        frame = self.frames[self.index]
+        self.index += 1
         
+        if region is not None:
+            left, top, width, height = region
+            frame = frame[max(0, top):top + height, max(0, left):left + width]
+        return frame
+
+    def to_bgr(self, raw):
+        return raw
+
+    def to_gray(self, raw):
+        return cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY)
+
+
+FRAME_SOURCES = {
+    'pyautogui': PyAutoGuiFrameSource,
+    'gdi': GdiFrameSource,
+    'replay': ReplayFrameSource,
+}
+
+
+def create_frame_source(backend='auto', replay_path=None):
+    """按名称创建截图后端；auto 在 Windows 上优先使用 GDI 原生截图，失败时退回 pyautogui"""
+    if backend == 'replay':
+        return ReplayFrameSource(replay_path)
+    if backend == 'auto':
+        for candidate in (GdiFrameSource, PyAutoGuiFrameSource):
+            try:
+                return candidate()
+            except Exception:
+                continue
+        raise RuntimeError("没有可用的截图后端")
+    if backend not in FRAME_SOURCES:
+        raise ValueError("未知的截图后端: {}".format(backend))
+    return FRAME_SOURCES[backend]()
+
+
+MONITOR_SELECTIONS = ('all', 'primary', 'cursor')
+
+
+def parse_monitor_selection(value):
+    """解析显示器选择：all（全部）/ primary（主显示器）/ cursor（Cursor 窗口所在显示器），
+    或显示器编号列表（如 [2] 或 "1,2"，编号从1开始，主显示器为1）"""
+    if isinstance(value, (list, tuple)):
+        indices = value
+    else:
+        text = str(value).strip().lower()
+        if text in MONITOR_SELECTIONS:
+            return text
+        indices = [part for part in text.replace('，', ',').split(',') if part.strip()]
+    try:
+        selection = tuple(sorted(set(int(index) for index in indices)))
+    except (TypeError, ValueError):
+        return 'all'
+    return selection or 'all'
+
+
+def format_monitor_selection(selection):
+    """显示器选择的文本形式（界面显示用）"""
+    return selection if isinstance(selection, str) else ",".join(str(index) for index in selection)
+
+
+def enumerate_monitors():
+    """枚举显示器，返回 [{'index', 'name', 'left', 'top', 'width', 'height', 'primary'}]
+
+    坐标为虚拟桌面坐标（副显示器在主显示器左侧/上方时为负数），主显示器排第一（编号1），其余按位置排序。
+    Windows 上通过 EnumDisplayMonitors 枚举；其他平台只返回 pyautogui 报告的主屏幕；都不可用时返回空列表。
+    """
+    monitors = []
+    if sys.platform == 'win32' and win32api.available():
+        try:
+            for handle, dc, rect in win32api.EnumDisplayMonitors(None, None):
+                info = win32api.GetMonitorInfo(handle)
+                left, top, right, bottom = info['Monitor']
+                monitors.append({
+                    'name': info.get('Device', ''),
+                    'left': left, 'top': top, 'width': right - left, 'height': bottom - top,
+                    'primary': bool(info.get('Flags', 0) & 1),  # MONITORINFOF_PRIMARY
+                })
+        except Exception:
+            monitors = []
+    if not monitors and pyautogui.available():
+        try:
+            width, height = pyautogui.size()
+            monitors.append({'name': 'primary', 'left': 0, 'top': 0, 'width': width, 'height': height, 'primary': True})
+        except Exception:
+            pass
+
+    monitors.sort(key=lambda m: (not m['primary'], m['left'], m['top']))
+    for index, monitor in enumerate(monitors, 1):
+        monitor['index'] = index
+    return monitors
+
+
+def union_rect(monitors):
+    """多个显示器的外接矩形 (left, top, width, height)"""
+    left = min(m['left'] for m in monitors)
+    top = min(m['top'] for m in monitors)
+    right = max(m['left'] + m['width'] for m in monitors)
+    bottom = max(m['top'] + m['height'] for m in monitors)
+    return left, top, right - left, bottom - top
+
+
+def monitor_at(monitors, rect):
+    """返回与窗口矩形 (left, top, right, bottom) 重叠面积最大的显示器，没有重叠时返回 None"""
+    left, top, right, bottom = rect
+    best, best_area = None, 0
+    for monitor in monitors:
+        width = min(right, monitor['left'] + monitor['width']) - max(left, monitor['left'])
+        height = min(bottom, monitor['top'] + monitor['height']) - max(top, monitor['top'])
+        if width > 0 and height > 0 and width * height > best_area:
+            best, best_area = monitor, width * height
+    return best
+
+
+CONTROL_COMMANDS = ('start', 'stop', 'toggle', 'reload', 'status')
+
+
+class ClickBackend:
+    """点击后端基类：click(x, y) 在虚拟桌面坐标上单击鼠标左键，move(x, y) 只移动鼠标"""
+
+    name = 'base'
+
+    def click(self, x, y):
+        raise NotImplementedError
+
+    def move(self, x, y):
+        raise NotImplementedError
+
+    def close(self):
+        """释放后端资源"""
+        pass
+
+
+class SendInputClickBackend(ClickBackend):
+    """Windows SendInput 点击后端：移动、按下、抬起三个鼠标事件预先构造在同一个 INPUT 数组中，
+    每次点击只改写目标坐标，一次 SendInput 调用提交（不经过 pyautogui 的 PAUSE 延时和 failsafe 检查）"""
+
+    name = 'sendinput'
+
+    INPUT_MOUSE = 0
+    MOUSEEVENTF_MOVE = 0x0001
+    MOUSEEVENTF_LEFTDOWN = 0x0002
+    MOUSEEVENTF_LEFTUP = 0x0004
+    MOUSEEVENTF_VIRTUALDESK = 0x4000
+    MOUSEEVENTF_ABSOLUTE = 0x8000
+    SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN, SM_CXVIRTUALSCREEN, SM_CYVIRTUALSCREEN = 76, 77, 78, 79
+
+    def __init__(self):
+        if sys.platform != 'win32':
+            raise RuntimeError("SendInput 点击后端只支持 Windows")
+
+        import ctypes
+        from ctypes import wintypes
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [
+                ('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)
+            ]
+
+        # INPUT 的联合体中 MOUSEINPUT 最大，只声明它即可得到正确的结构体大小
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('mi', MOUSEINPUT)]
+
+        self._user32 = ctypes.windll.user32
+        self._user32.SendInput.argtypes = [wintypes.UINT, ctypes.c_void_p, ctypes.c_int]
+        self._user32.SendInput.restype = wintypes.UINT
+        self._input_size = ctypes.sizeof(INPUT)
+
+        # 预先构造的事件：[移动到目标, 左键按下, 左键抬起]
+        self._inputs = (INPUT * 3)()
+        for event, flags in zip(self._inputs, (
+                self.MOUSEEVENTF_MOVE | self.MOUSEEVENTF_ABSOLUTE | self.MOUSEEVENTF_VIRTUALDESK,
+                self.MOUSEEVENTF_LEFTDOWN, self.MOUSEEVENTF_LEFTUP)):
+            event.type = self.INPUT_MOUSE
+            event.mi.dwFlags = flags
+        self._move = (INPUT * 1)()
+        self._move[0].type = self.INPUT_MOUSE
+        self._move[0].mi.dwFlags = self._inputs[0].mi.dwFlags
+
+    def _normalize(self, event, x, y):
+        """虚拟桌面坐标 -> SendInput 绝对坐标（0~65535 覆盖整个虚拟桌面，显示器变化时随之更新）"""
+        metrics = self._user32.GetSystemMetrics
+        left, top = metrics(self.SM_XVIRTUALSCREEN), metrics(self.SM_YVIRTUALSCREEN)
+        width, height = max(2, metrics(self.SM_CXVIRTUALSCREEN)), max(2, metrics(self.SM_CYVIRTUALSCREEN))
+        event.mi.dx = round((x - left) * 65535 / (width - 1))
+        event.mi.dy = round((y - top) * 65535 / (height - 1))
+
+    def _send(self, inputs):
+        sent = self._user32.SendInput(len(inputs), inputs, self._input_size)
+        if sent != len(inputs):
+            # 目标窗口权限更高（UIPI）或输入被其他程序拦截
+            raise OSError("SendInput 只提交了 {}/{} 个事件".format(sent, len(inputs)))
+
+    def click(self, x, y):
+        self._normalize(self._inputs[0], x, y)
+        self._send(self._inputs)
+
+    def move(self, x, y):
+        self._normalize(self._move[0], x, y)
+        self._send(self._move)
+
+
+class PyAutoGuiClickBackend(ClickBackend):
+    """pyautogui 点击后端（原始实现）：跳过每次调用后的 PAUSE 延时"""
+
+    name = 'pyautogui'
+
+    def __init__(self):
+        if not pyautogui.available():
+            raise RuntimeError("pyautogui 不可用（需要图形桌面环境）")
+
+    def click(self, x, y):
+        pyautogui.click(x, y, _pause=False)
+
+    def move(self, x, y):
+        pyautogui.moveTo(x, y, _pause=False)
+
+
+class FakeClickBackend(ClickBackend):
+    """测试用后端：只记录点击和移动的坐标，on_click(x, y) 可模拟点击后界面的变化"""
+
+    name = 'fake'
+
+    def __init__(self, on_click=None):
+        self.on_click = on_click
+        self.clicks = []
+        self.moves = []
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+        if self.on_click is not None:
+            self.on_click(x, y)
+
+    def move(self, x, y):
+        self.moves.append((x, y))
+
+
+CLICK_BACKENDS = {
+    'sendinput': SendInputClickBackend,
+    'pyautogui': PyAutoGuiClickBackend,
+    'fake': FakeClickBackend,
+}
+
+
+def create_click_backend(backend='auto'):
+    """按名称创建点击后端；auto 在 Windows 上优先使用 SendInput，失败时退回 pyautogui"""
+    if backend == 'auto':
+        for candidate in (SendInputClickBackend, PyAutoGuiClickBackend):
+            try:
+                return candidate()
+            except Exception:
+                continue
+        raise RuntimeError("没有可用的点击后端")
+    if backend not in CLICK_BACKENDS:
+        raise ValueError("未知的点击后端: {}".format(backend))
+    return CLICK_BACKENDS[backend]()
+
+
+class ClickDispatcher:
+    """点击调度：通过点击后端发送点击，再用 still_visible() 只重新匹配按钮所在区域确认点击生效
+
+    点击后在 verify_timeout 秒内每 verify_poll 秒检查一次按钮是否消失（界面重绘需要几帧）；
+    超时仍在时立即重试，最多 retries 次，避免等完整个点击间隔后才发现点击没有生效。
+    still_visible() 返回 None 表示无法判断（例如截到的区域不完整），超时仍无法判断时不重试，避免重复点击。
+    """
+
+    def __init__(self, backend=None, retries=2, verify_timeout=0.5, verify_poll=0.05):
+        self.backend = backend
+        self.retries = retries
+        self.verify_timeout = verify_timeout
+        self.verify_poll = verify_poll
+
+    def dispatch(self, x, y, still_visible=None, on_retry=None):
+        """点击 (x, y)，返回 {'attempts', 'verified', 'click_ms', 'verify_ms'}
+
+        verified 为 True 表示按钮已消失，False 表示重试后仍在，None 表示没有提供确认函数（不确认）。
+        """
+        result = {'attempts': 0, 'verified': None, 'click_ms': 0.0, 'verify_ms': 0.0}
+        while True:
+            started = time.perf_counter()
+            self.backend.click(x, y)
+            result['attempts'] += 1
+            result['click_ms'] += (time.perf_counter() - started) * 1000
+            if still_visible is None:
+                return result
+
+            started = time.perf_counter()
+            deadline = started + self.verify_timeout
+            visible = True
+            while visible is not False and time.perf_counter() < deadline:
+                time.sleep(self.verify_poll)
+                visible = still_visible()
+            result['verify_ms'] += (time.perf_counter() - started) * 1000
+            if visible is False:
+                result['verified'] = True
+                return result
+            if visible is None:
+                return result
+            if result['attempts'] > self.retries:
+                result['verified'] = False
+                return result
+            if on_retry is not None:
+                on_retry(result['attempts'])
+
+
+class ControlBackend:
+    """控制输入后端基类：run(emit) 在后台线程中阻塞等待输入事件，收到时调用 emit(命令) 并得到结果字典；
+    stop() 让阻塞中的 run() 返回（不轮询，没有输入时线程不会被唤醒）"""
+
+    name = 'base'
+
+    def run(self, emit):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class Win32HotkeyBackend(ControlBackend):
+    """Windows 全局热键：RegisterHotKey 后阻塞在 GetMessage 上，只在按下热键时唤醒
+
+    使用 MOD_NOREPEAT 注册，按住不放时不会重复触发；stop() 向监听线程投递 WM_QUIT 结束消息循环。
+    """
+
+    name = 'win32-hotkey'
+
+    HOTKEY_ID = 1
+    MOD_NOREPEAT = 0x4000
+
+    def __init__(self, vk=0x71, command='toggle'):
+        if sys.platform != 'win32' or not win32gui.available():
+            raise RuntimeError("全局热键只支持 Windows（需要 pywin32）")
+        self.vk = vk            # 虚拟键码，默认 F2
+        self.command = command
+        self._thread_id = None
+
+    def run(self, emit):
+        # 热键注册在调用线程的消息队列上，必须在监听线程中注册
+        self._thread_id = win32api.GetCurrentThreadId()
+        win32gui.RegisterHotKey(None, self.HOTKEY_ID, self.MOD_NOREPEAT, self.vk)
+        try:
+            while True:
+                result, msg = win32gui.GetMessage(None, 0, 0)
+                if result == 0:      # WM_QUIT
+                    return
+                if result == -1:
+                    raise RuntimeError("GetMessage 失败")
+                if msg[1] == win32con.WM_HOTKEY and msg[2] == self.HOTKEY_ID:
+                    emit(self.command)
+        finally:
+            win32gui.UnregisterHotKey(None, self.HOTKEY_ID)
+
+    def stop(self):
+        if self._thread_id is not None:
+            win32api.PostThreadMessage(self._thread_id, win32con.WM_QUIT, 0, 0)
+
+
+class FakeControlBackend(ControlBackend):
+    """测试用后端：press(命令) 模拟一次按键，run 阻塞在队列上（在 Linux 上无需键盘即可测试控制逻辑）"""
+
+    name = 'fake'
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.replies = []
+
+    def press(self, command='toggle'):
+        self._queue.put(command)
+
+    def run(self, emit):
+        while True:
+            command = self._queue.get()
+            if command is None:
+                return
+            self.replies.append(emit(command))
+
+    def stop(self):
+        self._queue.put(None)
+
+
+class SocketControlBackend(ControlBackend):
+    """本地 IPC：在 127.0.0.1 上监听 TCP 端口，每个连接发送一行命令（可在命令后附加令牌），回复一行 JSON
+
+    accept() 阻塞等待连接，stop() 关闭监听 socket 使其返回。port 为 0 时由系统分配端口（ready 事件之后可读取 port）。
+    """
+
+    name = 'socket'
+
+    def __init__(self, port=0, host='127.0.0.1', token=''):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.ready = threading.Event()
+        self._server = None
+
+    def run(self, emit):
+        try:
+            server = self._server = socket.create_server((self.host, self.port))
+            self.port = server.getsockname()[1]
+        finally:
+            self.ready.set()
+        while True:
+            try:
+                connection, address = server.accept()
+            except OSError:
+                return  # 监听 socket 已关闭
+            with connection:
+                try:
+                    connection.settimeout(2.0)
+                    request = b''
+                    while b'\n' not in request and len(request) < 1024:
+                        chunk = connection.recv(1024)
+                        if not chunk:
+                            break
+                        request += chunk
+                    parts = request.decode('utf-8', 'replace').split()
+                    if self.token and (len(parts) < 2 or parts[1] != self.token):
+                        reply = {'ok': False, 'error': 'invalid token'}
+                    elif not parts:
+                        reply = {'ok': False, 'error': 'empty command'}
+                    else:
+                        reply = emit(parts[0])
+                    connection.sendall((json.dumps(reply, ensure_ascii=False) + "\n").encode('utf-8'))
+                except OSError:
+                    continue
+
+    @property
+    def listening(self):
+        return self._server is not None
+
+    def stop(self):
+        server, self._server = self._server, None
+        if server is not None:
+            # Linux 上只 close() 不会唤醒阻塞在 accept() 中的线程，先 shutdown
+            try:
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+
+
+def send_control_command(command, port, host='127.0.0.1', token='', timeout=5.0):
+    """向正在运行的程序发送控制命令，返回回复字典"""
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        line = command if not token else "{} {}".format(command, token)
+        connection.sendall((line + "\n").encode('utf-8'))
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = connection.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    return json.loads(reply.decode('utf-8'))
+
+
+class ControlChannel:
+    """控制子系统：每个输入后端在自己的后台线程中阻塞等待事件，命令统一交给 handler(命令) 处理并返回结果字典
+
+    同一命令在 debounce 秒内重复到达时忽略（防止按键抖动或脚本重复发送导致连续切换）。
+    """
+
+    def __init__(self, handler, log=None, debounce=0.3):
+        self.handler = handler
+        self.log = log or (lambda message: None)
+        self.debounce = debounce
+        self.backends = []
+        self._threads = []
+        self._last_command = {}
+        self._lock = threading.Lock()
+
+    def add(self, backend):
+        """启动一个输入后端"""
+        thread = threading.Thread(target=self._run_backend, args=(backend,), daemon=True)
+        self.backends.append(backend)
+        self._threads.append(thread)
+        thread.start()
+        return backend
+
+    def _run_backend(self, backend):
+        try:
+            backend.run(self.dispatch)
+        except Exception as e:
+            self.log("⚠️ 控制输入 {} 不可用: {}".format(backend.name, e))
+
+    def dispatch(self, command):
+        """校验并分发一条命令，返回结果字典"""
+        command = str(command).strip().lower()
+        if command not in CONTROL_COMMANDS:
+            return {'ok': False, 'error': "unknown command: {}".format(command), 'commands': list(CONTROL_COMMANDS)}
+        if command != 'status':
+            with self._lock:
+                now = time.monotonic()
+                if now - self._last_command.get(command, -self.debounce) < self.debounce:
+                    return {'ok': True, 'ignored': 'debounce'}
+                self._last_command[command] = now
+        try:
+            return self.handler(command)
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def close(self, timeout=1.0):
+        """停止全部输入后端并等待线程退出"""
+        for backend in self.backends:
+            try:
+                backend.stop()
+            except Exception:
+                pass
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+def create_control_channel(engine, handler):
+    """创建控制子系统：F2 全局热键（Windows）和本地控制端口（engine.control_port 大于 0 时）"""
+    channel = ControlChannel(handler, engine.log_message)
+    try:
+        channel.add(Win32HotkeyBackend())
+        engine.log_message("🔥 全局热键已启用: F2 (启动/停止监听)")
+    except RuntimeError as e:
+        engine.log_message("💡 {}".format(e))
+
+    if engine.control_port > 0:
+        backend = channel.add(SocketControlBackend(engine.control_port, token=engine.control_token))
+        if backend.ready.wait(2.0) and backend.listening:
+            engine.log_message("🎛️ 控制端口: 127.0.0.1:{} (命令: {})".format(backend.port, " / ".join(CONTROL_COMMANDS)))
+    return channel
+
+
+class ClickerEngine:
+    """检测/点击引擎：模板管理、截图、匹配、点击和监听循环，不依赖 Tkinter
+    
+    图形界面（CursorTemplateClicker）和无界面模式（--headless）共用同一个引擎。
+    on_log(日志行) 在任意线程收到带时间的日志，on_stats() 在点击成功或定期报告检测速率时调用。
+    """
+
+    def __init__(self, config_file="template_config.json", on_log=None, on_stats=None):
         # 配置文件路径
-        self.config_file = "template_config.json"
+        self.config_file = config_file
+        
+        # 回调（图形界面用于显示日志和刷新统计，无界面模式下为空）
+        self.on_log = on_log
+        self.on_stats = on_stats
+        
+        # 日志文件路径和轮转设置（单个文件上限5MB，保留3个历史文件）
+        self.log_file = "cursor_template_clicker.log"
+        self.log_max_bytes = 5 * 1024 * 1024
+        self.log_backup_count = 3
+        self.log_index = LogIndex(self.log_file)
+        self.log_listener = None
+        self.log_file_handler = None
         
         # 核心变量
         self.templates = []
         self.running = False
+        self.monitoring_thread = None
         self.click_count = 0
         self.last_click_time = 0
-        self.cursor_window = None
+        self.cursor_window = None  # 缓存的 Cursor 窗口句柄（窗口模式 / cursor 显示器选择）
         self.match_threshold = 0.8
         
+        # 检测设置（与配置文件中的同名项对应，图形界面通过控件修改）
+        self.interval = 2.0             # 点击间隔（秒）：任意两次点击之间的最短间隔
+        self.click_cooldown = 2.0       # 模板冷却（秒）：模板点击后跳过该模板匹配的时间
+        self.test_mode = False          # 测试模式：仅检测不点击
+        self.batch_detection = True     # 批量检测：每帧截图匹配全部模板
+        self.pyramid_matching = True    # 金字塔匹配：先缩小粗定位再原图确认
+        self.template_atlas_enabled = True  # 模板图集：相似模板共用一次粗匹配（需要金字塔匹配）
+        self.roi_cache_enabled = True   # 区域缓存：优先在上次命中位置附近搜索
+        self.frame_diff = True          # 帧差检测：画面未变化时跳过匹配
+        self.match_mode = 'gray'        # 匹配通道：color / gray / edge
+        self.multi_scale = True         # 多尺度匹配：适配不同 DPI 缩放
+        self.cpu_budget = 30            # 检测耗时占比上限（百分比）
+        
         # 模板遍历相关
         self.current_template_index = 0
+        self.match_variant = 'image'  # 当前匹配通道对应的模板图像键（开始监听时按配置设置）
         
-        # GUI变量
-        self.interval_var = tk.StringVar(value="2.0")
-        self.threshold_var = tk.DoubleVar(value=0.8)
-        self.test_mode_var = tk.BooleanVar(value=False)
-        self.auto_start_var = tk.BooleanVar(value=False)  # 新增：自动启动选项
-        self.only_24h_log_var = tk.BooleanVar(value=True)  # 新增：24小时日志过滤选项
-        
-        # 设置日志
-        self.setup_logging()
-        
-        # 全局热键相关
-        self.hotkey_thread = None
-        self.hotkey_running = False
-        
-        # 创建GUI
-        self.create_gui()
+        # 检测统计（截图速率 / 匹配速率）
+        self.detection_stats = DetectionStats()
+        self.stats_report_interval = 30  # 每30秒在日志中报告一次检测速率
         
-        # 启动热键监听
-        self.setup_global_hotkey()
-        
-        # 加载保存的配置
-        self.load_config()
+        # 金字塔匹配引擎（粗到精搜索）
+        self.pyramid_matcher = PyramidMatcher()
         
-        # 如果启用自动启动且有模板，自动开始监听
-        if self.auto_start_var.get() and self.templates:
-            self.root.after(2000, self.auto_start_monitoring)  # 延迟2秒启动
+        # 区域缓存（上次命中位置优先搜索）
+        self.roi_cache = RoiCache()
         
-        self.log_message("🖼️ Cursor Auto Accept 全屏图像匹配监听程序启动")
-        self.log_message("🌟 新特性: 全屏模板匹配 - 无需复杂的窗口检测，更稳定可靠！")
-        if not self.templates:
-            self.log_message("💡 提示: 请先加载Accept按钮模板，然后开始监听")
-        else:
-            self.log_message("💡 已加载 {} 个模板，{}".format(
-                len(self.templates), 
-                "将自动开始监听" if self.auto_start_var.get() else "可以开始监听"
-            ))
+        # 帧差检测（画面静止时跳过匹配）
+        self.change_detector = FrameChangeDetector()
         
-    def setup_logging(self):
-        """配置日志"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('cursor_template_clicker.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
+        # 多尺度匹配（DPI 缩放自适应）
+        self.scale_matcher = MultiScaleMatcher()
         
-    def create_gui(self):
-        """创建图形界面"""
-        # 创建笔记本标签页
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        # 模板图集（尺寸相近的相似模板分组，每帧每组只做一次粗匹配）
+        self.template_atlas = TemplateAtlas(self.pyramid_matcher, self.scale_matcher)
         
-        # 主控制面板
-        main_frame = ttk.Frame(notebook)
-        notebook.add(main_frame, text="主控制")
+        # 逐模板检测状态机（出现 → 确认 → 点击 → 冷却）和按帧签名缓存的匹配结果
+        self.tracker = TemplateTracker()
+        self.cooling = []  # 本帧冷却中（跳过匹配）的模板索引
         
-        # 模板管理面板
-        template_frame = ttk.Frame(notebook)
-        notebook.add(template_frame, text="模板管理")
+        # 多进程匹配引擎（parallel_workers > 0 时在开始监听时创建）
+        self.parallel_workers = 0
+        self.parallel_engine = None
+        self._prefetched = {}           # 本帧多进程批量扫描结果：(模板路径, 缩放比例) -> (最大置信度, 左上角坐标)
+        self._prefetched_image = None
         
-        # 日志查看面板
-        log_frame = ttk.Frame(notebook)
-        notebook.add(log_frame, text="日志查看")
+        # 自适应采样调度（活跃时快速采样，静止时退避，并限制 CPU 占用）
+        self.poll_scheduler = PollScheduler()
         
-        # 创建主控制面板内容
-        self.create_main_panel(main_frame)
+        # 截图后端（首次截图时按配置创建）
+        self.capture_backend = 'auto'
+        self.replay_path = ''
+        self.frame_source = None
+        self._frame_source_lock = threading.Lock()
         
-        # 创建模板管理面板内容
-        self.create_template_panel(template_frame)
+        # 点击调度（点击后端首次点击时按配置创建；点击后只重新匹配按钮区域确认生效，未生效时立即重试）
+        self.click_backend = 'auto'
+        self.click_verify = True
+        self.click_verify_margin = 8  # 确认时在按钮周围多截取的像素
+        self.click_retry_backoff = 0.5  # 点击未生效时该模板暂停匹配的秒数（之后重新确认再点击）
+        self.click_dispatcher = ClickDispatcher()
+        self.last_click = {}          # 最近一次点击的调度结果（attempts / verified / 耗时）
         
-        # 创建日志面板内容
-        self.create_log_panel(log_frame)
+        # 多显示器：只截取选中的显示器（all / primary / cursor / 显示器编号），截图和点击使用虚拟桌面坐标
+        self.monitors = 'all'
+        self.monitor_refresh_interval = 5.0  # 重新枚举显示器/定位 Cursor 窗口的间隔（秒）
+        self.capture_region = None           # 当前截图区域 (left, top, width, height)，None 为后端默认区域
+        self.capture_origin = (0, 0)         # 截图左上角的虚拟桌面坐标，匹配位置加上它得到点击坐标
+        self._monitors_checked_at = 0
+        self._monitor_region = None
+        self._window_searched_at = 0
+        self._notes = {}
         
-    def create_main_panel(self, parent):
-        """创建主控制面板"""
-        # 控制面板
-        control_frame = ttk.LabelFrame(parent, text="监听控制", padding="10")
-        control_frame.pack(fill=tk.X, pady=(0, 10))
+        # 窗口模式：只截取 Cursor 窗口矩形（窗口句柄缓存在 cursor_window 中）
+        self.window_mode = False
         
-        # 第一行：基本控制
-        row1 = ttk.Frame(control_frame)
-        row1.pack(fill=tk.X, pady=(0, 10))
+        # 模板编译缓存（预处理结果保存到磁盘，下次启动直接映射）
+        self.template_cache_enabled = True
+        self.template_cache = TemplateCache()
         
-        self.start_button = ttk.Button(row1, text="开始监听", command=self.start_monitoring, style="Accent.TButton")
-        self.start_button.pack(side=tk.LEFT, padx=(0, 10))
+        # 热路径计时（各阶段耗时的滚动分位数，可导出逐帧轨迹）
+        self.profiling = True
+        self.profiler = HotPathProfiler()
         
-        self.stop_button = ttk.Button(row1, text="停止监听", command=self.stop_monitoring, state=tk.DISABLED)
-        self.stop_button.pack(side=tk.LEFT, padx=(0, 10))
+        # 本地控制端口（0 为关闭），脚本可通过它发送 start / stop / toggle / reload / status
+        self.control_port = 0
+        self.control_token = ''
         
-
+        # 会话录制（默认关闭，开始监听时按配置创建录制会话）
+        self.record_session = False
+        self.recorder = SessionRecorder()
+        self.active_recorder = None
         
-        # 第二行：热键提示和自动启动
-        row2 = ttk.Frame(control_frame)
-        row2.pack(fill=tk.X, pady=(0, 10))
+    def setup_logging(self):
+        """配置日志：监听线程只把日志放入缓冲，文件写入、索引和轮转由后台线程批量完成"""
+        buffer_handler, self.log_listener, self.log_file_handler = create_async_file_logging(
+            self.log_file, self.log_max_bytes, self.log_backup_count, log_index=self.log_index)
+        self.log_listener.start()
+        logging.basicConfig(level=logging.INFO, handlers=[buffer_handler])
+        self.logger = logging.getLogger(__name__)
         
-        hotkey_label = ttk.Label(row2, text="🔥 全局快捷键: F2 (启动/停止监听)", 
-                                font=("Arial", 10, "bold"), foreground="red")
-        hotkey_label.pack(side=tk.LEFT)
+    def clear_log_files(self):
+        """清空日志：清空当前日志文件，删除轮转备份及其索引"""
+        for path, offset, size in log_segments(self.log_file)[:-1]:
+            os.remove(path)
+            if os.path.exists(path + '.idx'):
+                os.remove(path + '.idx')
+        with open(self.log_file, 'w', encoding='utf-8') as f:
+            f.write("")
+        self.log_index.reset()
         
-        # 自动启动选项
-        auto_start_check = ttk.Checkbutton(row2, text="启动时自动开始监听", 
-                                          variable=self.auto_start_var,
-                                          command=self.save_config)
-        auto_start_check.pack(side=tk.RIGHT)
+    def log_message(self, message):
+        """记录日志信息（可在任意线程调用）"""
+        # 写入日志文件
+        logging.info(message)
         
-        # 第三行：设置选项
-        row3 = ttk.Frame(control_frame)
-        row3.pack(fill=tk.X)
+        if self.on_log is not None:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            self.on_log("[{}] {}".format(timestamp, message))
         
-        # 点击间隔设置
-        ttk.Label(row3, text="点击间隔(秒):").pack(side=tk.LEFT)
-        interval_entry = ttk.Entry(row3, textvariable=self.interval_var, width=10)
-        interval_entry.pack(side=tk.LEFT, padx=(5, 15))
-        interval_entry.bind('<KeyRelease>', lambda e: self.save_config())
+    def notify_stats(self):
+        """通知前端刷新统计信息"""
+        if self.on_stats is not None:
+            self.on_stats()
         
-        # 匹配阈值设置
-        ttk.Label(row3, text="匹配阈值:").pack(side=tk.LEFT)
-        threshold_scale = ttk.Scale(row3, from_=0.5, to=1.0, 
-                                   variable=self.threshold_var, 
-                                   command=self.update_threshold_label,
-                                   length=150)
-        threshold_scale.pack(side=tk.LEFT, padx=(5, 10))
+    def read_config(self):
+        """读取配置文件，文件不存在时返回空字典"""
+        if not os.path.exists(self.config_file):
+            return {}
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
         
-        self.threshold_label = ttk.Label(row3, text="0.80")
-        self.threshold_label.pack(side=tk.LEFT, padx=(0, 15))
+    def apply_config(self, config):
+        """应用配置中的检测设置（不加载模板）"""
+        self.interval = float(config.get('interval', self.interval))
+        self.match_threshold = float(config.get('threshold', self.match_threshold))
+        self.test_mode = bool(config.get('test_mode', False))
+        self.batch_detection = bool(config.get('batch_detection', True))
+        self.pyramid_matching = bool(config.get('pyramid_matching', True))
+        self.template_atlas_enabled = bool(config.get('template_atlas', True))
+        self.roi_cache_enabled = bool(config.get('roi_cache', True))
+        self.roi_cache.ttl = float(config.get('roi_cache_ttl', self.roi_cache.ttl))
+        self.frame_diff = bool(config.get('frame_diff', True))
+        self.tracker.confirm_frames = max(1, int(config.get('confirm_frames', self.tracker.confirm_frames)))
+        self.click_cooldown = max(0.0, float(config.get('click_cooldown', self.click_cooldown)))
+        self.capture_backend = config.get('capture_backend', 'auto')
+        self.click_backend = config.get('click_backend', 'auto')
+        self.click_verify = bool(config.get('click_verify', True))
+        self.click_dispatcher.retries = max(0, int(config.get('click_retries', self.click_dispatcher.retries)))
+        self.monitors = parse_monitor_selection(config.get('monitors', 'all'))
+        self.window_mode = bool(config.get('window_mode', False))
+        self.multi_scale = bool(config.get('multi_scale', True))
+        self.cpu_budget = min(100, max(5, int(config.get('cpu_budget', 30))))
+        self.poll_scheduler.min_interval = float(config.get('poll_min_interval', self.poll_scheduler.min_interval))
+        self.poll_scheduler.max_interval = float(config.get('poll_max_interval', self.poll_scheduler.max_interval))
+        self.scale_matcher.scales = tuple(float(scale) for scale in config.get('match_scales', self.scale_matcher.scales))
+        match_mode = config.get('match_mode', 'gray')
+        self.match_mode = match_mode if match_mode in MATCH_MODES else 'gray'
+        self.replay_path = config.get('replay_path', '')
+        self.parallel_workers = int(config.get('parallel_workers', 0))
+        self.template_cache_enabled = bool(config.get('template_cache', True))
+        self.profiling = bool(config.get('profiling', True))
+        self.profiler.trace_frames = max(0, int(config.get('perf_trace_frames', self.profiler.trace_frames)))
+        self.record_session = bool(config.get('record_session', False))
+        self.control_port = int(config.get('control_port', 0))
+        self.control_token = str(config.get('control_token', ''))
+        self.recorder.record_dir = config.get('record_dir', self.recorder.record_dir)
+        self.recorder.budget_bytes = int(float(config.get('record_budget_mb', self.recorder.budget_bytes / (1024 * 1024))) * 1024 * 1024)
+        cache_dir = config.get('template_cache_dir', self.template_cache.cache_dir)
+        if cache_dir != self.template_cache.cache_dir:
+            self.template_cache = TemplateCache(cache_dir)
         
-        # 测试模式
-        test_check = ttk.Checkbutton(row3, text="测试模式(仅检测不点击)", variable=self.test_mode_var)
-        test_check.pack(side=tk.RIGHT)
+        # 日志轮转设置（文件处理器已创建，直接更新其参数）
+        self.log_max_bytes = int(config.get('log_max_bytes', self.log_max_bytes))
+        self.log_backup_count = int(config.get('log_backup_count', self.log_backup_count))
+        if self.log_file_handler is not None:
+            self.log_file_handler.maxBytes = self.log_max_bytes
+            self.log_file_handler.backupCount = self.log_backup_count
         
-        # 状态显示面板
-        status_frame = ttk.LabelFrame(parent, text="运行状态", padding="10")
-        status_frame.pack(fill=tk.BOTH, expand=True)
+    def config_dict(self):
+        """当前检测设置和模板列表（写入配置文件的内容）"""
+        return {
+            'interval': str(self.interval),
+            'threshold': self.match_threshold,
+            'test_mode': self.test_mode,
+            'batch_detection': self.batch_detection,
+            'pyramid_matching': self.pyramid_matching,
+            'template_atlas': self.template_atlas_enabled,
+            'roi_cache': self.roi_cache_enabled,
+            'roi_cache_ttl': self.roi_cache.ttl,
+            'frame_diff': self.frame_diff,
+            'confirm_frames': self.tracker.confirm_frames,
+            'click_cooldown': self.click_cooldown,
+            'match_mode': self.match_mode,
+            'multi_scale': self.multi_scale,
+            'match_scales': list(self.scale_matcher.scales),
+            'cpu_budget': self.cpu_budget,
+            'poll_min_interval': self.poll_scheduler.min_interval,
+            'poll_max_interval': self.poll_scheduler.max_interval,
+            'capture_backend': self.capture_backend,
+            'click_backend': self.click_backend,
+            'click_verify': self.click_verify,
+            'click_retries': self.click_dispatcher.retries,
+            'monitors': self.monitors if isinstance(self.monitors, str) else list(self.monitors),
+            'window_mode': self.window_mode,
+            'replay_path': self.replay_path,
+            'parallel_workers': self.parallel_workers,
+            'template_cache': self.template_cache_enabled,
+            'template_cache_dir': self.template_cache.cache_dir,
+            'profiling': self.profiling,
+            'perf_trace_frames': self.profiler.trace_frames,
+            'control_port': self.control_port,
+            'control_token': self.control_token,
+            'record_session': self.record_session,
+            'record_dir': self.recorder.record_dir,
+            'record_budget_mb': self.recorder.budget_bytes // (1024 * 1024),
+            'log_max_bytes': self.log_max_bytes,
+            'log_backup_count': self.log_backup_count,
+            'template_paths': [template['path'] for template in self.templates]
+        }
         
-        # 状态信息
-        self.status_text = tk.Text(status_frame, height=15, wrap=tk.WORD)
-        scrollbar = ttk.Scrollbar(status_frame, orient=tk.VERTICAL, command=self.status_text.yview)
-        self.status_text.configure(yscrollcommand=scrollbar.set)
+    def load_config(self, load_templates=True):
+        """加载配置文件中的设置和模板，返回配置字典（供前端读取界面相关设置）
         
-        self.status_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        load_templates 为 False 时只应用设置，模板由调用方自行加载（图形界面在后台线程解码）。
+        """
+        config = self.read_config()
+        self.apply_config(config)
         
-    def update_threshold_label(self, value):
-        """更新阈值标签"""
-        self.threshold_label.config(text="{:.2f}".format(float(value)))
-        self.match_threshold = float(value)
+        # 加载模板路径列表
+        template_paths = config.get('template_paths', [])
+        if template_paths and load_templates:
+            self.log_message("🔄 正在加载保存的模板配置...")
+            loaded_count = self.load_templates(template_paths)
+            if loaded_count > 0:
+                self.log_message("✅ 成功加载 {} 个保存的模板".format(loaded_count))
+                self.display_template_order()
+            else:
+                self.log_message("❌ 没有找到有效的模板文件")
+        return config
         
-
-            
-    def view_log(self):
-        """查看日志文件"""
-        log_file = "cursor_template_clicker.log"
+    def save_config(self, extra=None):
+        """保存当前配置，extra 为前端自己的设置项（如自动启动、日志过滤）"""
+        config = self.config_dict()
+        if extra:
+            config.update(extra)
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
         
+    def load_template_file(self, file_path, quiet=False):
+        """读取模板图片并加入模板列表，返回模板字典；已加载或读取失败时返回 None"""
         try:
-            if os.path.exists(log_file):
-                # 创建日志查看窗口
-                log_window = tk.Toplevel(self.root)
-                log_window.title("运行日志")
-                log_window.geometry("800x600")
-                
-                # 创建文本框和滚动条
-                text_frame = ttk.Frame(log_window)
-                text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-                
-                text_widget = tk.Text(text_frame, wrap=tk.WORD, font=("Consolas", 10))
-                scrollbar = ttk.Scrollbar(text_frame, orient="vertical", command=text_widget.yview)
-                text_widget.configure(yscrollcommand=scrollbar.set)
-                
-                text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-                scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-                
-                # 使用全局的24小时过滤设置加载日志内容
-                log_content = self.get_filtered_log_content(log_file, self.only_24h_log_var.get())
-                text_widget.insert(tk.END, log_content)
-                text_widget.see(tk.END)  # 滚动到底部
-                text_widget.config(state=tk.DISABLED)  # 设为只读
-                
-                # 添加按钮
-                button_frame = ttk.Frame(log_window)
-                button_frame.pack(fill=tk.X, padx=10, pady=5)
-                
-                ttk.Button(button_frame, text="刷新", 
-                          command=lambda: self.refresh_log_with_filter(text_widget, log_file, self.only_24h_log_var)).pack(side=tk.LEFT, padx=(0, 10))
-                ttk.Button(button_frame, text="清空日志", 
-                          command=lambda: self.clear_log(log_file)).pack(side=tk.LEFT)
-                
-            else:
-                messagebox.showinfo("提示", "日志文件不存在")
-                
-        except Exception as e:
-            messagebox.showerror("错误", "无法打开日志文件: {}".format(e))
-            
-    def get_filtered_log_content(self, log_file, only_24h=False):
-        """获取过滤后的日志内容"""
-        try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            if not only_24h:
-                # 如果不过滤，返回最后1000行
-                recent_lines = lines[-1000:]
-                return ''.join(recent_lines)
-            
-            # 过滤24小时内的日志
-            from datetime import datetime, timedelta
-            now = datetime.now()
-            twenty_four_hours_ago = now - timedelta(hours=24)
-            
-            filtered_lines = []
-            for line in lines:
-                try:
-                    # 尝试解析日志中的时间戳（格式：2024-12-09 15:30:25,123）
-                    if len(line) > 19 and line[4] == '-' and line[7] == '-':
-                        timestamp_str = line[:19]  # 提取前19个字符作为时间戳
-                        log_time = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                        
-                        # 如果日志时间在24小时内，保留这行
-                        if log_time >= twenty_four_hours_ago:
-                            filtered_lines.append(line)
-                except (ValueError, IndexError):
-                    # 如果无法解析时间戳，保留这行（可能是多行日志的续行）
-                    if filtered_lines:  # 只有在已经有过滤行的情况下才添加
-                        filtered_lines.append(line)
+            template_name = os.path.basename(file_path)
+            if is_mask_file(file_path):
+                if not quiet:
+                    self.log_message("⚠️ {} 是遮罩文件，请加载对应的模板图片".format(template_name))
+                return None
             
-            # 如果过滤后没有内容，显示提示信息
-            if not filtered_lines:
-                return "📅 24小时内没有日志记录\n\n💡 提示：可以取消勾选上方的'只保留24小时日志'来查看所有日志"
+            # 检查是否已经加载过这个模板
+            existing_template = next((t for t in self.templates if t['path'] == file_path), None)
+            if existing_template:
+                if not quiet:
+                    self.log_message("⚠️ 模板已存在: {}".format(template_name))
+                return None
             
-            return ''.join(filtered_lines)
+            template_info = self.load_compiled_template(file_path)
+            if template_info is None:
+                if not quiet:
+                    self.log_message("❌ 无法加载模板: {}".format(file_path))
+                return None
             
-        except Exception as e:
-            return "读取日志失败: {}".format(e)
-
-    def refresh_log_with_filter(self, text_widget, log_file, only_24h_var):
-        """使用过滤器刷新日志显示"""
-        try:
-            log_content = self.get_filtered_log_content(log_file, only_24h_var.get())
-                
-            text_widget.config(state=tk.NORMAL)
-            text_widget.delete(1.0, tk.END)
-            text_widget.insert(tk.END, log_content)
-            text_widget.see(tk.END)
-            text_widget.config(state=tk.DISABLED)
+            self.templates.append(template_info)
             
-        except Exception as e:
-            messagebox.showerror("错误", "刷新日志失败: {}".format(e))
-    
-    def refresh_log(self, text_widget, log_file):
-        """刷新日志显示（保留原方法以兼容其他地方的调用）"""
-        try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                recent_lines = lines[-1000:]
-                log_content = ''.join(recent_lines)
-                
-            text_widget.config(state=tk.NORMAL)
-            text_widget.delete(1.0, tk.END)
-            text_widget.insert(tk.END, log_content)
-            text_widget.see(tk.END)
-            text_widget.config(state=tk.DISABLED)
+            if not quiet:
+                self.log_message("✅ 加载模板: {}".format(template_name))
+            return template_info
             
         except Exception as e:
-            messagebox.showerror("错误", "刷新日志失败: {}".format(e))
-            
-    def clear_log(self, log_file):
-        """清空日志文件"""
-        result = messagebox.askyesno("确认", "确定要清空日志文件吗？")
-        if result:
-            try:
-                with open(log_file, 'w', encoding='utf-8') as f:
-                    f.write("")
-                messagebox.showinfo("成功", "日志已清空")
-            except Exception as e:
-                messagebox.showerror("错误", "清空日志失败: {}".format(e))
+            if not quiet:
+                self.log_message("加载模板失败: {}".format(e))
+            return None
         
-    def load_config(self):
-        """加载保存的配置"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                
-                # 加载设置
-                self.interval_var.set(config.get('interval', '2.0'))
-                self.threshold_var.set(config.get('threshold', 0.8))
-                self.test_mode_var.set(config.get('test_mode', False))
-                self.auto_start_var.set(config.get('auto_start', False))
-                self.only_24h_log_var.set(config.get('only_24h_log', True))
-                
-                # 更新匹配阈值
-                self.match_threshold = self.threshold_var.get()
-                self.update_threshold_label(self.match_threshold)
-                
-                # 加载模板路径列表
-                template_paths = config.get('template_paths', [])
-                if template_paths:
-                    self.log_message("🔄 正在加载保存的模板配置...")
-                    loaded_count = 0
-                    for template_path in template_paths:
-                        if os.path.exists(template_path):
-                            self.load_template_file(template_path, quiet=True)
-                            loaded_count += 1
-                        else:
-                            self.log_message("⚠️ 模板文件不存在: {}".format(template_path))
-                    
-                    if loaded_count > 0:
-                        self.log_message("✅ 成功加载 {} 个保存的模板".format(loaded_count))
-                        self.display_template_order()
-                    else:
-                        self.log_message("❌ 没有找到有效的模板文件")
-                
-        except Exception as e:
-            self.log_message("⚠️ 加载配置失败: {}".format(e))
-
-    def save_config(self):
-        """保存当前配置"""
+    def compile_template(self, template_info):
+        """预先计算模板的金字塔缩小图和多尺度版本（各匹配通道和遮罩），这些结果会写入模板缓存"""
+        variants = list(MATCH_MODES.values()) + (['mask'] if 'mask' in template_info else [])
+        for variant in variants:
+            self.pyramid_matcher.small_template(template_info, variant)
+        for scale in self.scale_matcher.scales:
+            scaled_info = self.scale_matcher.scaled_template(template_info, scale)
+            if scaled_info is not template_info:
+                for variant in variants:
+                    self.pyramid_matcher.small_template(scaled_info, variant)
+        return template_info
+        
+    def load_compiled_template(self, file_path):
+        """读取模板：缓存命中时直接映射预处理好的数组，否则解码图片（含透明通道/遮罩旁路文件）、预处理并写入缓存；
+        无法解码时返回 None"""
+        if not self.template_cache_enabled:
+            image, mask = read_template_file(file_path)
+            if image is None:
+                return None
+            return {'name': os.path.basename(file_path), 'path': file_path, 'image': image, **template_variants(image, mask)}
+        
+        pyramid_scale, scales = self.pyramid_matcher.scale, self.scale_matcher.scales
+        mask_path = mask_path_for(file_path)
+        template_info, digest, data = self.template_cache.load(
+            file_path, pyramid_scale, scales, mask_path if os.path.exists(mask_path) else None)
+        if template_info is not None:
+            return template_info
+        
+        image, mask = read_template_file(file_path, data)
+        if image is None:
+            return None
+        
+        template_info = self.compile_template(
+            {'name': os.path.basename(file_path), 'path': file_path, 'image': image, **template_variants(image, mask)})
         try:
-            config = {
-                'interval': self.interval_var.get(),
-                'threshold': self.threshold_var.get(),
-                'test_mode': self.test_mode_var.get(),
-                'auto_start': self.auto_start_var.get(),
-                'only_24h_log': self.only_24h_log_var.get(),
-                'template_paths': [template['path'] for template in self.templates]
-            }
-            
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
-                
-        except Exception as e:
-            self.log_message("⚠️ 保存配置失败: {}".format(e))
-
-    def auto_start_monitoring(self):
-        """自动启动监听"""
-        if self.templates and not self.running:
-            self.log_message("🚀 自动启动监听...")
-            self.start_monitoring()
-
+            self.template_cache.store(digest, template_info, pyramid_scale, scales)
+        except OSError as e:
+            self.log_message("⚠️ 写入模板缓存失败: {}".format(e))
+        return template_info
+        
+    def load_templates(self, template_paths, progress=None):
+        """按顺序加载模板文件，返回存在的模板文件数；progress(已处理数, 总数) 在每个文件处理后调用"""
+        loaded_count = 0
+        for index, template_path in enumerate(template_paths):
+            if os.path.exists(template_path):
+                self.load_template_file(template_path, quiet=True)
+                loaded_count += 1
+            else:
+                self.log_message("⚠️ 模板文件不存在: {}".format(template_path))
+            if progress is not None:
+                progress(index + 1, len(template_paths))
+        return loaded_count
+        
+    def run_mode_text(self):
+        """运行模式文本：窗口模式下只截取 Cursor 窗口，否则截取选中的显示器"""
+        return "{}{}".format("窗口" if self.window_mode else "全屏", "测试模式" if self.test_mode else "监听模式")
+        
+    def capture_scope_text(self):
+        """检测范围文本：按窗口模式和显示器选择描述每帧截取的区域"""
+        selection = self.monitors
+        if selection == 'primary':
+            monitors = "主显示器"
+        elif selection == 'cursor':
+            monitors = "Cursor窗口所在显示器"
+        elif isinstance(selection, tuple):
+            monitors = "显示器 {}".format(format_monitor_selection(selection))
+        else:
+            monitors = "全部显示器"
+        if self.window_mode:
+            return "Cursor窗口区域 (找不到窗口或窗口最小化时扫描{})".format(monitors)
+        return monitors
+        
+    def log_run_settings(self):
+        """记录本次监听的运行设置"""
+        self.log_message("📊 运行模式: {}".format(self.run_mode_text()))
+        self.log_message("📦 检测方式: {}".format("批量检测(每帧匹配全部模板)" if self.batch_detection else "逐帧轮换(每帧匹配一个模板)"))
+        self.log_message("🎨 匹配通道: {}".format(self.match_mode))
+        if self.multi_scale:
+            self.log_message("📐 多尺度匹配: {}".format(", ".join("{:g}".format(scale) for scale in self.scale_matcher.scales)))
+        self.log_message("🔺 匹配算法: {}".format("金字塔匹配(缩小粗定位 + 原图邻域确认)" if self.pyramid_matching else "全量匹配"))
+        self.log_message("🌐 检测范围: {}".format(self.capture_scope_text()))
+        self.log_message("⏱️ 点击间隔: {} 秒，模板冷却: {:g} 秒".format(self.interval, self.click_cooldown))
+        self.log_message("🎯 匹配阈值: {:.2f}".format(self.match_threshold))
+        self.display_template_order()
+        
+    def start(self):
+        """在后台线程中开始监听，返回是否启动"""
+        if self.running or not self.templates:
+            return False
+        
+        # 上一次的监听线程可能还在结束当前一帧，等它退出后再启动，避免两个监听线程同时点击
+        if not self.wait_stopped():
+            self.log_message("⚠️ 上一次的监听线程仍未退出，暂不开始监听，请稍后重试")
+            return False
+        self.running = True
+        self.monitoring_thread = threading.Thread(target=self.monitoring_loop)
+        self.monitoring_thread.daemon = True
+        self.monitoring_thread.start()
+        
+        self.log_message("🚀 开始监听 Accept 按钮")
+        self.log_run_settings()
+        return True
+        
+    def stop(self):
+        """停止监听（监听线程在当前一帧结束后退出，休眠中的线程立即唤醒）"""
+        self.running = False
+        self.poll_scheduler.wake()
+        self.log_message("⏹️ 停止监听")
+        self.log_message("📈 本次检测速率 - {}".format(self.stats_summary()))
+        
+    def thread_alive(self):
+        """监听线程是否仍在运行（stop 之后线程会在当前一帧结束后退出）"""
+        return self.monitoring_thread is not None and self.monitoring_thread.is_alive()
+        
+    def wait_stopped(self, timeout=10):
+        """等待监听线程退出（在监听线程内调用时直接返回），返回线程是否已退出"""
+        thread = self.monitoring_thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            return False
+        self.monitoring_thread = None
+        return True
+        
+    def reload(self):
+        """重新读取配置文件和模板：监听中时先停止并等待监听线程退出，加载完成后重新开始，返回模板数"""
+        was_running = self.running
+        if was_running:
+            self.stop()
+        if not self.wait_stopped():
+            # 监听线程仍在使用模板列表，不能清空重新加载
+            self.log_message("⚠️ 监听线程仍未退出，暂不重新加载配置，请稍后重试")
+            return len(self.templates)
+        self.templates.clear()
+        self.load_config()
+        if was_running:
+            self.start()
+        return len(self.templates)
+        
+    def status(self):
+        """当前运行状态（控制命令 status 的回复）"""
+        return {
+            'ok': True,
+            'running': self.running,
+            'templates': len(self.templates),
+            'clicks': self.click_count,
+            'stats': self.stats_summary(),
+        }
+        
+    def handle_control_command(self, command):
+        """处理控制命令（无界面模式，在控制线程中调用），返回结果字典"""
+        if command == 'toggle':
+            command = 'stop' if self.running else 'start'
+        if command == 'start' and not self.running:
+            if not self.templates:
+                return {'ok': False, 'error': '没有加载模板'}
+            if not self.start():
+                return {'ok': False, 'error': '上一次的监听线程仍未退出，未能开始监听'}
+            self.log_message("🎛️ 控制命令: 开始监听")
+        elif command == 'stop' and self.running:
+            self.log_message("🎛️ 控制命令: 停止监听")
+            self.stop()
+        elif command == 'reload':
+            self.log_message("🎛️ 控制命令: 重新加载配置")
+            self.reload()
+        return self.status()
+        
+    def close(self):
+        """等待监听线程退出，再释放截图/点击后端并写完缓冲中剩余的日志"""
+        self.running = False
+        self.poll_scheduler.wake()
+        self.wait_stopped()
+        with self._frame_source_lock:
+            if self.frame_source is not None:
+                self.frame_source.close()
+                self.frame_source = None
+        if self.click_dispatcher.backend is not None:
+            self.click_dispatcher.backend.close()
+            self.click_dispatcher.backend = None
+        if self.log_listener is not None:
+            self.log_listener.stop()
+            self.log_listener = None
+        
     def display_template_order(self):
         """显示模板加载顺序"""
         if self.templates:
             template_names = [template['name'] for template in self.templates]
             self.log_message("📋 加载的模板顺序: {}".format(" → ".join(template_names)))
             self.log_message("🔄 将按顺序检测每个模板，发现即点击，然后检测下一个模板")
+            masked = ["{}(忽略 {:.0%})".format(template['name'], 1 - np.count_nonzero(template['mask']) / template['mask'].size)
+                      for template in self.templates if template.get('mask') is not None]
+            if masked:
+                self.log_message("🎭 遮罩模板（只比较遮罩内像素）: {}".format(", ".join(masked)))
 
-    def load_template_file(self, file_path, quiet=False):
-        """加载模板文件"""
-        try:
-            template = cv2.imread(file_path)
-            if template is not None:
-                template_name = os.path.basename(file_path)
-                
-                # 检查是否已经加载过这个模板
-                existing_template = next((t for t in self.templates if t['path'] == file_path), None)
-                if existing_template:
-                    if not quiet:
-                        self.log_message("⚠️ 模板已存在: {}".format(template_name))
-                    return
-                
-                self.templates.append({
-                    'name': template_name,
-                    'path': file_path,
-                    'image': template
-                })
-                
-                if hasattr(self, 'template_listbox'):
-                    self.template_listbox.insert(tk.END, template_name)
-                
-                if not quiet:
-                    self.log_message("✅ 加载模板: {}".format(template_name))
-                
-                # 保存配置
-                self.save_config()
-            else:
-                if not quiet:
-                    self.log_message("❌ 无法加载模板: {}".format(file_path))
-                
-        except Exception as e:
-            if not quiet:
-                self.log_message("加载模板失败: {}".format(e))
-
-    def delete_template(self):
-        """删除选中的模板"""
-        selection = self.template_listbox.curselection()
-        if selection:
-            index = selection[0]
-            template_name = self.templates[index]['name']
-            
-            del self.templates[index]
-            self.template_listbox.delete(index)
-            
-            self.log_message("🗑️ 删除模板: {}".format(template_name))
-            
-            # 保存配置
-            self.save_config()
-            
-    def preview_template(self):
-        """预览选中的模板"""
-        selection = self.template_listbox.curselection()
-        if selection:
-            index = selection[0]
-            template = self.templates[index]
-            
-            # 创建预览窗口
-            preview_window = tk.Toplevel(self.root)
-            preview_window.title("模板预览 - {}".format(template['name']))
-            preview_window.geometry("400x300")
-            
-            # 加载并显示图片
-            img = Image.open(template['path'])
-            img.thumbnail((350, 250))
-            photo = ImageTk.PhotoImage(img)
-            
-            label = ttk.Label(preview_window, image=photo)
-            label.image = photo  # 保持引用
-            label.pack(pady=20)
-            
-    def find_cursor_window(self):
-        """查找Cursor窗口 - 改进版本"""
+    def find_cursor_window(self, quiet=False):
+        """查找Cursor窗口 - 改进版本（quiet 为 True 时不输出调试日志，用于定期定位窗口）"""
+        log = (lambda message: None) if quiet else self.log_message
+        
         def enum_windows_callback(hwnd, windows):
             if win32gui.IsWindowVisible(hwnd):
                 window_title = win32gui.GetWindowText(hwnd)
@@ -501,533 +3232,1611 @@ class CursorTemplateClicker:
                     not should_exclude
                 )
                 
-                if is_cursor_window:
-                    # 进一步验证窗口类名
-                    try:
-                        class_name = win32gui.GetClassName(hwnd)
-                        # Cursor IDE通常使用Chrome或Electron框架
-                        valid_classes = ['Chrome', 'Electron', 'Window']
-                        if any(cls in class_name for cls in valid_classes):
-                            # 额外检查：排除包含Python关键词的窗口标题
-                            python_keywords = ['python', 'tkinter', 'tk', '.py', 'interpreter']
-                            if not any(keyword in window_title.lower() for keyword in python_keywords):
-                                # 获取窗口位置信息，排除最小化的窗口
-                                try:
-                                    rect = win32gui.GetWindowRect(hwnd)
-                                    if rect[2] - rect[0] > 100 and rect[3] - rect[1] > 100:  # 窗口大小合理
-                                        windows.append((hwnd, window_title, class_name))
-                                except:
-                                    pass
-                    except:
-                        pass
+                if is_cursor_window:
+                    # 进一步验证窗口类名
+                    try:
+                        class_name = win32gui.GetClassName(hwnd)
+                        # Cursor IDE通常使用Chrome或Electron框架
+                        valid_classes = ['Chrome', 'Electron', 'Window']
+                        if any(cls in class_name for cls in valid_classes):
+                            # 额外检查：排除包含Python关键词的窗口标题
+                            python_keywords = ['python', 'tkinter', 'tk', '.py', 'interpreter']
+                            if not any(keyword in window_title.lower() for keyword in python_keywords):
+                                # 获取窗口位置信息，排除最小化的窗口
+                                try:
+                                    rect = win32gui.GetWindowRect(hwnd)
+                                    if rect[2] - rect[0] > 100 and rect[3] - rect[1] > 100:  # 窗口大小合理
+                                        windows.append((hwnd, window_title, class_name))
+                                except:
+                                    pass
+                    except:
+                        pass
+            return True
+            
+        windows = []
+        win32gui.EnumWindows(enum_windows_callback, windows)
+        
+        # 添加详细调试信息
+        log("🔍 开始搜索Cursor窗口...")
+        
+        # 首先列出所有包含cursor的窗口（不管是否符合条件）
+        all_cursor_windows = []
+        def debug_enum_callback(hwnd, debug_windows):
+            if win32gui.IsWindowVisible(hwnd):
+                window_title = win32gui.GetWindowText(hwnd)
+                if 'cursor' in window_title.lower() and len(window_title) > 3:
+                    try:
+                        class_name = win32gui.GetClassName(hwnd)
+                        rect = win32gui.GetWindowRect(hwnd)
+                        size = "{}x{}".format(rect[2] - rect[0], rect[3] - rect[1])
+                        debug_windows.append((window_title, class_name, size))
+                    except:
+                        debug_windows.append((window_title, "未知类名", "未知大小"))
+            return True
+        
+        win32gui.EnumWindows(debug_enum_callback, all_cursor_windows)
+        
+        if all_cursor_windows:
+            log("🔍 找到包含'cursor'的所有窗口:")
+            for i, (title, class_name, size) in enumerate(all_cursor_windows, 1):
+                log("  {}. {} (类名: {}, 大小: {})".format(i, title, class_name, size))
+        else:
+            log("🔍 未找到任何包含'cursor'的窗口")
+        
+        # 记录筛选后的候选窗口
+        if windows:
+            log("🔍 通过筛选的候选Cursor窗口:")
+            for i, (hwnd, title, class_name) in enumerate(windows, 1):
+                try:
+                    rect = win32gui.GetWindowRect(hwnd)
+                    size = "{}x{}".format(rect[2] - rect[0], rect[3] - rect[1])
+                    log("  {}. {} (类名: {}, 大小: {})".format(i, title, class_name, size))
+                except:
+                    log("  {}. {} (类名: {}, 大小: 未知)".format(i, title, class_name))
+        else:
+            log("🔍 没有窗口通过筛选条件")
+            log("💡 筛选条件:")
+            log("  - 窗口标题包含'cursor'")
+            log("  - 标题长度 > 5")
+            log("  - 不包含排除关键词: Cursor Auto Accept, 图像匹配, template, 外部监听程序等")
+            log("  - 窗口类名包含: Chrome, Electron, Window")
+            log("  - 不包含Python关键词: python, tkinter, tk, .py, interpreter")
+            log("  - 窗口大小 > 100x100")
+        
+        # 优先级排序：
+        # 1. 包含文件扩展名的窗口
+        # 2. 包含项目名的窗口  
+        # 3. 标题较长的窗口（通常包含更多信息）
+        priority_windows = []
+        
+        for hwnd, title, class_name in windows:
+            priority = 0
+            priority_reasons = []
+            
+            # 检查文件扩展名
+            if any(ext in title.lower() for ext in ['.py', '.js', '.ts', '.json', '.md', '.txt', '.cpp', '.java', '.html', '.css']):
+                priority += 100
+                priority_reasons.append("包含文件扩展名(+100)")
+                
+            # 检查是否包含项目相关关键词
+            if any(keyword in title.lower() for keyword in ['project', 'workspace', 'folder']):
+                priority += 50
+                priority_reasons.append("包含项目关键词(+50)")
+                
+            # 较长的标题通常包含更多信息
+            length_bonus = len(title)
+            priority += length_bonus
+            priority_reasons.append("标题长度(+{})".format(length_bonus))
+            
+            priority_windows.append((priority, hwnd, title, class_name, priority_reasons))
+            log("🔍 窗口优先级计算: {} - 总分: {} ({})".format(title, priority, ", ".join(priority_reasons)))
+        
+        # 按优先级排序
+        priority_windows.sort(reverse=True)
+        
+        if priority_windows:
+            priority, hwnd, title, class_name, reasons = priority_windows[0]
+            log("✅ 选择最佳匹配窗口: {} (类名: {}, 优先级: {})".format(title, class_name, priority))
+            return hwnd, title
+        
+        log("❌ 未找到符合条件的Cursor窗口")
+        
+        # 提供故障排除建议
+        if all_cursor_windows:
+            log("💡 故障排除建议:")
+            log("  1. 确保Cursor IDE窗口没有最小化")
+            log("  2. 确保Cursor IDE窗口标题包含文件名或项目名")
+            log("  3. 尝试在Cursor中打开一个文件")
+            log("  4. 检查Cursor窗口是否被其他程序遮挡")
+        else:
+            log("💡 故障排除建议:")
+            log("  1. 确保Cursor IDE正在运行")
+            log("  2. 确保Cursor IDE窗口可见（未最小化）")
+            log("  3. 尝试重启Cursor IDE")
+            log("  4. 检查Cursor进程是否在任务管理器中")
+        
+        return None, None
+        
+    def get_frame_source(self):
+        """获取监听线程使用的截图后端（按配置延迟创建）；后端复用截图缓冲区，只能在监听线程中截图"""
+        with self._frame_source_lock:
+            if self.frame_source is None:
+                self.frame_source = create_frame_source(self.capture_backend, self.replay_path)
+                self.log_message("📷 截图后端: {}".format(self.frame_source.name))
+            return self.frame_source
+        
+    def capture_screen(self):
+        """在调用线程中截取一张整屏截图（BGR，界面截取模板时使用）
+        
+        使用临时创建的独立截图后端：监听中截取模板不会覆盖监听线程正在匹配的复用缓冲区。
+        """
+        frame_source = create_frame_source(self.capture_backend, self.replay_path)
+        try:
+            return frame_source.grab()
+        finally:
+            frame_source.close()
+        
+    def get_click_dispatcher(self):
+        """获取点击调度器（点击后端按配置延迟创建）"""
+        if self.click_dispatcher.backend is None:
+            self.click_dispatcher.backend = create_click_backend(self.click_backend)
+            self.log_message("🖱️ 点击后端: {}".format(self.click_dispatcher.backend.name))
+        return self.click_dispatcher
+        
+    def set_monitors(self, selection):
+        """修改显示器选择（监听中修改时下一帧重新计算截图区域）"""
+        if selection != self.monitors:
+            self.monitors = selection
+            self._monitors_checked_at = 0
+        
+    def select_monitors(self, monitors):
+        """按显示器选择返回要扫描的显示器列表（选择无效或找不到 Cursor 窗口时扫描全部显示器）"""
+        selection = self.monitors
+        note = None
+        if selection == 'primary':
+            selected = [monitor for monitor in monitors if monitor['primary']][:1] or monitors[:1]
+        elif selection == 'cursor':
+            selected = []
+            hwnd = self.get_cursor_window() if win32gui.available() else None
+            if hwnd:
+                try:
+                    monitor = monitor_at(monitors, win32gui.GetWindowRect(hwnd))
+                    selected = [monitor] if monitor else []
+                except Exception:
+                    pass
+            if not selected:
+                note = "⚠️ 未找到Cursor窗口，暂时扫描全部显示器"
+        elif isinstance(selection, tuple):
+            selected = [monitor for monitor in monitors if monitor['index'] in selection]
+            if not selected:
+                note = "⚠️ 显示器 {} 不存在（共 {} 个），扫描全部显示器".format(format_monitor_selection(selection), len(monitors))
+        else:
+            selected = monitors
+        
+        # 同一提示只记录一次，避免每次刷新都写日志
+        self.log_note('monitor', note)
+        return selected or monitors
+        
+    def resolve_capture_region(self, frame_source):
+        """计算本帧的截图区域：窗口模式下为 Cursor 窗口矩形，否则（或找不到窗口时）为选中显示器的外接矩形；
+        回放后端或无法枚举显示器时返回 None（后端默认区域）"""
+        region = None
+        if not isinstance(frame_source, ReplayFrameSource):
+            if self.window_mode:
+                region = self.resolve_window_region()
+            if region is None:
+                region = self.resolve_monitor_region()
+        
+        if region != self.capture_region:
+            self.capture_region = region
+            self.capture_origin = region[:2] if region else (0, 0)
+        return region
+        
+    def resolve_monitor_region(self):
+        """按显示器选择计算截图区域：定期重新枚举显示器（跟随显示器热插拔和 Cursor 窗口移动），
+        选中多个显示器时取外接矩形；无法枚举显示器时返回 None"""
+        now = time.time()
+        if now - self._monitors_checked_at < self.monitor_refresh_interval:
+            return self._monitor_region
+        self._monitors_checked_at = now
+        
+        monitors = enumerate_monitors()
+        selected = self.select_monitors(monitors) if monitors else []
+        region = union_rect(selected) if selected else None
+        if region != self._monitor_region:
+            self._monitor_region = region
+            if region:
+                self.log_message("🖥️ 扫描显示器: {} - 虚拟桌面区域 ({}, {}) {}x{}".format(
+                    ", ".join("{}{}".format(m['index'], "(主)" if m['primary'] else "") for m in selected), *region))
+        return region
+        
+    def resolve_window_region(self):
+        """窗口模式：返回 Cursor 窗口矩形 (left, top, width, height)，窗口最小化或找不到时返回 None
+        
+        每帧只对缓存的窗口句柄调用 GetWindowRect，窗口移动或改变大小时截图区域随之更新；
+        匹配位置相对窗口不变，区域缓存在窗口移动后仍然有效。
+        """
+        if not win32gui.available():
+            self.log_note('window', "⚠️ 窗口模式需要 pywin32，改为按显示器扫描")
+            return None
+        hwnd = self.get_cursor_window()
+        if hwnd is None:
+            self.log_note('window', "⚠️ 未找到Cursor窗口，暂时按显示器扫描")
+            return None
+        try:
+            if win32gui.IsIconic(hwnd):
+                self.log_note('window', "💤 Cursor窗口已最小化，暂时按显示器扫描")
+                return None
+            left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+        except Exception:
+            self.cursor_window = None
+            return None
+        if right - left <= 0 or bottom - top <= 0:
+            return None
+        self.log_note('window', None)
+        return left, top, right - left, bottom - top
+        
+    def get_cursor_window(self):
+        """返回缓存的 Cursor 窗口句柄：句柄失效（窗口关闭）时才重新枚举窗口，
+        找不到时每 monitor_refresh_interval 秒重试一次，避免每帧都枚举全部窗口"""
+        hwnd = self.cursor_window
+        if hwnd is not None:
+            try:
+                if win32gui.IsWindow(hwnd) and win32gui.IsWindowVisible(hwnd):
+                    return hwnd
+            except Exception:
+                pass
+            self.cursor_window = None
+            self._window_searched_at = 0  # 句柄失效后立即重新枚举
+            self.log_message("🪟 Cursor窗口已关闭，重新查找窗口")
+        
+        now = time.time()
+        if now - self._window_searched_at < self.monitor_refresh_interval:
+            return None
+        self._window_searched_at = now
+        hwnd, title = self.find_cursor_window(quiet=True)
+        if hwnd is not None:
+            self.cursor_window = hwnd
+            rect = win32gui.GetWindowRect(hwnd)
+            self.log_message("🪟 锁定Cursor窗口: {} ({}x{})".format(title, rect[2] - rect[0], rect[3] - rect[1]))
+        return hwnd
+        
+    def log_note(self, key, note):
+        """记录状态提示：同一类提示与上一条相同时不重复记录，note 为 None 表示恢复正常"""
+        if note != self._notes.get(key):
+            self._notes[key] = note
+            if note:
+                self.log_message(note)
+        
+    def match_template_fullscreen(self, image, template_info, regions=None):
+        """全屏模式：对单个模板执行匹配，返回 (最大置信度, 左上角坐标, (宽, 高))；regions 不为空时只在这些变化区域内搜索"""
+        started = time.perf_counter()
+        if self.multi_scale:
+            result = self.scale_matcher.match(
+                image, template_info, self.match_threshold,
+                lambda scaled_info: self.match_template_at_scale(image, scaled_info, regions),
+                monitor=self.capture_region, sweep=regions is None)
+        else:
+            h, w = template_info['image'].shape[:2]
+            max_val, max_loc = self.match_template_at_scale(image, template_info, regions)
+            result = (max_val, max_loc, (w, h))
+        self.profiler.record('match:' + template_info['name'], time.perf_counter() - started)
+        return result
+    
+    def match_template_at_scale(self, image, template_info, regions=None):
+        """在模板当前尺寸下匹配（区域缓存 -> 全屏/变化区域扫描），返回 (最大置信度, 左上角坐标)"""
+        template = template_info[self.match_variant]
+        h, w = template.shape[:2]
+        use_roi_cache = self.roi_cache_enabled
+        roi_key = (template_info['path'], template_info.get('scale', 1.0))
+        
+        # 优先在上次命中位置的邻域内搜索
+        if use_roi_cache:
+            window = self.roi_cache.lookup(roi_key, image.shape)
+            if window is not None:
+                x0, y0, x1, y1 = window
+                max_val, max_loc = PyramidMatcher.exhaustive_match(image[y0:y1, x0:x1], template, template_info.get('mask'))
+                if max_val > self.match_threshold:
+                    max_loc = (x0 + max_loc[0], y0 + max_loc[1])
+                    self.roi_cache.record(roi_key, True)
+                    self.roi_cache.store(roi_key, max_loc, (w, h))
+                    return max_val, max_loc
+                self.roi_cache.record(roi_key, False)
+        
+        # 邻域未命中，执行全屏扫描（或只扫描变化区域）
+        if regions is None:
+            max_val, max_loc = self.scan_template(image, template_info)
+        else:
+            max_val, max_loc = self.scan_template_regions(image, template_info, regions)
+        
+        if use_roi_cache and max_val > self.match_threshold and max_loc is not None:
+            self.roi_cache.store(roi_key, max_loc, (w, h))
+        return max_val, max_loc
+    
+    def convert_frame(self, frame_source, raw):
+        """按匹配通道模式转换截图（每帧只转换一次）"""
+        if self.match_variant == 'image':
+            return frame_source.to_bgr(raw)
+        gray = frame_source.to_gray(raw)
+        return edge_map(gray) if self.match_variant == 'edge' else gray
+    
+    def scan_template(self, image, template_info):
+        """扫描整幅图像（模板图集/金字塔匹配、多进程全量匹配或全量匹配）"""
+        if self.pyramid_matching:
+            if self.template_atlas_enabled:
+                result = self.template_atlas.match(image, self.templates, template_info, self.match_threshold, self.match_variant)
+                if result is not None:
+                    return result
+            return self.pyramid_matcher.match(image, template_info, self.match_threshold, self.match_variant)
+        template, mask = template_info[self.match_variant], template_info.get('mask')
+        if self.parallel_engine is not None and image.shape[0] * image.shape[1] >= self.parallel_engine.min_pixels:
+            if image is self._prefetched_image:
+                result = self._prefetched.pop((template_info['path'], template_info.get('scale', 1.0)), None)
+                if result is not None:
+                    return result
+            return self.parallel_engine.match(image, [template], [mask])[0]
+        return PyramidMatcher.exhaustive_match(image, template, mask)
+        
+    def prefetch_parallel_scans(self, image, regions=None, signature=None, exclude=()):
+        """多进程匹配：把本帧需要整屏扫描的模板一次提交给工作进程（按模板拆分任务并行匹配），
+        结果在 scan_template 中按 (模板路径, 缩放比例) 取用
+        
+        冷却中、同一画面可复用结果、区域缓存有邻域可先搜索的模板不提交；只提交每帧都会尝试的优先比例，
+        全尺度扫描的其余比例仍逐个匹配。只剩一个模板时不预取，由 scan_template 按屏幕条带拆分。
+        """
+        self._prefetched = {}
+        self._prefetched_image = None
+        engine = self.parallel_engine
+        if engine is None or self.pyramid_matching or regions is not None or image.shape[0] * image.shape[1] < engine.min_pixels:
+            return
+        
+        height, width = image.shape[:2]
+        monitor = self.capture_region if self.capture_region is not None else image.shape[:2]
+        keys, templates, masks = [], [], []
+        for index, template_info in enumerate(self.templates):
+            if index in exclude or self.tracker.has_result(template_info['path'], signature, self.capture_origin):
+                continue
+            scales = self.scale_matcher.preferred_scales((template_info['path'], monitor), monitor) if self.multi_scale else [1.0]
+            for scale in scales:
+                scaled_info = self.scale_matcher.scaled_template(template_info, scale)
+                template = scaled_info[self.match_variant]
+                key = (template_info['path'], scale)
+                if template.shape[0] > height or template.shape[1] > width or key in keys:
+                    continue
+                if self.roi_cache_enabled and self.roi_cache.lookup(key, image.shape) is not None:
+                    continue
+                keys.append(key)
+                templates.append(template)
+                masks.append(scaled_info.get('mask'))
+        
+        if len(templates) > 1:
+            self._prefetched = dict(zip(keys, engine.match(image, templates, masks)))
+            self._prefetched_image = image
+    
+    def scan_template_regions(self, image, template_info, regions):
+        """只扫描变化区域：区域向左上扩展一个模板尺寸，保证覆盖与区域相交的所有匹配位置"""
+        h, w = template_info['image'].shape[:2]
+        height, width = image.shape[:2]
+        best_val, best_loc = -1.0, None
+        
+        for x0, y0, x1, y1 in regions:
+            x0, y0 = max(0, x0 - w + 1), max(0, y0 - h + 1)
+            x1, y1 = min(width, x1 + w - 1), min(height, y1 + h - 1)
+            if x1 - x0 < w or y1 - y0 < h:
+                continue
+            
+            max_val, max_loc = self.scan_template(image[y0:y1, x0:x1], template_info)
+            if max_loc is not None and max_val > best_val:
+                best_val, best_loc = max_val, (x0 + max_loc[0], y0 + max_loc[1])
+        
+        return best_val, best_loc
+    
+    def stats_summary(self):
+        """汇总检测统计信息"""
+        parts = [self.detection_stats.summary()]
+        if self.roi_cache_enabled:
+            parts.append(self.roi_cache.summary())
+        if self.pyramid_matching and self.template_atlas_enabled and self.template_atlas.shared:
+            parts.append(self.template_atlas.summary())
+        parts.append(self.tracker.summary())
+        return " | ".join(parts)
+        
+    def match_template_tracked(self, image, template_info, regions=None, signature=None):
+        """匹配单个模板并更新其检测状态：同一画面上已有结果时直接复用，返回 (最大置信度, 左上角坐标, (宽, 高))"""
+        key = template_info['path']
+        result = self.tracker.cached(key, signature, self.capture_origin)
+        if result is None:
+            result = self.match_template_fullscreen(image, template_info, regions)
+            self.detection_stats.record_match(result[0] > self.match_threshold)
+            self.tracker.store(key, signature, self.capture_origin, result)
+        self.tracker.observe(key, result[0] > self.match_threshold)
+        return result
+        
+    def find_accept_button_template_fullscreen(self, image, regions=None, signature=None):
+        """全屏模式：使用模板匹配查找Accept按钮（检测所有模板），返回置信度最高的命中"""
+        best_match = None
+        best_confidence = 0
+        self.prefetch_parallel_scans(image, regions, signature)
+        
+        for template_info in self.templates:
+            # 模板匹配
+            max_val, max_loc, (w, h) = self.match_template_tracked(image, template_info, regions, signature)
+            
+            if max_val > self.match_threshold and max_val > best_confidence:
+                best_confidence = max_val
+                center_x = self.capture_origin[0] + max_loc[0] + w // 2
+                center_y = self.capture_origin[1] + max_loc[1] + h // 2
+                best_match = (center_x, center_y, max_val)
+                
+        if best_match:
+            return best_match
+            
+        return None, None, 0
+        
+    def find_current_template_match_fullscreen(self, image, signature=None):
+        """全屏模式：检测当前模板索引对应的模板是否匹配"""
+        if not self.templates or self.current_template_index >= len(self.templates):
+            return None, None, 0, None
+            
+        template_info = self.templates[self.current_template_index]
+        template_name = template_info['name']
+        
+        # 模板匹配
+        max_val, max_loc, (w, h) = self.match_template_tracked(image, template_info, signature=signature)
+        
+        if max_val > self.match_threshold:
+            center_x = self.capture_origin[0] + max_loc[0] + w // 2
+            center_y = self.capture_origin[1] + max_loc[1] + h // 2
+            return center_x, center_y, max_val, template_name
+            
+        return None, None, 0, None
+        
+    def match_all_templates_fullscreen(self, image, regions=None, signature=None, exclude=()):
+        """全屏批量模式：在同一帧截图上检测所有模板（exclude 中的模板索引跳过），返回全部命中结果（按模板顺序）"""
+        matches = []
+        self.prefetch_parallel_scans(image, regions, signature, exclude)
+        
+        for index, template_info in enumerate(self.templates):
+            if index in exclude:
+                continue
+                
+            # 模板匹配
+            max_val, max_loc, (w, h) = self.match_template_tracked(image, template_info, regions, signature)
+            
+            if max_val > self.match_threshold:
+                matches.append({
+                    'index': index,
+                    'name': template_info['name'],
+                    'x': self.capture_origin[0] + max_loc[0] + w // 2,
+                    'y': self.capture_origin[1] + max_loc[1] + h // 2,
+                    'confidence': max_val
+                })
+                
+        return matches
+        
+    def select_sequence_match(self, matches):
+        """顺序策略：从当前模板索引开始循环查找，返回第一个命中的模板结果"""
+        if not matches or not self.templates:
+            return None
+            
+        template_count = len(self.templates)
+        return min(matches, key=lambda m: (m['index'] - self.current_template_index) % template_count)
+        
+    def click_button_fullscreen(self, button_x, button_y, template_info=None):
+        """全屏模式：点击屏幕坐标；提供模板时点击后只重新匹配按钮区域确认点击生效（未生效时立即重试）
+        
+        返回是否点击成功：点击生效（或无法确认）后该模板冷却 click_cooldown 秒；按钮在重试后仍未消失或点击出错时
+        返回 False（不计入点击次数），该模板只暂停 click_retry_backoff 秒，之后由检测重新确认再点击。
+        """
+        self.last_click = {}
+        try:
+            current_time = time.time()
+            # 检查点击间隔（间隔内不点击，已确认的模板下一帧再处理）
+            if current_time - self.last_click_time < self.interval:
+                return False
+                
+            dispatcher = self.get_click_dispatcher()
+            still_visible = None
+            if self.click_verify and template_info is not None and self.frame_source is not None:
+                still_visible = self.button_probe(self.frame_source, template_info, button_x, button_y)
+                
+            def on_retry(attempts):
+                self.log_message("🔁 点击后按钮仍在，重试点击 ({}/{})".format(attempts, dispatcher.retries))
+                
+            result = self.last_click = dispatcher.dispatch(button_x, button_y, still_visible, on_retry)
+            self.profiler.record('click', result['click_ms'] / 1000)
+            if still_visible is not None:
+                self.profiler.record('verify', result['verify_ms'] / 1000)
+            self.last_click_time = current_time
+            
+            if result['verified'] is False:
+                self.log_message("⚠️ 点击 {} 次后按钮仍在 (屏幕坐标: {}, {})，等待下一次检测".format(
+                    result['attempts'], button_x, button_y))
+                self.back_off_template(template_info, current_time)
+                return False
+                
+            if template_info is not None:
+                # 点击生效后该模板冷却 click_cooldown 秒，其他模板不受影响
+                self.tracker.mark_clicked(template_info['path'], self.click_cooldown, current_time)
+                
+            # 更新统计
+            self.click_count += 1
+            
+            if result['verified']:
+                self.log_message("✅ 全屏模式自动点击 Accept 按钮 (屏幕坐标: {}, {}) - {:.0f} ms 后确认按钮已消失".format(
+                    button_x, button_y, result['verify_ms']))
+            else:
+                self.log_message("✅ 全屏模式自动点击 Accept 按钮 (屏幕坐标: {}, {})".format(button_x, button_y))
             return True
             
-        windows = []
-        win32gui.EnumWindows(enum_windows_callback, windows)
+        except Exception as e:
+            self.log_message("全屏点击失败: {}".format(e))
+            self.back_off_template(template_info, time.time())
+            return False
+            
+    def back_off_template(self, template_info, now):
+        """点击未生效：该模板短暂暂停匹配，不进入完整冷却（按钮仍在时尽快重新确认并点击）"""
+        if template_info is not None:
+            self.tracker.back_off(template_info['path'], self.click_retry_backoff, now)
+            
+    def move_to_button(self, button_x, button_y, confidence):
+        """测试模式：通过点击后端把鼠标移动到按钮位置但不点击，返回是否移动成功"""
+        self.log_message("🧪 测试模式 - 检测到Accept按钮")
+        try:
+            started = time.perf_counter()
+            self.get_click_dispatcher().backend.move(button_x, button_y)
+            self.profiler.record('click', time.perf_counter() - started)
+            self.log_message("📍 鼠标已移动到位置: ({}, {}), 置信度: {:.2f}".format(button_x, button_y, confidence))
+            self.log_message("🎯 测试模式下不执行点击操作")
+            return True
+        except Exception as e:
+            self.log_message("📍 屏幕坐标: ({}, {}), 置信度: {:.2f}".format(button_x, button_y, confidence))
+            self.log_message("⚠️ 鼠标移动失败: {}".format(e))
+            return False
+            
+    def button_probe(self, frame_source, template_info, button_x, button_y):
+        """生成点击确认函数：只截取按钮所在区域（命中尺寸加少量边距）并匹配模板，返回按钮是否仍在
         
-        # 添加详细调试信息
-        self.log_message("🔍 开始搜索Cursor窗口...")
+        截到的区域比模板还小（按钮贴近屏幕或截图边缘）时无法判断，返回 None。
+        """
+        scale = 1.0
+        if self.multi_scale:
+            scale = self.scale_matcher.template_scales.get((template_info['path'], self.capture_region), 1.0)
+        scaled_info = self.scale_matcher.scaled_template(template_info, scale)
+        template, mask = scaled_info[self.match_variant], scaled_info.get('mask')
+        h, w = template.shape[:2]
+        margin = self.click_verify_margin
+        region = (button_x - w // 2 - margin, button_y - h // 2 - margin, w + 2 * margin, h + 2 * margin)
+        if self.capture_region is None:
+            # 后端默认区域（回放截图）：截图坐标即屏幕坐标，区域不能超出截图左上角
+            region = (max(0, region[0]), max(0, region[1]), region[2], region[3])
+            
+        def still_visible():
+            raw = frame_source.grab_raw(region)
+            if raw.shape[0] < h or raw.shape[1] < w:
+                return None
+            image = self.convert_frame(frame_source, raw)
+            return PyramidMatcher.exhaustive_match(image, template, mask)[0] > self.match_threshold
+            
+        return still_visible
         
-        # 首先列出所有包含cursor的窗口（不管是否符合条件）
-        all_cursor_windows = []
-        def debug_enum_callback(hwnd, debug_windows):
-            if win32gui.IsWindowVisible(hwnd):
-                window_title = win32gui.GetWindowText(hwnd)
-                if 'cursor' in window_title.lower() and len(window_title) > 3:
-                    try:
-                        class_name = win32gui.GetClassName(hwnd)
-                        rect = win32gui.GetWindowRect(hwnd)
-                        size = "{}x{}".format(rect[2] - rect[0], rect[3] - rect[1])
-                        debug_windows.append((window_title, class_name, size))
-                    except:
-                        debug_windows.append((window_title, "未知类名", "未知大小"))
-            return True
+    def wait_next_frame(self, interval=None):
+        """按自适应采样调度休眠，并记录实际休眠时间"""
+        started = time.perf_counter()
+        self.poll_scheduler.wait(interval)
+        self.profiler.record('sleep', time.perf_counter() - started)
         
-        win32gui.EnumWindows(debug_enum_callback, all_cursor_windows)
+    def sleep(self, seconds):
+        """固定休眠（点击后的等待间隔），并记录实际休眠时间"""
+        started = time.perf_counter()
+        self.poll_scheduler.sleep(seconds)
+        self.profiler.record('sleep', time.perf_counter() - started)
         
-        if all_cursor_windows:
-            self.log_message("🔍 找到包含'cursor'的所有窗口:")
-            for i, (title, class_name, size) in enumerate(all_cursor_windows, 1):
-                self.log_message("  {}. {} (类名: {}, 大小: {})".format(i, title, class_name, size))
-        else:
-            self.log_message("🔍 未找到任何包含'cursor'的窗口")
+    def record_decision(self, action, **details):
+        """把本帧的决策写入录制会话（未录制时直接返回），冷却中跳过的模板一并记录供回放排除"""
+        if self.active_recorder is not None:
+            if self.cooling:
+                details['cooling'] = self.cooling
+            self.active_recorder.record(action, self.current_template_index, **details)
+            
+    def click_confirmed_match(self, template_info, index, button_x, button_y, confidence):
+        """处理一个命中结果：模板已确认时点击，点击成功后按顺序策略切换到下一个模板并让该模板进入冷却；
+        刚出现（未确认）时只记录决策，尽快采样下一帧确认"""
+        name = template_info['name']
+        state = self.tracker.state(template_info['path'])
+        details = dict(template=name, x=int(button_x), y=int(button_y), confidence=round(float(confidence), 4), state=state)
+        if state != TemplateTracker.CONFIRMED:
+            self.record_decision('click', clicked=False, **details)
+            self.poll_scheduler.activity()
+            return False
+            
+        self.log_message("🎯 全屏模板 {} 匹配成功 (置信度: {:.2f}) - 屏幕坐标: ({}, {})".format(name, confidence, button_x, button_y))
+        clicked = self.click_button_fullscreen(button_x, button_y, template_info)
+        self.record_decision('click', clicked=clicked, attempts=self.last_click.get('attempts', 0),
+                             verified=self.last_click.get('verified'), **details)
+        if clicked:
+            self.log_message("✅ 已点击模板: {} (第{}个) - 屏幕坐标: ({}, {})".format(name, index + 1, button_x, button_y))
+            # 更新GUI统计
+            self.notify_stats()
+            
+            # 顺序策略：下一次从被点击模板的下一个开始
+            self.current_template_index = (index + 1) % len(self.templates)
+            next_template_name = self.templates[self.current_template_index]['name']
+            self.log_message("🔄 切换到下一个模板: {} (第{}个)".format(next_template_name, self.current_template_index + 1))
+            self.log_message("❄️ 模板 {} 冷却 {:.1f} 秒（期间跳过该模板的匹配），继续检测其他模板".format(name, self.click_cooldown))
+            
+        # 点击后恢复快速采样
+        self.poll_scheduler.activity()
+        return clicked
         
-        # 记录筛选后的候选窗口
-        if windows:
-            self.log_message("🔍 通过筛选的候选Cursor窗口:")
-            for i, (hwnd, title, class_name) in enumerate(windows, 1):
-                try:
-                    rect = win32gui.GetWindowRect(hwnd)
-                    size = "{}x{}".format(rect[2] - rect[0], rect[3] - rect[1])
-                    self.log_message("  {}. {} (类名: {}, 大小: {})".format(i, title, class_name, size))
-                except:
-                    self.log_message("  {}. {} (类名: {}, 大小: 未知)".format(i, title, class_name))
-        else:
-            self.log_message("🔍 没有窗口通过筛选条件")
-            self.log_message("💡 筛选条件:")
-            self.log_message("  - 窗口标题包含'cursor'")
-            self.log_message("  - 标题长度 > 5")
-            self.log_message("  - 不包含排除关键词: Cursor Auto Accept, 图像匹配, template, 外部监听程序等")
-            self.log_message("  - 窗口类名包含: Chrome, Electron, Window")
-            self.log_message("  - 不包含Python关键词: python, tkinter, tk, .py, interpreter")
-            self.log_message("  - 窗口大小 > 100x100")
+    def perf_summary(self):
+        """各阶段耗时摘要（计时关闭时为空字符串）"""
+        return self.profiler.summary() if self.profiling else ""
         
-        # 优先级排序：
-        # 1. 包含文件扩展名的窗口
-        # 2. 包含项目名的窗口  
-        # 3. 标题较长的窗口（通常包含更多信息）
-        priority_windows = []
+    def monitoring_loop(self):
+        """监听循环 - 在选中的显示器（窗口模式下为 Cursor 窗口区域）内匹配模板"""
+        test_mode = self.test_mode
+        self.log_message("🚀 开始{} - 在{}内搜索模板...".format(self.run_mode_text(), self.capture_scope_text()))
         
-        for hwnd, title, class_name in windows:
-            priority = 0
-            priority_reasons = []
-            
-            # 检查文件扩展名
-            if any(ext in title.lower() for ext in ['.py', '.js', '.ts', '.json', '.md', '.txt', '.cpp', '.java', '.html', '.css']):
-                priority += 100
-                priority_reasons.append("包含文件扩展名(+100)")
+        batch_mode = self.batch_detection
+        if batch_mode:
+            self.log_message("📦 批量检测: 每帧截图匹配全部 {} 个模板，按顺序策略选择点击目标".format(len(self.templates)))
+        
+        # 匹配通道（模板已在加载时预处理，截图每帧转换一次）
+        self.match_variant = MATCH_MODES.get(self.match_mode, 'image')
+        
+        # 模板图集：相似模板分组，每帧每组只在缩小图上粗匹配一次
+        self.template_atlas.shared = 0
+        if self.pyramid_matching and self.template_atlas_enabled:
+            groups = self.template_atlas.groups(self.templates, 1.0, self.match_variant)
+            for group in {id(group): group for group in groups.values()}.values():
+                self.log_message("🗂️ 模板图集: {} 共用一次粗匹配 (原型相似度 {:.2f})".format(
+                    " + ".join(member['name'] for member in group['members']), group['similarity']))
+        
+        # 帧差检测只在每帧都检测全部模板时启用（逐帧轮换模式下每帧检测的模板不同，不能跳过）
+        frame_diff = self.frame_diff and (test_mode or batch_mode)
+        self.change_detector.reset()
+        
+        # 多进程全量匹配（金字塔匹配关闭时用于整屏扫描）
+        if self.parallel_workers > 0 and not self.pyramid_matching:
+            try:
+                self.parallel_engine = ParallelMatchEngine(self.parallel_workers)
+                self.log_message("🧵 多进程匹配: {} 个工作进程，截图通过共享内存传递".format(self.parallel_engine.workers))
+            except Exception as e:
+                self.parallel_engine = None
+                self.log_message("⚠️ 多进程匹配不可用，使用单进程匹配: {}".format(e))
+        elif self.parallel_workers > 0:
+            self.log_message("💡 多进程匹配只用于全量匹配，金字塔匹配开启时不生效")
+        
+        # 采样调度：按 CPU 预算限制检测耗时占比
+        self.poll_scheduler.cpu_budget = self.cpu_budget / 100.0
+        self.poll_scheduler.reset()
+        self.log_message("⏱️ 自适应采样: {:.0f}~{:.0f} ms，CPU预算 {}%".format(
+            self.poll_scheduler.min_interval * 1000, self.poll_scheduler.max_interval * 1000, self.cpu_budget))
+        
+        # 重置模板索引和检测统计
+        self.current_template_index = 0
+        self.detection_stats.reset()
+        self.roi_cache.reset_stats()
+        self.profiler.enabled = self.profiling
+        self.profiler.reset()
+        self._monitors_checked_at = 0
+        self._window_searched_at = 0
+        self._notes = {}
+        if self.window_mode:
+            self.log_message("🪟 窗口模式: 只截取Cursor窗口区域，窗口句柄在帧间缓存")
+        last_stats_report = time.time()
+        
+        # 逐模板状态机：命中 confirm_frames 帧后才点击，点击后该模板冷却 click_cooldown 秒
+        self.tracker.reset()
+        self.cooling = []
+        test_reported = None
+        if self.tracker.confirm_frames > 1:
+            self.log_message("🧭 按钮连续出现 {} 帧后确认".format(self.tracker.confirm_frames))
+        
+        # 会话录制：保存截图和每帧决策，供 --replay-session 离线复现
+        self.active_recorder = None
+        if self.record_session:
+            try:
+                mode = 'test' if test_mode else ('batch' if batch_mode else 'current')
+                session_dir = self.recorder.start(self.config_dict(), mode)
+                self.active_recorder = self.recorder
+                self.log_message("🎬 会话录制: {} (磁盘预算 {} MB)".format(session_dir, self.recorder.budget_bytes // (1024 * 1024)))
+            except Exception as e:
+                self.log_message("⚠️ 会话录制不可用: {}".format(e))
+        
+        while self.running:
+            try:
+                # 定期报告检测速率
+                if time.time() - last_stats_report >= self.stats_report_interval:
+                    self.log_message("📈 检测速率 - {}".format(self.stats_summary()))
+                    if self.perf_summary():
+                        self.log_message("⏱️ {}".format(self.perf_summary()))
+                    self.notify_stats()
+                    last_stats_report = time.time()
                 
-            # 检查是否包含项目相关关键词
-            if any(keyword in title.lower() for keyword in ['project', 'workspace', 'folder']):
-                priority += 50
-                priority_reasons.append("包含项目关键词(+50)")
+                if self.templates:
+                    # 截取本帧的检测区域（选中的显示器，窗口模式下为 Cursor 窗口）
+                    self.poll_scheduler.begin_tick()
+                    self.profiler.begin_tick()
+                    started = time.perf_counter()
+                    frame_source = self.get_frame_source()
+                    frame = frame_source.grab_raw(self.resolve_capture_region(frame_source))
+                    self.profiler.record('capture', time.perf_counter() - started)
+                    self.pyramid_matcher.begin_frame()
+                    if self.parallel_engine is not None:
+                        self.parallel_engine.begin_frame()
+                    self.detection_stats.record_capture()
+                    
+                    # 帧差检测：画面未变化时跳过颜色转换和匹配，变化时只匹配变化区域
+                    started = time.perf_counter()
+                    regions = None
+                    if frame_diff:
+                        signature, regions = self.change_detector.changed_regions(frame)
+                    else:
+                        signature = self.change_detector.signature(frame)
+                    
+                    # 画面变化时快速采样，静止时退避
+                    changed = self.poll_scheduler.observe(signature)
+                    if not changed:
+                        self.poll_scheduler.idle()
+                    self.profiler.record('diff', time.perf_counter() - started)
+                    
+                    # 录制：画面变化时保存截图，静止帧引用上一张
+                    if self.active_recorder is not None:
+                        self.active_recorder.begin_frame(frame_source, frame, changed or bool(regions), regions, self.capture_origin)
+                    
+                    if frame_diff:
+                        if regions is not None and not regions:
+                            self.detection_stats.record_skip()
+                            self.record_decision('skip')
+                            self.wait_next_frame()
+                            continue
+                        if regions is not None:
+                            self.detection_stats.record_partial()
+                    
+                    started = time.perf_counter()
+                    image = self.convert_frame(frame_source, frame)
+                    self.profiler.record('convert', time.perf_counter() - started)
+                    
+                    if test_mode:
+                        # 测试模式：检测所有模板
+                        started = time.perf_counter()
+                        button_x, button_y, confidence = self.find_accept_button_template_fullscreen(image, regions, signature)
+                        self.profiler.record('match', time.perf_counter() - started)
+                        if button_x is None:
+                            self.record_decision('none')
+                        else:
+                            self.record_decision('move', x=int(button_x), y=int(button_y), confidence=round(float(confidence), 4))
+                        if frame_diff:
+                            if button_x is None:
+                                self.change_detector.commit(signature, regions is None)
+                            else:
+                                self.change_detector.reset()
+                        
+                        if button_x is not None and button_y is not None:
+                            if self.tracker.take_confirmed():
+                                # 按钮确认出现：移动鼠标到位置但不点击（按钮持续显示时不重复记录）
+                                test_reported = 'hit'
+                                self.move_to_button(button_x, button_y, confidence)
+                            elif self.tracker.appearing():
+                                # 按钮刚出现，尽快采样下一帧确认
+                                self.poll_scheduler.activity()
+                        elif test_reported != 'none':
+                            # 测试模式下也显示未检测到的信息（每次按钮消失只记录一次）
+                            test_reported = 'none'
+                            self.log_message("❌ 测试未检测到Accept按钮（已检查所有模板）")
+                    elif batch_mode:
+                        # 批量模式：同一帧检测全部模板（冷却中的模板跳过），再按顺序策略选择点击目标
+                        self.cooling = self.tracker.cooling(self.templates)
+                        started = time.perf_counter()
+                        match = self.select_sequence_match(self.match_all_templates_fullscreen(image, regions, signature, self.cooling))
+                        self.profiler.record('match', time.perf_counter() - started)
+                        if frame_diff:
+                            if match is None:
+                                self.change_detector.commit(signature, regions is None)
+                            else:
+                                self.change_detector.reset()
+                        
+                        if match is not None:
+                            template_info = self.templates[match['index']]
+                            self.click_confirmed_match(template_info, match['index'], match['x'], match['y'], match['confidence'])
+                        else:
+                            self.record_decision('none')
+                    else:
+                        # 正常模式：按顺序检测当前模板（冷却中的模板直接跳过）
+                        self.cooling = self.tracker.cooling(self.templates)
+                        template_info = self.templates[self.current_template_index]
+                        if self.current_template_index in self.cooling:
+                            button_x = button_y = None
+                            self.record_decision('cooldown')
+                        else:
+                            # 检测当前模板
+                            started = time.perf_counter()
+                            button_x, button_y, confidence, template_name = self.find_current_template_match_fullscreen(image, signature)
+                            self.profiler.record('match', time.perf_counter() - started)
+                        
+                        if button_x is not None and button_y is not None:
+                            # 找到匹配：确认后点击并移动到下一个模板，刚出现时停留在当前模板等待下一帧确认
+                            self.click_confirmed_match(template_info, self.current_template_index, button_x, button_y, confidence)
+                        else:
+                            # 当前模板未匹配（或冷却中），移动到下一个模板
+                            if self.current_template_index not in self.cooling:
+                                self.record_decision('none')
+                            self.current_template_index = (self.current_template_index + 1) % len(self.templates)
+                            
+                            # 一轮遍历中途只受 CPU 预算限制，回到第一个模板时按采样间隔等待
+                            if self.current_template_index != 0:
+                                self.wait_next_frame(0)
+                                continue
+                    
+                    # 本帧检测完成，按自适应采样间隔等待下一帧
+                    self.wait_next_frame()
+                                
+                else:
+                    if not hasattr(self, '_no_template_warned') or not self._no_template_warned:
+                        self.log_message("⚠️ 没有加载模板，请先加载Accept按钮模板")
+                        self._no_template_warned = True
+                    self.poll_scheduler.sleep(1)
+                    
+            except Exception as e:
+                self.log_message("监听循环错误: {}".format(e))
+                self.poll_scheduler.sleep(1)
+        
+        if self.parallel_engine is not None:
+            self.parallel_engine.close()
+            self.parallel_engine = None
+        self.profiler.end_tick()
+        if self.active_recorder is not None:
+            self.active_recorder.stop()
+            self.log_message("🎬 {} - {}".format(self.active_recorder.summary(), self.active_recorder.session_dir))
+            self.active_recorder = None
                 
-            # 较长的标题通常包含更多信息
-            length_bonus = len(title)
-            priority += length_bonus
-            priority_reasons.append("标题长度(+{})".format(length_bonus))
-            
-            priority_windows.append((priority, hwnd, title, class_name, priority_reasons))
-            self.log_message("🔍 窗口优先级计算: {} - 总分: {} ({})".format(title, priority, ", ".join(priority_reasons)))
+        self.log_message("⏹️ 监听已停止")
+        
+
+
+class CursorTemplateClicker:
+    """图形界面前端：Tkinter 控件、热键、模板截取和日志查看，检测/点击由 ClickerEngine 完成"""
+
+    def __init__(self, config_file="template_config.json"):
+        self.root = tk.Tk()
+        self.root.title("Cursor 自动执行-Cursor Auto Accept")
+        self.root.geometry("900x600")
+        
+        # 界面日志缓冲（工作线程写入，界面线程定时批量刷新）
+        self.ui_log = UiLogSink()
+        self.ui_log_flush_ms = 100
+        
+        # 检测/点击引擎（日志和统计通过回调交给界面线程显示）
+        self.engine = ClickerEngine(config_file, on_log=self.ui_log.append,
+                                    on_stats=lambda: self.root.after(0, self.update_stats))
+        
+        # GUI变量
+        self.interval_var = tk.StringVar(value="2.0")
+        self.click_cooldown_var = tk.StringVar(value="2.0")
+        self.threshold_var = tk.DoubleVar(value=0.8)
+        self.test_mode_var = tk.BooleanVar(value=False)
+        self.auto_start_var = tk.BooleanVar(value=False)  # 新增：自动启动选项
+        self.only_24h_log_var = tk.BooleanVar(value=True)  # 新增：24小时日志过滤选项
+        self.batch_detection_var = tk.BooleanVar(value=True)  # 批量检测：每帧截图匹配全部模板
+        self.pyramid_matching_var = tk.BooleanVar(value=True)  # 金字塔匹配：先缩小粗定位再原图确认
+        self.template_atlas_var = tk.BooleanVar(value=True)  # 模板图集：相似模板共用一次粗匹配
+        self.roi_cache_var = tk.BooleanVar(value=True)  # 区域缓存：优先在上次命中位置附近搜索
+        self.frame_diff_var = tk.BooleanVar(value=True)  # 帧差检测：画面未变化时跳过匹配
+        self.match_mode_var = tk.StringVar(value="gray")  # 匹配通道：color / gray / edge
+        self.multi_scale_var = tk.BooleanVar(value=True)  # 多尺度匹配：适配不同 DPI 缩放
+        self.cpu_budget_var = tk.IntVar(value=30)  # 检测耗时占比上限（百分比）
+        self.window_mode_var = tk.BooleanVar(value=False)  # 窗口模式：只截取 Cursor 窗口区域
+        self.click_verify_var = tk.BooleanVar(value=True)  # 点击确认：点击后只重新匹配按钮区域，未生效时重试
+        self.monitors_var = tk.StringVar(value="all")  # 扫描的显示器：all / primary / cursor / 编号（如 1,2）
+        self.listed_monitors = None  # 上次在日志中列出的显示器（变化时才重新列出）
+        self.profiling_var = tk.BooleanVar(value=True)  # 热路径计时：统计各阶段耗时
+        self.record_session_var = tk.BooleanVar(value=False)  # 会话录制：保存截图和决策用于离线回放
+        
+        # 设置日志
+        self.engine.setup_logging()
+        
+        # 控制子系统（F2 热键和本地控制端口，加载配置后启动）
+        self.control = None
+        
+        # 模板在后台线程解码，完成前不能开始监听
+        self.templates_loading = False
+        
+        # 创建GUI
+        self.create_gui()
+        self.root.after(self.ui_log_flush_ms, self.flush_ui_log)
+        self.root.after(1000, self.update_poll_status)
+        self.root.after(1000, self.update_perf_panel)
+        
+        self.log_message("🖼️ Cursor Auto Accept 全屏图像匹配监听程序启动")
+        self.log_message("🌟 新特性: 全屏模板匹配 - 无需复杂的窗口检测，更稳定可靠！")
+        
+        # 加载保存的配置（模板在后台解码，完成后再决定是否自动开始监听）
+        self.load_config()
+        
+        # 启动热键和控制端口（控制端口设置来自配置文件）
+        self.control = create_control_channel(self.engine, self.handle_control_command)
+        
+    def create_gui(self):
+        """创建图形界面"""
+        # 创建笔记本标签页
+        notebook = ttk.Notebook(self.root)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # 主控制面板
+        main_frame = ttk.Frame(notebook)
+        notebook.add(main_frame, text="主控制")
+        
+        # 模板管理面板
+        template_frame = ttk.Frame(notebook)
+        notebook.add(template_frame, text="模板管理")
+        
+        # 日志查看面板
+        log_frame = ttk.Frame(notebook)
+        notebook.add(log_frame, text="日志查看")
+        
+        # 性能面板
+        perf_frame = ttk.Frame(notebook)
+        notebook.add(perf_frame, text="性能")
+        
+        # 创建主控制面板内容
+        self.create_main_panel(main_frame)
+        
+        # 创建模板管理面板内容
+        self.create_template_panel(template_frame)
+        
+        # 创建日志面板内容
+        self.create_log_panel(log_frame)
+        
+        # 创建性能面板内容
+        self.create_perf_panel(perf_frame)
+        
+    def create_main_panel(self, parent):
+        """创建主控制面板"""
+        # 控制面板
+        control_frame = ttk.LabelFrame(parent, text="监听控制", padding="10")
+        control_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # 第一行：基本控制
+        row1 = ttk.Frame(control_frame)
+        row1.pack(fill=tk.X, pady=(0, 10))
+        
+        self.start_button = ttk.Button(row1, text="开始监听", command=self.start_monitoring, style="Accent.TButton")
+        self.start_button.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.stop_button = ttk.Button(row1, text="停止监听", command=self.stop_monitoring, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=(0, 10))
+        
+        # 模板加载进度（模板在后台线程解码）
+        self.template_progress_label = ttk.Label(row1, text="")
+        self.template_progress_label.pack(side=tk.RIGHT)
+        self.template_progress = ttk.Progressbar(row1, length=120, mode='determinate')
+        self.template_progress.pack(side=tk.RIGHT, padx=(0, 5))
+        
+
+        
+        # 第二行：热键提示和自动启动
+        row2 = ttk.Frame(control_frame)
+        row2.pack(fill=tk.X, pady=(0, 10))
+        
+        hotkey_label = ttk.Label(row2, text="🔥 全局快捷键: F2 (启动/停止监听)", 
+                                font=("Arial", 10, "bold"), foreground="red")
+        hotkey_label.pack(side=tk.LEFT)
+        
+        # 自动启动选项
+        auto_start_check = ttk.Checkbutton(row2, text="启动时自动开始监听", 
+                                          variable=self.auto_start_var,
+                                          command=self.save_config)
+        auto_start_check.pack(side=tk.RIGHT)
+        
+        # 第三行：设置选项
+        row3 = ttk.Frame(control_frame)
+        row3.pack(fill=tk.X)
+        
+        # 点击间隔设置
+        ttk.Label(row3, text="点击间隔(秒):").pack(side=tk.LEFT)
+        interval_entry = ttk.Entry(row3, textvariable=self.interval_var, width=10)
+        interval_entry.pack(side=tk.LEFT, padx=(5, 15))
+        interval_entry.bind('<KeyRelease>', lambda e: self.save_config())
+        
+        # 模板冷却设置（模板点击后跳过该模板匹配的时间）
+        ttk.Label(row3, text="模板冷却(秒):").pack(side=tk.LEFT)
+        cooldown_entry = ttk.Entry(row3, textvariable=self.click_cooldown_var, width=10)
+        cooldown_entry.pack(side=tk.LEFT, padx=(5, 15))
+        cooldown_entry.bind('<KeyRelease>', lambda e: self.save_config())
+        
+        # 匹配阈值设置
+        ttk.Label(row3, text="匹配阈值:").pack(side=tk.LEFT)
+        threshold_scale = ttk.Scale(row3, from_=0.5, to=1.0, 
+                                   variable=self.threshold_var, 
+                                   command=self.update_threshold_label,
+                                   length=150)
+        threshold_scale.pack(side=tk.LEFT, padx=(5, 10))
         
-        # 按优先级排序
-        priority_windows.sort(reverse=True)
+        self.threshold_label = ttk.Label(row3, text="0.80")
+        self.threshold_label.pack(side=tk.LEFT, padx=(0, 15))
         
-        if priority_windows:
-            priority, hwnd, title, class_name, reasons = priority_windows[0]
-            self.log_message("✅ 选择最佳匹配窗口: {} (类名: {}, 优先级: {})".format(title, class_name, priority))
-            return hwnd, title
+        # 测试模式
+        test_check = ttk.Checkbutton(row3, text="测试模式(仅检测不点击)", variable=self.test_mode_var)
+        test_check.pack(side=tk.RIGHT)
         
-        self.log_message("❌ 未找到符合条件的Cursor窗口")
+        # 第四行：检测优化选项
+        row4 = ttk.Frame(control_frame)
+        row4.pack(fill=tk.X, pady=(10, 0))
         
-        # 提供故障排除建议
-        if all_cursor_windows:
-            self.log_message("💡 故障排除建议:")
-            self.log_message("  1. 确保Cursor IDE窗口没有最小化")
-            self.log_message("  2. 确保Cursor IDE窗口标题包含文件名或项目名")
-            self.log_message("  3. 尝试在Cursor中打开一个文件")
-            self.log_message("  4. 检查Cursor窗口是否被其他程序遮挡")
-        else:
-            self.log_message("💡 故障排除建议:")
-            self.log_message("  1. 确保Cursor IDE正在运行")
-            self.log_message("  2. 确保Cursor IDE窗口可见（未最小化）")
-            self.log_message("  3. 尝试重启Cursor IDE")
-            self.log_message("  4. 检查Cursor进程是否在任务管理器中")
+        ttk.Label(row4, text="检测优化:").pack(side=tk.LEFT)
         
-        return None, None
+        # 批量检测模式
+        batch_check = ttk.Checkbutton(row4, text="批量检测", 
+                                     variable=self.batch_detection_var,
+                                     command=self.save_config)
+        batch_check.pack(side=tk.LEFT, padx=(5, 10))
         
-    def capture_window_screenshot(self, hwnd):
-        """截取窗口截图"""
-        try:
-            rect = win32gui.GetWindowRect(hwnd)
-            x, y, x2, y2 = rect
-            width = x2 - x
-            height = y2 - y
-            
-            screenshot = pyautogui.screenshot(region=(x, y, width, height))
-            return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            
-        except Exception as e:
-            self.log_message("截图失败: {}".format(e))
-            return None
-            
-    def find_accept_button_template(self, image):
-        """使用模板匹配查找Accept按钮（旧版本，用于窗口模式测试检测）"""
-        best_match = None
-        best_confidence = 0
+        # 金字塔匹配模式
+        pyramid_check = ttk.Checkbutton(row4, text="金字塔匹配", 
+                                       variable=self.pyramid_matching_var,
+                                       command=self.save_config)
+        pyramid_check.pack(side=tk.LEFT, padx=(0, 10))
         
-        for template_info in self.templates:
-            template = template_info['image']
-            
-            # 模板匹配
-            result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            
-            if max_val > self.match_threshold and max_val > best_confidence:
-                best_confidence = max_val
-                h, w = template.shape[:2]
-                center_x = max_loc[0] + w // 2
-                center_y = max_loc[1] + h // 2
-                best_match = (center_x, center_y, max_val, template_info['name'])
-                
-        if best_match:
-            x, y, confidence, template_name = best_match
-            self.log_message("🎯 找到按钮匹配: {} (置信度: {:.2f})".format(template_name, confidence))
-            return x, y, confidence
-            
-        return None, None, 0
+        # 模板图集（相似模板共用粗匹配）
+        atlas_check = ttk.Checkbutton(row4, text="模板图集", 
+                                     variable=self.template_atlas_var,
+                                     command=self.save_config)
+        atlas_check.pack(side=tk.LEFT, padx=(0, 10))
         
-    def find_accept_button_template_fullscreen(self, image):
-        """全屏模式：使用模板匹配查找Accept按钮（检测所有模板）"""
-        best_match = None
-        best_confidence = 0
+        # 区域缓存
+        roi_check = ttk.Checkbutton(row4, text="区域缓存", 
+                                   variable=self.roi_cache_var,
+                                   command=self.save_config)
+        roi_check.pack(side=tk.LEFT, padx=(0, 10))
         
-        for template_info in self.templates:
-            template = template_info['image']
-            
-            # 模板匹配
-            result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            
-            if max_val > self.match_threshold and max_val > best_confidence:
-                best_confidence = max_val
-                h, w = template.shape[:2]
-                center_x = max_loc[0] + w // 2
-                center_y = max_loc[1] + h // 2
-                best_match = (center_x, center_y, max_val, template_info['name'])
-                
-        if best_match:
-            x, y, confidence, template_name = best_match
-            self.log_message("🎯 全屏找到按钮匹配: {} (置信度: {:.2f}) - 屏幕坐标: ({}, {})".format(template_name, confidence, x, y))
-            return x, y, confidence
-            
-        return None, None, 0
+        # 帧差检测
+        frame_diff_check = ttk.Checkbutton(row4, text="帧差跳过", 
+                                          variable=self.frame_diff_var,
+                                          command=self.save_config)
+        frame_diff_check.pack(side=tk.LEFT, padx=(0, 10))
         
-    def find_current_template_match(self, image):
-        """检测当前模板索引对应的模板是否匹配（窗口模式）"""
-        if not self.templates or self.current_template_index >= len(self.templates):
-            return None, None, 0, None
-            
-        template_info = self.templates[self.current_template_index]
-        template = template_info['image']
-        template_name = template_info['name']
+        # 多尺度匹配
+        multi_scale_check = ttk.Checkbutton(row4, text="多尺度(DPI)", 
+                                           variable=self.multi_scale_var,
+                                           command=self.save_config)
+        multi_scale_check.pack(side=tk.LEFT, padx=(0, 10))
         
-        # 模板匹配
-        result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        # 匹配通道
+        ttk.Label(row4, text="匹配通道:").pack(side=tk.LEFT)
+        match_mode_combo = ttk.Combobox(row4, textvariable=self.match_mode_var, 
+                                       values=list(MATCH_MODES), state="readonly", width=6)
+        match_mode_combo.pack(side=tk.LEFT, padx=(5, 0))
+        match_mode_combo.bind('<<ComboboxSelected>>', lambda e: self.save_config())
         
-        if max_val > self.match_threshold:
-            h, w = template.shape[:2]
-            center_x = max_loc[0] + w // 2
-            center_y = max_loc[1] + h // 2
-            self.log_message("🎯 模板 {} 匹配成功 (置信度: {:.2f})".format(template_name, max_val))
-            return center_x, center_y, max_val, template_name
-            
-        return None, None, 0, None
+        # 第五行：采样调度
+        row5 = ttk.Frame(control_frame)
+        row5.pack(fill=tk.X, pady=(10, 0))
         
-    def find_current_template_match_fullscreen(self, image):
-        """全屏模式：检测当前模板索引对应的模板是否匹配"""
-        if not self.templates or self.current_template_index >= len(self.templates):
-            return None, None, 0, None
-            
-        template_info = self.templates[self.current_template_index]
-        template = template_info['image']
-        template_name = template_info['name']
+        ttk.Label(row5, text="采样调度:").pack(side=tk.LEFT)
+        ttk.Label(row5, text="CPU预算(%):").pack(side=tk.LEFT, padx=(5, 0))
+        cpu_budget_spin = ttk.Spinbox(row5, from_=5, to=100, increment=5, width=5,
+                                      textvariable=self.cpu_budget_var,
+                                      command=self.save_config)
+        cpu_budget_spin.pack(side=tk.LEFT, padx=(5, 15))
+        cpu_budget_spin.bind('<KeyRelease>', lambda e: self.save_config())
         
-        # 模板匹配
-        result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        # 扫描的显示器（下拉时才枚举显示器）
+        ttk.Label(row5, text="显示器:").pack(side=tk.LEFT)
+        self.monitors_combo = ttk.Combobox(row5, textvariable=self.monitors_var, width=8,
+                                           values=list(MONITOR_SELECTIONS),
+                                           postcommand=self.refresh_monitor_choices)
+        self.monitors_combo.pack(side=tk.LEFT, padx=(5, 15))
+        self.monitors_combo.bind('<<ComboboxSelected>>', lambda e: self.save_config())
+        self.monitors_combo.bind('<FocusOut>', lambda e: self.save_config())
         
-        if max_val > self.match_threshold:
-            h, w = template.shape[:2]
-            center_x = max_loc[0] + w // 2
-            center_y = max_loc[1] + h // 2
-            self.log_message("🎯 全屏模板 {} 匹配成功 (置信度: {:.2f}) - 屏幕坐标: ({}, {})".format(template_name, max_val, center_x, center_y))
-            return center_x, center_y, max_val, template_name
+        # 窗口模式
+        window_mode_check = ttk.Checkbutton(row5, text="仅Cursor窗口",
+                                            variable=self.window_mode_var,
+                                            command=self.save_config)
+        window_mode_check.pack(side=tk.LEFT, padx=(0, 15))
+        
+        # 点击确认
+        click_verify_check = ttk.Checkbutton(row5, text="点击确认",
+                                             variable=self.click_verify_var,
+                                             command=self.save_config)
+        click_verify_check.pack(side=tk.LEFT, padx=(0, 15))
+        
+        # 有效帧率显示（定时刷新）
+        self.poll_status_label = ttk.Label(row5, text="有效帧率: -- fps")
+        self.poll_status_label.pack(side=tk.LEFT)
+        
+        # 状态显示面板
+        status_frame = ttk.LabelFrame(parent, text="运行状态", padding="10")
+        status_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 状态信息
+        self.status_text = tk.Text(status_frame, height=15, wrap=tk.WORD)
+        scrollbar = ttk.Scrollbar(status_frame, orient=tk.VERTICAL, command=self.status_text.yview)
+        self.status_text.configure(yscrollcommand=scrollbar.set)
+        
+        self.status_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+    def update_threshold_label(self, value):
+        """更新阈值标签"""
+        self.threshold_label.config(text="{:.2f}".format(float(value)))
+        self.engine.match_threshold = float(value)
+        
+
             
-        return None, None, 0, None
+    def view_log(self):
+        """查看日志文件"""
+        log_file = self.engine.log_file
         
-    def click_button(self, window_rect, button_x, button_y):
-        """点击按钮"""
         try:
-            # 转换为屏幕坐标
-            screen_x = window_rect[0] + button_x
-            screen_y = window_rect[1] + button_y
-            
-            # 检查点击间隔
-            current_time = time.time()
-            if current_time - self.last_click_time < float(self.interval_var.get()):
-                return False
+            if os.path.exists(log_file):
+                # 创建日志查看窗口
+                log_window = tk.Toplevel(self.root)
+                log_window.title("运行日志")
+                log_window.geometry("800x600")
+                
+                # 创建文本框和滚动条
+                text_frame = ttk.Frame(log_window)
+                text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+                
+                text_widget = tk.Text(text_frame, wrap=tk.WORD, font=("Consolas", 10))
+                scrollbar = ttk.Scrollbar(text_frame, orient="vertical", command=text_widget.yview)
+                
+                text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+                scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+                
+                # 使用全局的24小时过滤设置加载日志内容（按索引定位，滚动到顶部时加载更早的内容）
+                text_widget.config(state=tk.DISABLED)  # 设为只读
+                viewer = LogViewer(text_widget, log_file, self.engine.log_index, self.only_24h_log_var)
+                viewer.attach_scrollbar(scrollbar)
+                viewer.reload()
                 
-            # 执行点击
-            pyautogui.click(screen_x, screen_y)
+                # 添加按钮
+                button_frame = ttk.Frame(log_window)
+                button_frame.pack(fill=tk.X, padx=10, pady=5)
+                
+                ttk.Button(button_frame, text="刷新", 
+                          command=viewer.refresh).pack(side=tk.LEFT, padx=(0, 10))
+                ttk.Button(button_frame, text="清空日志", 
+                          command=lambda: self.clear_log(log_file)).pack(side=tk.LEFT)
+                
+            else:
+                messagebox.showinfo("提示", "日志文件不存在")
+                
+        except Exception as e:
+            messagebox.showerror("错误", "无法打开日志文件: {}".format(e))
             
-            # 更新统计
-            self.click_count += 1
-            self.last_click_time = current_time
+    def get_filtered_log_content(self, log_file, only_24h=False):
+        """获取过滤后的日志内容（通过日志索引定位起始位置，不再逐行解析整个文件；包含轮转备份中的日志）"""
+        try:
+            segments = log_segments(log_file)
+            path, offset, size = segments[-1]
+            size += offset
             
-            self.log_message("✅ 自动点击 Accept 按钮 (坐标: {}, {})".format(screen_x, screen_y))
-            return True
+            if not only_24h:
+                # 如果不过滤，返回最后1000行
+                text, start = read_log_range(segments, max(0, size - LogViewer.CHUNK_BYTES), size)
+                recent_lines = text.splitlines(True)[-1000:]
+                return ''.join(recent_lines)
             
-        except Exception as e:
-            self.log_message("点击失败: {}".format(e))
-            return False
+            # 过滤24小时内的日志：从索引中24小时前的检查点开始读取，只需解析检查点之后的少量行
+            twenty_four_hours_ago = datetime.now() - timedelta(hours=24)
+            start = log_offset_for(segments, twenty_four_hours_ago.timestamp(), self.engine.log_index)
+            text, start = read_log_range(segments, start, size)
+            filtered = drop_lines_before(text, twenty_four_hours_ago)
             
-    def click_button_fullscreen(self, button_x, button_y):
-        """全屏模式：直接点击屏幕坐标"""
+            # 如果过滤后没有内容，显示提示信息
+            if not filtered:
+                return LOG_NO_RECENT_TEXT
+            
+            return filtered
+            
+        except Exception as e:
+            return "读取日志失败: {}".format(e)
+
+    def refresh_log_with_filter(self, text_widget, log_file, only_24h_var):
+        """使用过滤器刷新日志显示"""
         try:
-            # 检查点击间隔
-            current_time = time.time()
-            if current_time - self.last_click_time < float(self.interval_var.get()):
-                return False
+            log_content = self.get_filtered_log_content(log_file, only_24h_var.get())
                 
-            # 直接使用屏幕坐标执行点击
-            pyautogui.click(button_x, button_y)
+            text_widget.config(state=tk.NORMAL)
+            text_widget.delete(1.0, tk.END)
+            text_widget.insert(tk.END, log_content)
+            text_widget.see(tk.END)
+            text_widget.config(state=tk.DISABLED)
             
-            # 更新统计
-            self.click_count += 1
-            self.last_click_time = current_time
+        except Exception as e:
+            messagebox.showerror("错误", "刷新日志失败: {}".format(e))
+    
+    def clear_log(self, log_file):
+        """清空日志文件"""
+        result = messagebox.askyesno("确认", "确定要清空日志文件吗？")
+        if result:
+            try:
+                self.engine.clear_log_files()
+                messagebox.showinfo("成功", "日志已清空")
+            except Exception as e:
+                messagebox.showerror("错误", "清空日志失败: {}".format(e))
+        
+    def load_config(self, on_done=None):
+        """加载保存的配置，模板在后台解码，完成后调用 on_done(加载数)（默认按设置自动开始监听）"""
+        try:
+            config = self.engine.load_config(load_templates=False)
             
-            self.log_message("✅ 全屏模式自动点击 Accept 按钮 (屏幕坐标: {}, {})".format(button_x, button_y))
-            return True
+            # 加载设置
+            self.interval_var.set(config.get('interval', '2.0'))
+            self.click_cooldown_var.set("{:g}".format(self.engine.click_cooldown))
+            self.threshold_var.set(self.engine.match_threshold)
+            self.test_mode_var.set(self.engine.test_mode)
+            self.auto_start_var.set(config.get('auto_start', False))
+            self.only_24h_log_var.set(config.get('only_24h_log', True))
+            self.batch_detection_var.set(self.engine.batch_detection)
+            self.pyramid_matching_var.set(self.engine.pyramid_matching)
+            self.template_atlas_var.set(self.engine.template_atlas_enabled)
+            self.roi_cache_var.set(self.engine.roi_cache_enabled)
+            self.frame_diff_var.set(self.engine.frame_diff)
+            self.multi_scale_var.set(self.engine.multi_scale)
+            self.cpu_budget_var.set(self.engine.cpu_budget)
+            self.monitors_var.set(format_monitor_selection(self.engine.monitors))
+            self.window_mode_var.set(self.engine.window_mode)
+            self.click_verify_var.set(self.engine.click_verify)
+            self.profiling_var.set(self.engine.profiling)
+            self.record_session_var.set(self.engine.record_session)
+            self.match_mode_var.set(self.engine.match_mode)
             
-        except Exception as e:
-            self.log_message("全屏点击失败: {}".format(e))
-            return False
+            # 更新匹配阈值显示
+            self.update_threshold_label(self.engine.match_threshold)
             
-    def monitoring_loop(self):
-        """监听循环 - 全屏模板匹配模式（不依赖窗口检测）"""
-        test_mode = self.test_mode_var.get()
-        mode_text = "全屏测试模式" if test_mode else "全屏监听模式"
-        self.log_message("🚀 开始{} - 在整个屏幕范围内搜索模板...".format(mode_text))
-        self.log_message("💡 优势: 无需复杂窗口检测，直接全屏搜索，更稳定可靠")
+            # 后台解码模板
+            template_paths = config.get('template_paths', [])
+            if template_paths:
+                self.log_message("🔄 正在加载保存的模板配置...")
+            self.load_templates_async(template_paths, on_done or self.on_startup_templates_loaded)
+                
+        except Exception as e:
+            self.log_message("⚠️ 加载配置失败: {}".format(e))
+
+    def load_templates_async(self, template_paths, on_done):
+        """在后台线程解码模板（首次使用时也在后台导入 OpenCV），界面显示加载进度，完成后在界面线程调用 on_done(加载数)"""
+        self.templates_loading = True
+        self.show_template_progress(0, len(template_paths))
         
-        # 重置模板索引
-        self.current_template_index = 0
+        def progress(done, total):
+            self.root.after(0, self.show_template_progress, done, total)
         
-        while self.running:
+        def worker():
             try:
-                if self.templates:
-                    # 直接截取整个屏幕
-                    screenshot = pyautogui.screenshot()
-                    image = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-                    
-                    if test_mode:
-                        # 测试模式：检测所有模板
-                        button_x, button_y, confidence = self.find_accept_button_template_fullscreen(image)
-                        if button_x is not None and button_y is not None:
-                            # 测试模式：移动鼠标到位置但不点击
-                            try:
-                                pyautogui.moveTo(button_x, button_y, duration=0.3)
-                                self.log_message("🧪 测试模式 - 检测到Accept按钮")
-                                self.log_message("📍 鼠标已移动到位置: ({}, {}), 置信度: {:.2f}".format(button_x, button_y, confidence))
-                                self.log_message("🎯 测试模式下不执行点击操作")
-                            except Exception as e:
-                                self.log_message("🧪 测试模式 - 检测到Accept按钮")
-                                self.log_message("📍 屏幕坐标: ({}, {}), 置信度: {:.2f}".format(button_x, button_y, confidence))
-                                self.log_message("⚠️ 鼠标移动失败: {}".format(e))
-                        else:
-                            # 测试模式下也显示未检测到的信息（降低频率）
-                            if self.current_template_index == 0:  # 只在第一个模板时显示，避免日志刷屏
-                                self.log_message("❌ 测试未检测到Accept按钮（已检查所有模板）")
-                    else:
-                        # 正常模式：按顺序检测当前模板
-                        current_template_name = self.templates[self.current_template_index]['name'] if self.templates else "未知"
-                        
-                        # 检测当前模板
-                        button_x, button_y, confidence, template_name = self.find_current_template_match_fullscreen(image)
-                        
-                        if button_x is not None and button_y is not None:
-                            # 找到匹配，执行点击
-                            if self.click_button_fullscreen(button_x, button_y):
-                                self.log_message("✅ 已点击模板: {} (第{}个) - 屏幕坐标: ({}, {})".format(
-                                    template_name, self.current_template_index + 1, button_x, button_y))
-                                # 更新GUI统计
-                                self.root.after(0, self.update_stats)
-                                
-                                # 移动到下一个模板
-                                self.current_template_index = (self.current_template_index + 1) % len(self.templates)
-                                next_template_name = self.templates[self.current_template_index]['name']
-                                self.log_message("🔄 切换到下一个模板: {} (第{}个)".format(next_template_name, self.current_template_index + 1))
-                                
-                                # 等待点击间隔
-                                interval = float(self.interval_var.get())
-                                self.log_message("⏳ 等待 {:.1f} 秒后检测下一个模板...".format(interval))
-                                time.sleep(interval)
-                                continue
-                        else:
-                            # 当前模板未匹配，移动到下一个模板
-                            self.current_template_index = (self.current_template_index + 1) % len(self.templates)
-                            
-                            # 如果回到第一个模板，说明完成了一轮遍历
-                            if self.current_template_index == 0:
-                                # 短暂等待后开始新一轮
-                                time.sleep(0.2)
-                                
-                else:
-                    if not hasattr(self, '_no_template_warned') or not self._no_template_warned:
-                        self.log_message("⚠️ 没有加载模板，请先加载Accept按钮模板")
-                        self._no_template_warned = True
-                    time.sleep(1)
-                    
+                loaded_count = self.engine.load_templates(template_paths, progress)
             except Exception as e:
-                self.log_message("监听循环错误: {}".format(e))
-                time.sleep(1)
-                
-        self.log_message("⏹️ 监听已停止")
+                self.log_message("加载模板失败: {}".format(e))
+                loaded_count = 0
+            self.root.after(0, self.finish_template_loading, loaded_count, on_done)
+        
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_template_progress(self, done, total):
+        """更新模板加载进度"""
+        if hasattr(self, 'template_progress'):
+            self.template_progress.config(maximum=max(total, 1), value=done)
+            self.template_progress_label.config(
+                text="模板加载: {}/{}".format(done, total) if done < total else "模板: {} 个".format(len(self.engine.templates)))
+
+    def finish_template_loading(self, loaded_count, on_done):
+        """后台加载完成（界面线程）：刷新模板列表并执行回调"""
+        self.templates_loading = False
+        self.refresh_template_listbox()
+        self.show_template_progress(1, 1)
+        on_done(loaded_count)
+
+    def on_startup_templates_loaded(self, loaded_count):
+        """启动时的模板加载完成：报告结果，按设置自动开始监听"""
+        if loaded_count > 0:
+            self.log_message("✅ 成功加载 {} 个保存的模板".format(loaded_count))
+            self.engine.display_template_order()
+        
+        if not self.engine.templates:
+            self.log_message("💡 提示: 请先加载Accept按钮模板，然后开始监听")
+            return
+        
+        self.log_message("💡 已加载 {} 个模板，{}".format(
+            len(self.engine.templates), 
+            "将自动开始监听" if self.auto_start_var.get() else "可以开始监听"
+        ))
         
+        # 如果启用自动启动且有模板，自动开始监听
+        if self.auto_start_var.get():
+            self.root.after(2000, self.auto_start_monitoring)  # 延迟2秒启动
+
+    def apply_settings(self):
+        """把界面控件的设置同步到引擎（监听中修改也会立即生效）"""
+        try:
+            self.engine.interval = float(self.interval_var.get())
+        except ValueError:
+            pass
+        try:
+            self.engine.click_cooldown = max(0.0, float(self.click_cooldown_var.get()))
+        except ValueError:
+            pass
+        self.engine.match_threshold = self.threshold_var.get()
+        self.engine.test_mode = self.test_mode_var.get()
+        self.engine.batch_detection = self.batch_detection_var.get()
+        self.engine.pyramid_matching = self.pyramid_matching_var.get()
+        self.engine.template_atlas_enabled = self.template_atlas_var.get()
+        self.engine.roi_cache_enabled = self.roi_cache_var.get()
+        self.engine.frame_diff = self.frame_diff_var.get()
+        self.engine.match_mode = self.match_mode_var.get()
+        self.engine.multi_scale = self.multi_scale_var.get()
+        self.engine.cpu_budget = self.get_cpu_budget()
+        self.engine.set_monitors(parse_monitor_selection(self.monitors_var.get()))
+        self.engine.window_mode = self.window_mode_var.get()
+        self.engine.click_verify = self.click_verify_var.get()
+        self.engine.profiling = self.profiling_var.get()
+        self.engine.profiler.enabled = self.engine.profiling
+        self.engine.record_session = self.record_session_var.get()
+
+    def save_config(self):
+        """保存当前配置"""
+        try:
+            self.apply_settings()
+            self.engine.save_config({
+                'interval': self.interval_var.get(),
+                'auto_start': self.auto_start_var.get(),
+                'only_24h_log': self.only_24h_log_var.get()
+            })
+                
+        except Exception as e:
+            self.log_message("⚠️ 保存配置失败: {}".format(e))
+
+    def auto_start_monitoring(self):
+        """自动启动监听"""
+        if self.engine.templates and not self.engine.running:
+            self.log_message("🚀 自动启动监听...")
+            self.start_monitoring()
+
+    def refresh_template_listbox(self):
+        """按引擎中的模板顺序刷新模板列表"""
+        if hasattr(self, 'template_listbox'):
+            self.template_listbox.delete(0, tk.END)
+            for template in self.engine.templates:
+                self.template_listbox.insert(tk.END, template['name'])
+
+    def load_template_file(self, file_path, quiet=False):
+        """加载模板文件"""
+        template_info = self.engine.load_template_file(file_path, quiet)
+        if template_info is not None:
+            if hasattr(self, 'template_listbox'):
+                self.template_listbox.insert(tk.END, template_info['name'])
+            
+            # 保存配置
+            self.save_config()
+
+    def delete_template(self):
+        """删除选中的模板"""
+        selection = self.template_listbox.curselection()
+        if selection:
+            index = selection[0]
+            template_name = self.engine.templates[index]['name']
+            
+            del self.engine.templates[index]
+            self.template_listbox.delete(index)
+            
+            self.log_message("🗑️ 删除模板: {}".format(template_name))
+            
+            # 保存配置
+            self.save_config()
+            
+    def preview_template(self):
+        """预览选中的模板"""
+        selection = self.template_listbox.curselection()
+        if selection:
+            index = selection[0]
+            template = self.engine.templates[index]
+            
+            # 创建预览窗口
+            preview_window = tk.Toplevel(self.root)
+            preview_window.title("模板预览 - {}".format(template['name']))
+            preview_window.geometry("400x300")
+            
+            # 加载并显示图片
+            img = Image.open(template['path'])
+            img.thumbnail((350, 250))
+            photo = ImageTk.PhotoImage(img)
+            
+            label = ttk.Label(preview_window, image=photo)
+            label.image = photo  # 保持引用
+            label.pack(pady=20)
+            
+    def get_cpu_budget(self):
+        """读取 CPU 预算百分比（输入无效时使用默认值30）"""
+        try:
+            return min(100, max(5, int(self.cpu_budget_var.get())))
+        except (tk.TclError, ValueError):
+            return 30
+
+    def refresh_monitor_choices(self):
+        """展开显示器下拉框时枚举显示器，列出可选编号"""
+        try:
+            monitors = enumerate_monitors()
+        except Exception:
+            monitors = []
+        self.monitors_combo.config(values=list(MONITOR_SELECTIONS) + [str(monitor['index']) for monitor in monitors])
+        if monitors == self.listed_monitors:
+            return
+        self.listed_monitors = monitors
+        for monitor in monitors:
+            self.log_message("🖥️ 显示器 {}{}: {}x{} @ ({}, {}) {}".format(
+                monitor['index'], "(主)" if monitor['primary'] else "", monitor['width'], monitor['height'],
+                monitor['left'], monitor['top'], monitor['name']))
+
+    def update_poll_status(self):
+        """定时刷新有效帧率显示"""
+        try:
+            if hasattr(self, 'poll_status_label'):
+                text = self.engine.poll_scheduler.summary() if self.engine.running else "有效帧率: -- fps"
+                self.poll_status_label.config(text=text)
+        finally:
+            self.root.after(1000, self.update_poll_status)
+
     def update_stats(self):
         """更新统计信息"""
-        stats_text = "点击次数: {}\n".format(self.click_count)
+        stats_line = "点击次数: {} | {}".format(self.engine.click_count, self.engine.stats_summary())
+        stats_text = stats_line + "\n"
         if hasattr(self, 'status_text'):
-            # 只更新最后一行的统计信息，避免重复
-            current_content = self.status_text.get(1.0, tk.END)
-            lines = current_content.strip().split('\n')
+            # 只更新最后一行的统计信息，避免重复（按行号定位，不读取整个文本框）
+            last_line = self.text_line_count(self.status_text)
+            line_start = "{}.0".format(last_line)
+            line_end = "{}.end".format(last_line)
             
             # 如果最后一行是统计信息，则替换，否则添加
-            if lines and lines[-1].startswith("点击次数:"):
-                lines[-1] = "点击次数: {}".format(self.click_count)
-                self.status_text.delete(1.0, tk.END)
-                self.status_text.insert(1.0, '\n'.join(lines) + '\n')
+            if last_line > 0 and self.status_text.get(line_start, line_end).startswith("点击次数:"):
+                self.status_text.delete(line_start, line_end)
+                self.status_text.insert(line_start, stats_line)
             else:
                 self.status_text.insert(tk.END, stats_text)
             
             self.status_text.see(tk.END)
         
     def start_monitoring(self):
-        """开始监听"""
-        if not self.templates:
+        """开始监听，返回是否已开始（等待上一次监听线程退出后再开始时返回 False）"""
+        if self.templates_loading:
+            self.log_message("⏳ 模板仍在加载，请稍候再开始监听")
+            return False
+        
+        if not self.engine.templates:
             self.log_message("❌ 请先加载模板文件")
             messagebox.showwarning("警告", "请先加载模板文件")
-            return
-            
-        if not self.running:
-            self.running = True
-            self.monitoring_thread = threading.Thread(target=self.monitoring_loop)
-            self.monitoring_thread.daemon = True
-            self.monitoring_thread.start()
-            
-            self.log_message("🚀 开始监听 Accept 按钮")
-            
-            # 更新UI状态
-            self.start_button.config(state="disabled")
-            self.stop_button.config(state="normal")
+            return False
+        
+        if self.engine.thread_alive():
+            # 上一次的监听线程还没退出：等它退出后再开始，避免两个监听线程同时运行
+            if not self.engine.running:
+                self.log_message("⏳ 上一次的监听线程正在退出，退出后自动开始监听")
+                self.after_monitoring_stopped(self.start_monitoring)
+            return False
             
-            # 显示监听模式信息
-            mode = "全屏测试模式" if self.test_mode_var.get() else "全屏监听模式"
-            self.log_message("📊 运行模式: {}".format(mode))
-            self.log_message("🌐 检测范围: 整个屏幕 (无需窗口检测)")
-            self.log_message("⏱️ 点击间隔: {} 秒".format(self.interval_var.get()))
-            self.log_message("🎯 匹配阈值: {:.2f}".format(self.match_threshold))
-            self.display_template_order()
+        self.apply_settings()
+        if not self.engine.start():
+            return False
+        # 更新UI状态
+        self.start_button.config(state="disabled")
+        self.stop_button.config(state="normal")
+        return True
             
     def stop_monitoring(self):
         """停止监听"""
-        self.running = False
-        self.log_message("⏹️ 停止监听")
+        self.engine.stop()
         
         # 更新UI状态
         self.start_button.config(state="normal")
         self.stop_button.config(state="disabled")
         
+    def after_monitoring_stopped(self, callback, *args):
+        """监听线程退出后在界面线程中执行 callback（轮询等待，不阻塞界面线程：
+        监听线程会通过 root.after 通知界面，在界面线程里 join 可能互相等待）"""
+        if self.engine.thread_alive():
+            self.root.after(50, self.after_monitoring_stopped, callback, *args)
+        else:
+            self.engine.wait_stopped()
+            callback(*args)
+        
     def log_message(self, message):
         """记录日志信息"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = "[{}] {}".format(timestamp, message)
+        self.engine.log_message(message)
         
-        # 写入日志文件
-        logging.info(message)
+    @staticmethod
+    def text_line_count(widget):
+        """文本框中以换行结尾的行数（通过索引计算，不读取内容）"""
+        return int(widget.index("end-1c").split('.')[0]) - 1
         
-        # 显示在界面状态区域
-        if hasattr(self, 'status_text'):
-            self.status_text.insert(tk.END, log_entry + "\n")
-            self.status_text.see(tk.END)
-            # 限制显示行数，保持界面性能
-            lines = self.status_text.get(1.0, tk.END).split('\n')
-            if len(lines) > 500:  # 超过500行就清理前面的
-                self.status_text.delete(1.0, "100.0")  # 删除前100行
+    def append_text_lines(self, widget, text, max_lines, trim_lines):
+        """向文本框追加内容，超过 max_lines 行时按行号删除最前面的行（额外多删 trim_lines 行减少删除次数）"""
+        widget.insert(tk.END, text)
+        line_count = self.text_line_count(widget)
+        if line_count > max_lines:
+            widget.delete("1.0", "{}.0".format(line_count - max_lines + trim_lines + 1))
+        widget.see(tk.END)
         
-        # 同时显示在日志面板（如果存在）
-        if hasattr(self, 'log_text'):
-            self.log_text.insert(tk.END, log_entry + "\n")
-            self.log_text.see(tk.END)
-            # 限制日志面板行数
-            lines = self.log_text.get(1.0, tk.END).split('\n')
-            if len(lines) > 1000:  # 超过1000行清理
-                self.log_text.delete(1.0, "200.0")  # 删除前200行
+    def flush_ui_log(self):
+        """定时把缓冲的日志批量写入状态区域和日志面板"""
+        try:
+            lines = self.ui_log.drain()
+            if lines:
+                text = "\n".join(lines) + "\n"
+                if hasattr(self, 'status_text'):
+                    self.append_text_lines(self.status_text, text, 500, 100)  # 状态区域保留约500行
+                if hasattr(self, 'log_text'):
+                    self.append_text_lines(self.log_text, text, 1000, 200)    # 日志面板保留约1000行
+        finally:
+            self.root.after(self.ui_log_flush_ms, self.flush_ui_log)
 
     def run(self):
         """运行程序"""
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.root.mainloop()
         
-    def setup_global_hotkey(self):
-        """设置全局热键"""
-        self.hotkey_running = True
-        self.hotkey_thread = threading.Thread(target=self.hotkey_listener, daemon=True)
-        self.hotkey_thread.start()
-        self.log_message("🔥 全局热键已启用: F2 (启动/停止监听)")
+    def handle_control_command(self, command):
+        """处理控制命令（在控制线程中调用）：status 直接返回，其余命令交给界面线程执行"""
+        if command != 'status':
+            self.root.after(0, self.run_control_command, command)
+            return {'ok': True, 'queued': command}
+        return self.engine.status()
         
-    def hotkey_listener(self):
-        """全局热键监听器"""
-        try:
-            # 注册F2为全局热键
-            # VK_F2 = 0x71
-            win32gui.RegisterHotKey(None, 1, 0, 0x71)
-            self.log_message("✅ F2热键注册成功")
-            
-            # 监听热键消息
-            while self.hotkey_running:
-                try:
-                    msg = win32gui.GetMessage(None, 0, 0)
-                    if msg[1][1] == win32con.WM_HOTKEY:
-                        # F2被按下，切换监听状态
-                        self.root.after(0, self.toggle_monitoring_by_hotkey)
-                except:
-                    time.sleep(0.1)
-                    
-        except Exception as e:
-            self.log_message("热键注册失败: {}".format(e))
-            # 备用方案：使用轮询检测
-            self.fallback_hotkey_listener()
+    def run_control_command(self, command):
+        """在界面线程中执行控制命令（F2 热键或控制端口）"""
+        if command == 'toggle':
+            command = 'stop' if self.engine.running else 'start'
+        if command == 'start' and not self.engine.running:
+            if not self.engine.templates:
+                self.log_message("⚠️ 控制命令: 请先加载Accept按钮模板")
+                return
+            if self.start_monitoring():
+                self.log_message("🎛️ 控制命令: 开始监听")
+        elif command == 'stop' and self.engine.running:
+            self.stop_monitoring()
+            self.log_message("🎛️ 控制命令: 停止监听")
+        elif command == 'reload':
+            self.reload_config()
             
-    def fallback_hotkey_listener(self):
-        """备用热键监听器（轮询方式）"""
-        self.log_message("🔄 使用备用热键检测方式")
+    def reload_config(self):
+        """重新读取配置文件：应用设置并在后台重新加载模板（监听中时先停止，加载完成后重新开始）"""
+        if self.templates_loading:
+            return
+        self.log_message("🔄 重新读取配置文件...")
+        was_running = self.engine.running
+        if was_running:
+            self.stop_monitoring()
+        # 等待监听线程退出期间不接受新的重新加载或开始监听
+        self.templates_loading = True
         
-        while self.hotkey_running:
-            try:
-                # 检测F2键状态
-                if win32api.GetAsyncKeyState(0x71) & 0x8000:  # F2 = 0x71
-                    # 防止重复触发
-                    time.sleep(0.2)
-                    while win32api.GetAsyncKeyState(0x71) & 0x8000:
-                        time.sleep(0.05)
-                    
-                    # 切换监听状态
-                    self.root.after(0, self.toggle_monitoring_by_hotkey)
-                    
-                time.sleep(0.05)  # 50ms检测间隔
+        def on_done(loaded_count):
+            self.log_message("✅ 配置已重新加载，模板 {} 个".format(len(self.engine.templates)))
+            if was_running and self.engine.templates:
+                self.start_monitoring()
                 
-            except Exception as e:
-                time.sleep(0.1)
-                
-    def toggle_monitoring_by_hotkey(self):
-        """通过热键切换监听状态"""
-        if self.running:
-            self.stop_monitoring()
-            self.log_message("🔥 F2热键: 停止监听")
-        else:
-            if not self.templates:
-                self.log_message("⚠️ F2热键: 请先加载Accept按钮模板")
-                return
-            self.start_monitoring()
-            self.log_message("🔥 F2热键: 开始监听")
+        def reload_templates():
+            # 监听线程退出后再清空模板，避免它还在遍历模板列表时被修改
+            self.templates_loading = False
+            self.engine.templates.clear()
+            self.refresh_template_listbox()
+            self.load_config(on_done)
             
-    def stop_global_hotkey(self):
-        """停止全局热键"""
-        self.hotkey_running = False
-        try:
-            win32gui.UnregisterHotKey(None, 1)
-        except:
-            pass
+        self.after_monitoring_stopped(reload_templates)
         
     def on_closing(self):
-        """关闭程序"""
-        if self.running:
+        """关闭程序：等待监听线程退出后再销毁窗口并释放截图/点击后端"""
+        if self.engine.running:
             self.stop_monitoring()
-        self.stop_global_hotkey()
+        if self.control is not None:
+            self.control.close()
+            self.control = None
+        self.after_monitoring_stopped(self.close_window)
+        
+    def close_window(self):
+        """销毁窗口，释放截图后端并写完缓冲中剩余的日志"""
         self.root.destroy()
+        self.engine.close()
 
     def create_template_panel(self, parent):
         """创建模板管理面板"""
@@ -1091,6 +4900,81 @@ class CursorTemplateClicker:
         self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
+    def create_perf_panel(self, parent):
+        """创建性能面板：监听循环各阶段耗时的滚动分位数"""
+        # 性能控制框架
+        control_frame = ttk.Frame(parent, padding="10")
+        control_frame.pack(fill=tk.X)
+        
+        ttk.Checkbutton(control_frame, text="启用计时", variable=self.profiling_var,
+                        command=self.save_config).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(control_frame, text="💾 导出轨迹", command=self.export_perf_trace).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(control_frame, text="🗑️ 重置统计", command=self.reset_perf_stats).pack(side=tk.LEFT, padx=(0, 15))
+        ttk.Checkbutton(control_frame, text="录制会话(下次开始监听生效)", variable=self.record_session_var,
+                        command=self.save_config).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(control_frame, text="统计最近 {} 个样本".format(self.engine.profiler.window)).pack(side=tk.LEFT)
+        
+        # 阶段耗时表格
+        table_frame = ttk.LabelFrame(parent, text="各阶段耗时 (ms)", padding="10")
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        
+        columns = ('count', 'mean', 'p50', 'p95', 'p99', 'max')
+        self.perf_tree = ttk.Treeview(table_frame, columns=columns, height=15)
+        self.perf_tree.heading('#0', text="阶段")
+        self.perf_tree.column('#0', width=220)
+        for column, text in zip(columns, ("次数", "均值", "P50", "P95", "P99", "最大")):
+            self.perf_tree.heading(column, text=text)
+            self.perf_tree.column(column, width=80, anchor=tk.E)
+        perf_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.perf_tree.yview)
+        self.perf_tree.configure(yscrollcommand=perf_scrollbar.set)
+        
+        self.perf_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        perf_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+    def update_perf_panel(self):
+        """定时刷新性能面板（按阶段更新已有行，不重建表格）"""
+        try:
+            if hasattr(self, 'perf_tree'):
+                rows = self.engine.profiler.snapshot()
+                stages = set()
+                for row in rows:
+                    stage = row['stage']
+                    stages.add(stage)
+                    values = (row['count'], "{:.2f}".format(row['mean']), "{:.2f}".format(row['p50']),
+                              "{:.2f}".format(row['p95']), "{:.2f}".format(row['p99']), "{:.2f}".format(row['max']))
+                    if self.perf_tree.exists(stage):
+                        self.perf_tree.item(stage, values=values)
+                    else:
+                        self.perf_tree.insert('', tk.END, iid=stage, text=row['label'], values=values)
+                for stage in self.perf_tree.get_children():
+                    if stage not in stages:
+                        self.perf_tree.delete(stage)
+        finally:
+            self.root.after(1000, self.update_perf_panel)
+        
+    def export_perf_trace(self):
+        """导出逐帧耗时轨迹（JSON 或 CSV）"""
+        file_path = filedialog.asksaveasfilename(
+            title="导出性能轨迹",
+            defaultextension=".json",
+            initialfile="perf_trace_{}.json".format(datetime.now().strftime("%Y%m%d_%H%M%S")),
+            filetypes=[("JSON 文件", "*.json"), ("CSV 文件", "*.csv")]
+        )
+        if not file_path:
+            return
+        try:
+            frames = self.engine.profiler.export(file_path)
+            self.log_message("💾 已导出性能轨迹: {} ({} 帧)".format(file_path, frames))
+        except Exception as e:
+            self.log_message("❌ 导出性能轨迹失败: {}".format(e))
+            messagebox.showerror("错误", "导出性能轨迹失败: {}".format(e))
+        
+    def reset_perf_stats(self):
+        """清空性能统计和轨迹"""
+        self.engine.profiler.reset()
+        self.log_message("🗑️ 性能统计已重置")
+
     def load_template(self):
         """加载模板文件"""
         file_path = filedialog.askopenfilename(
@@ -1103,28 +4987,23 @@ class CursorTemplateClicker:
 
     def reload_templates(self):
         """重新加载所有模板"""
+        if self.templates_loading:
+            return
         self.log_message("🔄 重新加载模板配置...")
-        template_paths = [template['path'] for template in self.templates]
+        template_paths = [template['path'] for template in self.engine.templates]
         
-        # 清空当前模板
-        self.templates.clear()
-        if hasattr(self, 'template_listbox'):
-            self.template_listbox.delete(0, tk.END)
+        # 清空当前模板，在后台重新加载
+        self.engine.templates.clear()
+        self.refresh_template_listbox()
         
-        # 重新加载
-        loaded_count = 0
-        for template_path in template_paths:
-            if os.path.exists(template_path):
-                self.load_template_file(template_path, quiet=True)
-                loaded_count += 1
+        def on_done(loaded_count):
+            if loaded_count > 0:
+                self.log_message("✅ 重新加载了 {} 个模板".format(loaded_count))
+                self.engine.display_template_order()
             else:
-                self.log_message("⚠️ 模板文件不存在: {}".format(template_path))
+                self.log_message("❌ 没有找到有效的模板文件")
         
-        if loaded_count > 0:
-            self.log_message("✅ 重新加载了 {} 个模板".format(loaded_count))
-            self.display_template_order()
-        else:
-            self.log_message("❌ 没有找到有效的模板文件")
+        self.load_templates_async(template_paths, on_done)
 
     def move_template_up(self):
         """向上移动模板"""
@@ -1133,37 +5012,37 @@ class CursorTemplateClicker:
             index = selection[0]
             
             # 交换模板位置
-            self.templates[index], self.templates[index-1] = self.templates[index-1], self.templates[index]
+            self.engine.templates[index], self.engine.templates[index-1] = self.engine.templates[index-1], self.engine.templates[index]
             
             # 更新列表框
             self.template_listbox.delete(0, tk.END)
-            for template in self.templates:
+            for template in self.engine.templates:
                 self.template_listbox.insert(tk.END, template['name'])
             
             # 保持选中状态
             self.template_listbox.select_set(index-1)
             
-            self.log_message("⬆️ 模板上移: {}".format(self.templates[index-1]['name']))
+            self.log_message("⬆️ 模板上移: {}".format(self.engine.templates[index-1]['name']))
             self.save_config()
 
     def move_template_down(self):
         """向下移动模板"""
         selection = self.template_listbox.curselection()
-        if selection and selection[0] < len(self.templates) - 1:
+        if selection and selection[0] < len(self.engine.templates) - 1:
             index = selection[0]
             
             # 交换模板位置
-            self.templates[index], self.templates[index+1] = self.templates[index+1], self.templates[index]
+            self.engine.templates[index], self.engine.templates[index+1] = self.engine.templates[index+1], self.engine.templates[index]
             
             # 更新列表框
             self.template_listbox.delete(0, tk.END)
-            for template in self.templates:
+            for template in self.engine.templates:
                 self.template_listbox.insert(tk.END, template['name'])
             
             # 保持选中状态
             self.template_listbox.select_set(index+1)
             
-            self.log_message("⬇️ 模板下移: {}".format(self.templates[index+1]['name']))
+            self.log_message("⬇️ 模板下移: {}".format(self.engine.templates[index+1]['name']))
             self.save_config()
 
     def refresh_current_log(self):
@@ -1171,13 +5050,11 @@ class CursorTemplateClicker:
         if hasattr(self, 'log_text'):
             self.log_text.delete(1.0, tk.END)
             
-            # 使用24小时过滤设置读取日志文件内容
+            # 使用24小时过滤设置读取日志文件内容（按索引定位，只加载最近的一段）
             try:
-                log_file = "cursor_template_clicker.log"
+                log_file = self.engine.log_file
                 if os.path.exists(log_file):
-                    content = self.get_filtered_log_content(log_file, self.only_24h_log_var.get())
-                    self.log_text.insert(1.0, content)
-                    self.log_text.see(tk.END)
+                    LogViewer(self.log_text, log_file, self.engine.log_index, self.only_24h_log_var).reload()
                 else:
                     self.log_text.insert(1.0, "日志文件不存在")
             except Exception as e:
@@ -1189,8 +5066,7 @@ class CursorTemplateClicker:
             self.log_text.delete(1.0, tk.END)
         
         try:
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                f.write("")
+            self.engine.clear_log_files()
             self.log_message("🗑️ 日志已清空")
         except Exception as e:
             self.log_message("清空日志失败: {}".format(e))
@@ -1217,7 +5093,7 @@ class CursorTemplateClicker:
                 "4. 在保存对话框中命名并保存模板")
             
             # 获取当前屏幕截图
-            screenshot = pyautogui.screenshot()
+            screenshot = Image.fromarray(cv2.cvtColor(self.engine.capture_screen(), cv2.COLOR_BGR2RGB))
             
             # 创建截取窗口
             self.create_capture_window(screenshot)
@@ -1293,11 +5169,16 @@ class CursorTemplateClicker:
                 # 截取选定区域（这里坐标就是屏幕坐标）
                 region_image = self.capture_screenshot.crop((x1, y1, x2, y2))
                 
-                # 保存模板
-                self.save_captured_template(region_image)
-                
                 self.log_message("✅ 截取区域: ({},{}) 到 ({},{})，尺寸: {}x{}".format(
                     x1, y1, x2, y2, x2-x1, y2-y1))
+                
+                # 按钮内有会变化的文字/背景时先涂抹遮罩，否则直接保存模板
+                if messagebox.askyesno("涂抹遮罩",
+                        "按钮中是否有会随主题或内容变化的区域（文字、背景等）？\n\n"
+                        "选择“是”后可以涂抹这些区域，匹配时将忽略它们"):
+                    self.create_mask_window(region_image)
+                else:
+                    self.save_captured_template(region_image)
             else:
                 capture_window.destroy()
                 self.root.deiconify()
@@ -1319,8 +5200,78 @@ class CursorTemplateClicker:
         
         capture_window.focus_set()
         
+    def create_mask_window(self, image):
+        """遮罩涂抹窗口：放大显示截取的模板，左键拖动涂抹匹配时忽略的区域，右键拖动擦除涂抹；
+        保存时涂抹区域写入 PNG 透明通道（加载模板时自动转换为遮罩）"""
+        zoom = max(1, min(8, 480 // max(image.width, image.height)))
+        mask = Image.new('L', image.size, 255)
+        highlight = Image.new('RGB', image.size, (255, 0, 0))
+        
+        mask_window = tk.Toplevel()
+        mask_window.title("涂抹遮罩 - 红色区域匹配时忽略")
+        mask_window.attributes('-topmost', True)
+        mask_window.resizable(False, False)
+        
+        ttk.Label(mask_window, text="左键拖动涂抹会变化的区域，右键拖动擦除",
+                  font=("Arial", 9)).pack(padx=10, pady=(10, 0))
+        canvas = tk.Canvas(mask_window, width=image.width * zoom, height=image.height * zoom,
+                           highlightthickness=0, cursor='crosshair')
+        canvas.pack(padx=10, pady=10)
+        image_item = canvas.create_image(0, 0, anchor=tk.NW)
+        
+        brush_frame = ttk.Frame(mask_window)
+        brush_frame.pack(fill=tk.X, padx=10)
+        ttk.Label(brush_frame, text="笔刷大小:").pack(side=tk.LEFT)
+        brush_var = tk.IntVar(value=max(1, min(image.size) // 6))
+        ttk.Scale(brush_frame, from_=1, to=max(2, min(image.size) // 2), variable=brush_var,
+                  orient=tk.HORIZONTAL).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        
+        def redraw():
+            # 涂抹区域叠加半透明红色显示
+            shown = Image.composite(image, Image.blend(image, highlight, 0.6), mask)
+            photo = ImageTk.PhotoImage(shown.resize((image.width * zoom, image.height * zoom), Image.NEAREST))
+            canvas.itemconfig(image_item, image=photo)
+            canvas.photo = photo
+            
+        def paint(event, value):
+            x, y, radius = event.x // zoom, event.y // zoom, int(brush_var.get())
+            ImageDraw.Draw(mask).rectangle((x - radius + 1, y - radius + 1, x + radius - 1, y + radius - 1), fill=value)
+            redraw()
+            
+        def clear():
+            mask.paste(255, (0, 0, image.width, image.height))
+            redraw()
+            
+        def finish(use_mask):
+            mask_window.destroy()
+            if use_mask and mask.getextrema()[0] == 0:
+                masked_image = image.convert('RGBA')
+                masked_image.putalpha(mask)
+                self.save_captured_template(masked_image)
+            else:
+                self.save_captured_template(image)
+                
+        def cancel():
+            mask_window.destroy()
+            self.root.deiconify()
+            self.log_message("❌ 取消截取模板")
+            
+        for sequence, value in (("<Button-1>", 0), ("<B1-Motion>", 0), ("<Button-3>", 255), ("<B3-Motion>", 255)):
+            canvas.bind(sequence, lambda event, value=value: paint(event, value))
+        
+        button_frame = ttk.Frame(mask_window)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="保存模板", command=lambda: finish(True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="清除涂抹", command=clear).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="不使用遮罩", command=lambda: finish(False)).pack(side=tk.LEFT, padx=5)
+        mask_window.protocol("WM_DELETE_WINDOW", cancel)
+        mask_window.bind("<Escape>", lambda event: cancel())
+        
+        redraw()
+        mask_window.focus_set()
+        
     def save_captured_template(self, image):
-        """保存截取的模板"""
+        """保存截取的模板（带遮罩的模板保存为带透明通道的 PNG）"""
         try:
             # 显示主窗口
             self.root.deiconify()
@@ -1334,6 +5285,10 @@ class CursorTemplateClicker:
             )
             
             if template_path:
+                # 透明通道只能保存在 PNG 中
+                if image.mode == 'RGBA' and not template_path.lower().endswith('.png'):
+                    template_path = os.path.splitext(template_path)[0] + '.png'
+                
                 # 确保templates目录存在
                 os.makedirs(os.path.dirname(template_path), exist_ok=True)
                 
@@ -1352,10 +5307,837 @@ class CursorTemplateClicker:
 
 
 
+def bundled_template_paths():
+    """返回程序目录下自带的模板图片路径（templates/ 与 window_templates/）"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = []
+    for folder in ('templates', 'window_templates'):
+        folder_path = os.path.join(base_dir, folder)
+        if os.path.isdir(folder_path):
+            for name in sorted(os.listdir(folder_path)):
+                if name.lower().endswith(('.png', '.jpg', '.jpeg')) and not is_mask_file(name):
+                    paths.append(os.path.join(folder_path, name))
+    return paths
+
+
+def load_template_images(template_paths):
+    """读取模板图片，返回与 CursorTemplateClicker.templates 相同结构的字典列表"""
+    templates = []
+    for path in template_paths:
+        try:
+            image, mask = read_template_file(path)
+        except OSError:
+            continue
+        if image is not None:
+            templates.append({'name': os.path.basename(path), 'path': path, 'image': image, **template_variants(image, mask)})
+    return templates
+
+
+def synthetic_screen(width, height, rng):
+    """生成模拟屏幕背景：深色底色 + 噪点 + 随机色块（模拟编辑器界面元素）"""
+    screen = np.full((height, width, 3), 30, dtype=np.uint8)
+    screen += rng.integers(0, 12, size=screen.shape, dtype=np.uint8)
+    for _ in range(60):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 20))
+        w, h = int(rng.integers(20, 300)), int(rng.integers(8, 40))
+        screen[y:y + h, x:x + w] = rng.integers(40, 220, size=3, dtype=np.uint8)
+    return screen
+
+
+def run_match_mode_benchmark(threshold=0.8, rounds=3, seed=0):
+    """匹配通道基准测试：在自带模板上比较 color / gray / edge 三种模式的速度和置信度"""
+    templates = load_template_images(bundled_template_paths())
+    if not templates:
+        print("❌ 没有找到可用于测试的模板图片")
+        return 1
+    
+    # 每个模板放入一张模拟屏幕，另准备一张不含任何模板的屏幕用于统计误匹配置信度
+    rng = np.random.default_rng(seed)
+    empty_screen = synthetic_screen(1920, 1080, rng)
+    planted_screens = []
+    for template_info in templates:
+        screen = synthetic_screen(1920, 1080, rng)
+        th, tw = template_info['image'].shape[:2]
+        x, y = int(rng.integers(0, 1920 - tw)), int(rng.integers(0, 1080 - th))
+        screen[y:y + th, x:x + tw] = template_info['image']
+        planted_screens.append(screen)
+    
+    source = ReplayFrameSource(frames=[empty_screen])
+    print("🎨 匹配通道基准测试 ({} 个模板, 1920x1080, 阈值 {:.2f})".format(len(templates), threshold))
+    print("{:<8}{:>12}{:>14}{:>14}{:>14}{:>10}".format("模式", "转换(ms)", "单模板(ms)", "真实置信度", "最高误匹配", "命中"))
+    
+    for mode, variant in MATCH_MODES.items():
+        def convert(screen):
+            if variant == 'image':
+                return source.to_bgr(screen)
+            gray = source.to_gray(screen)
+            return edge_map(gray) if variant == 'edge' else gray
+        
+        convert_times = []
+        match_times = []
+        true_confidences = []
+        false_confidences = []
+        hits = 0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            empty_image = convert(empty_screen)
+            convert_times.append((time.perf_counter() - start) * 1000)
+            
+            for template_info, screen in zip(templates, planted_screens):
+                image = convert(screen)
+                start = time.perf_counter()
+                true_val, true_loc = PyramidMatcher.exhaustive_match(image, template_info[variant])
+                match_times.append((time.perf_counter() - start) * 1000)
+                false_val, false_loc = PyramidMatcher.exhaustive_match(empty_image, template_info[variant])
+                true_confidences.append(true_val)
+                false_confidences.append(false_val)
+                hits += true_val > threshold
+        
+        print("{:<8}{:>12.2f}{:>14.2f}{:>14.3f}{:>14.3f}{:>10}".format(
+            mode, float(np.mean(convert_times)), float(np.mean(match_times)),
+            float(np.mean(true_confidences)), float(np.max(false_confidences)),
+            "{}/{}".format(hits, len(true_confidences))))
+    return 0
+
+
+def run_atlas_benchmark(template_counts=(4, 8, 16), trials=10, threshold=0.8, seed=0):
+    """模板图集基准测试：由自带模板生成不同版本/主题的变体（亮度、对比度、宽度不同），
+    比较逐模板金字塔匹配与图集共用粗匹配的每帧耗时；以全量匹配为准，逐模板金字塔匹配正确而图集出错时
+    计为不一致（返回非零退出码），同时列出两者各自与全量匹配不同的项数"""
+    bases = load_template_images(bundled_template_paths())
+    if not bases:
+        print("❌ 没有找到可用于测试的模板图片")
+        return 1
+    
+    rng = np.random.default_rng(seed)
+    
+    def make_variant(base, index):
+        image = cv2.convertScaleAbs(base['image'], alpha=float(rng.uniform(0.85, 1.15)), beta=float(rng.uniform(-20, 20)))
+        left, right = (int(value) for value in rng.integers(0, 3, size=2))
+        image = cv2.copyMakeBorder(image, 0, 0, left, right, cv2.BORDER_REPLICATE)
+        name = "{}#{}".format(base['name'], index)
+        return {'name': name, 'path': name, 'image': image, **template_variants(image)}
+        
+    print("🗂️ 模板图集基准测试 (灰度匹配, 1920x1080, 阈值 {:.2f})".format(threshold))
+    print("{:>8}{:>8}{:>16}{:>16}{:>10}{:>12}{:>10}{:>10}".format(
+        "模板数", "分组", "逐模板(ms)", "图集(ms)", "加速比", "金字塔错误", "图集错误", "不一致"))
+    failures = 0
+    for count in template_counts:
+        templates = [make_variant(bases[index % len(bases)], index) for index in range(count)]
+        pyramid = PyramidMatcher()
+        atlas = TemplateAtlas(pyramid, MultiScaleMatcher(scales=(1.0,)))
+        groups = {id(group): group for group in atlas.groups(templates, 1.0, 'gray').values()}
+        
+        pyramid_times, atlas_times = [], []
+        pyramid_errors, atlas_errors, mismatches = 0, 0, 0
+        for trial in range(trials):
+            screen = synthetic_screen(1920, 1080, rng)
+            planted = templates[trial % count]['image']
+            th, tw = planted.shape[:2]
+            x, y = int(rng.integers(0, 1920 - tw)), int(rng.integers(0, 1080 - th))
+            screen[y:y + th, x:x + tw] = planted
+            image = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+            
+            pyramid.begin_frame()
+            started = time.perf_counter()
+            pyramid_results = [pyramid.match(image, template_info, threshold, 'gray') for template_info in templates]
+            pyramid_times.append((time.perf_counter() - started) * 1000)
+            
+            pyramid.begin_frame()
+            started = time.perf_counter()
+            results = []
+            for template_info in templates:
+                result = atlas.match(image, templates, template_info, threshold, 'gray')
+                results.append(result if result is not None else pyramid.match(image, template_info, threshold, 'gray'))
+            atlas_times.append((time.perf_counter() - started) * 1000)
+            
+            for template_info, pyramid_result, atlas_result in zip(templates, pyramid_results, results):
+                exact_val, exact_loc = PyramidMatcher.exhaustive_match(image, template_info['gray'])
+                
+                def wrong(result):
+                    val, loc = result
+                    return (exact_val > threshold) != (val > threshold) or (exact_val > threshold and loc != exact_loc)
+                
+                pyramid_wrong, atlas_wrong = wrong(pyramid_result), wrong(atlas_result)
+                pyramid_errors += pyramid_wrong
+                atlas_errors += atlas_wrong
+                mismatches += atlas_wrong and not pyramid_wrong
+        
+        failures += mismatches
+        pyramid_ms, atlas_ms = float(np.mean(pyramid_times)), float(np.mean(atlas_times))
+        print("{:>8}{:>8}{:>16.1f}{:>16.1f}{:>9.2f}x{:>12}{:>10}{:>10}".format(
+            count, len(groups), pyramid_ms, atlas_ms, pyramid_ms / atlas_ms, pyramid_errors, atlas_errors, mismatches))
+    
+    if failures:
+        print("❌ 图集匹配漏掉了逐模板金字塔匹配能找到的结果: {} 项".format(failures))
+        return 1
+    print("✅ 图集匹配没有漏掉逐模板金字塔匹配能找到的结果（错误项以全量匹配为准）")
+    return 0
+
+
+def run_parallel_benchmark(worker_counts=None, template_counts=(1, 4, 8), screen_sizes=((1920, 1080), (3840, 2160)), rounds=2):
+    """多进程匹配基准测试：改变工作进程数、模板数和屏幕尺寸，按监听循环的批量检测路径
+    （match_all_templates_fullscreen，金字塔匹配关闭）对比单进程全量匹配的每帧耗时"""
+    bases = load_template_images(bundled_template_paths())
+    if not bases:
+        print("❌ 没有找到可用于测试的模板图片")
+        return 1
+    if worker_counts is None:
+        cpu_count = os.cpu_count() or 1
+        worker_counts = sorted({1, 2, 4, cpu_count})
+    
+    engine = ClickerEngine()
+    engine.pyramid_matching = False
+    engine.multi_scale = False
+    engine.roi_cache_enabled = False
+    engine.match_variant = 'gray'
+    engine.match_threshold = 0.8
+    
+    def scan_frame(image):
+        engine.pyramid_matcher.begin_frame()
+        if engine.parallel_engine is not None:
+            engine.parallel_engine.begin_frame()
+        return engine.match_all_templates_fullscreen(image)
+    
+    rng = np.random.default_rng(0)
+    print("🧵 多进程匹配基准测试 (灰度匹配, 批量检测, CPU 核数 {})".format(os.cpu_count()))
+    print("{:<12}{:>8}{:>8}{:>14}{:>10}".format("屏幕", "模板数", "进程数", "每帧(ms)", "加速比"))
+    
+    engines = {}
+    try:
+        for workers in worker_counts:
+            engines[workers] = ParallelMatchEngine(workers)
+        
+        for width, height in screen_sizes:
+            screen = synthetic_screen(width, height, rng)
+            planted = bases[0]['image']
+            screen[100:100 + planted.shape[0], 100:100 + planted.shape[1]] = planted
+            screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+            for template_count in template_counts:
+                # 同一模板图片重复使用时按不同路径区分，和加载多个模板文件一样各自匹配
+                engine.templates = [dict(bases[i % len(bases)], path="{}#{}".format(bases[i % len(bases)]['path'], i))
+                                    for i in range(template_count)]
+                
+                engine.parallel_engine = None
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    serial = scan_frame(screen)
+                serial_ms = (time.perf_counter() - start) * 1000 / rounds
+                print("{:<12}{:>8}{:>8}{:>14.1f}{:>10}".format(
+                    "{}x{}".format(width, height), template_count, "单进程", serial_ms, "1.00x"))
+                
+                for workers, parallel_engine in engines.items():
+                    engine.parallel_engine = parallel_engine
+                    scan_frame(screen)  # 预热：启动工作进程并连接共享内存
+                    start = time.perf_counter()
+                    for _ in range(rounds):
+                        parallel = scan_frame(screen)
+                    parallel_ms = (time.perf_counter() - start) * 1000 / rounds
+                    
+                    if len(serial) != len(parallel) or any(
+                            a['index'] != b['index'] or (a['x'], a['y']) != (b['x'], b['y'])
+                            or abs(a['confidence'] - b['confidence']) > 1e-4 for a, b in zip(serial, parallel)):
+                        print("❌ 多进程结果与单进程不一致 ({} 个工作进程)".format(workers))
+                        return 1
+                    print("{:<12}{:>8}{:>8}{:>14.1f}{:>9.2f}x".format(
+                        "", template_count, workers, parallel_ms, serial_ms / parallel_ms))
+    finally:
+        engine.parallel_engine = None
+        for parallel_engine in engines.values():
+            parallel_engine.close()
+    return 0
+
+
+def run_logging_benchmark(ticks=200, lines_per_tick=5, tick_gap=0.01, slow_write_ms=2.0):
+    """日志阻塞测试：对比同步 FileHandler 与异步批量日志（含日志索引）在每个监听周期中阻塞的时间
+    
+    周期之间休眠 tick_gap 秒（与监听循环的采样间隔一样给后台线程写入的时间）；
+    "慢磁盘"一组给每次写入增加 slow_write_ms 毫秒延迟，模拟磁盘繁忙或杀毒软件扫描。
+    """
+    import tempfile
+    
+    print("📝 日志阻塞测试 ({} 个周期, 每周期 {} 行日志, 周期间隔 {:.0f} ms)".format(ticks, lines_per_tick, tick_gap * 1000))
+    print("{:<16}{:>16}{:>16}{:>16}".format("方式", "每周期均值(ms)", "每周期P99(ms)", "每周期最大(ms)"))
+    
+    def slow_flush(handler):
+        flush = handler.flush
+        def delayed():
+            time.sleep(slow_write_ms / 1000.0)
+            flush()
+        handler.flush = delayed
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for delay in (0.0, slow_write_ms):
+            for mode in ('sync', 'async'):
+                name = '{}_{:g}'.format(mode, delay)
+                logger = logging.getLogger('benchmark_{}'.format(name))
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                log_file = os.path.join(temp_dir, '{}.log'.format(name))
+                
+                listener = None
+                if mode == 'sync':
+                    handler = file_handler = logging.FileHandler(log_file, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+                else:
+                    handler, listener, file_handler = create_async_file_logging(
+                        log_file, console=False, log_index=LogIndex(log_file))
+                    listener.start()
+                if delay:
+                    slow_flush(file_handler)
+                logger.addHandler(handler)
+                
+                tick_times = []
+                for tick in range(ticks):
+                    start = time.perf_counter()
+                    for line in range(lines_per_tick):
+                        logger.info("🎯 全屏模板 cursor.png 匹配成功 (置信度: 0.95) - 屏幕坐标: (%d, %d)", tick, line)
+                    tick_times.append((time.perf_counter() - start) * 1000)
+                    time.sleep(tick_gap)
+                
+                if listener is not None:
+                    listener.stop()
+                logger.removeHandler(handler)
+                handler.close()
+                file_handler.close()
+                
+                label = "同步" if mode == 'sync' else "异步批量"
+                if delay:
+                    label += "(慢磁盘)"
+                print("{:<16}{:>16.3f}{:>16.3f}{:>16.3f}".format(
+                    label, float(np.mean(tick_times)), float(np.percentile(tick_times, 99)), float(np.max(tick_times))))
+    return 0
+
+
+def run_capture_benchmark(frames=30, replay_path=None):
+    """截图后端基准测试：分别统计各后端截图（grab_raw）和转换为 BGR（to_bgr）的耗时"""
+    print("📷 截图后端基准测试 ({} 帧)".format(frames))
+    print("{:<12}{:>14}{:>14}{:>14}{:>14}".format("后端", "截图均值(ms)", "截图P95(ms)", "转换均值(ms)", "合计(ms)"))
+    
+    for name in FRAME_SOURCES:
+        try:
+            if name == 'replay':
+                if replay_path:
+                    source = ReplayFrameSource(replay_path)
+                else:
+                    source = ReplayFrameSource(frames=[synthetic_screen(1920, 1080, np.random.default_rng(0))])
+            else:
+                source = create_frame_source(name)
+        except Exception as e:
+            print("{:<12}不可用: {}".format(name, e))
+            continue
+        
+        grab_times = []
+        convert_times = []
+        try:
+            source.grab(None)  # 预热（创建缓冲区）
+            for _ in range(frames):
+                start = time.perf_counter()
+                raw = source.grab_raw()
+                grabbed = time.perf_counter()
+                source.to_bgr(raw)
+                grab_times.append((grabbed - start) * 1000)
+                convert_times.append((time.perf_counter() - grabbed) * 1000)
+        except Exception as e:
+            print("{:<12}截图失败: {}".format(name, e))
+            continue
+        finally:
+            source.close()
+        
+        grab_mean = float(np.mean(grab_times))
+        convert_mean = float(np.mean(convert_times))
+        print("{:<12}{:>14.2f}{:>14.2f}{:>14.2f}{:>14.2f}".format(
+            name, grab_mean, float(np.percentile(grab_times, 95)), convert_mean, grab_mean + convert_mean))
+    return 0
+
+
+GROUND_TRUTH_FILE = 'ground_truth.json'
+
+
+def make_detection_dataset(out_dir, templates, frames=30, size=(1920, 1080), seed=0):
+    """生成合成检测数据集：模拟屏幕背景上随机放入 0~2 个模板，写入截图和 ground_truth.json
+    
+    ground_truth.json 格式: {"frames": {"截图文件名": [{"template": "模板文件名", "box": [x, y, 宽, 高]}, ...]}}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    width, height = size
+    ground_truth = {}
+    
+    for index in range(frames):
+        screen = synthetic_screen(width, height, rng)
+        boxes = []
+        for template_info in rng.permutation(len(templates))[:int(rng.integers(0, 3))]:
+            template_info = templates[int(template_info)]
+            th, tw = template_info['image'].shape[:2]
+            
+            # 放入的位置不与已放入的模板重叠
+            for _ in range(20):
+                x, y = int(rng.integers(0, width - tw)), int(rng.integers(0, height - th))
+                if all(x + tw <= bx or bx + bw <= x or y + th <= by or by + bh <= y for bx, by, bw, bh in
+                       (box['box'] for box in boxes)):
+                    screen[y:y + th, x:x + tw] = template_info['image']
+                    boxes.append({'template': template_info['name'], 'box': [x, y, tw, th]})
+                    break
+        
+        name = "frame_{:04d}.png".format(index + 1)
+        cv2.imwrite(os.path.join(out_dir, name), screen)
+        ground_truth[name] = boxes
+    
+    with open(os.path.join(out_dir, GROUND_TRUTH_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'frames': ground_truth}, f, indent=2, ensure_ascii=False)
+
+
+def load_detection_dataset(dataset_dir):
+    """读取检测数据集，返回 [(截图文件名, 截图, 标注框列表)]（按文件名排序）"""
+    with open(os.path.join(dataset_dir, GROUND_TRUTH_FILE), 'r', encoding='utf-8') as f:
+        ground_truth = json.load(f)['frames']
+    
+    dataset = []
+    for name in sorted(ground_truth):
+        image = cv2.imread(os.path.join(dataset_dir, name))
+        if image is not None:
+            dataset.append((name, image, ground_truth[name]))
+    return dataset
+
+
+def box_contains(box, x, y):
+    """点击坐标 (x, y) 是否落在标注框 [x, y, 宽, 高] 内"""
+    bx, by, bw, bh = box
+    return bx <= x < bx + bw and by <= y < by + bh
+
+
+def score_template_detections(detections, boxes):
+    """按模板评分：detections 为 [(模板名, x, y)]，命中同名模板的标注框为 TP，返回 (TP, FP, FN)"""
+    tp = fp = 0
+    matched = set()
+    for name, x, y in detections:
+        hit = next((index for index, box in enumerate(boxes)
+                    if index not in matched and box['template'] == name and box_contains(box['box'], x, y)), None)
+        if hit is None:
+            fp += 1
+        else:
+            matched.add(hit)
+            tp += 1
+    return tp, fp, len(boxes) - len(matched)
+
+
+def run_detection_benchmark(dataset_dir=None, config_file='template_config.json', frames=30):
+    """检测流水线基准测试：回放带标注的截图，经过与 monitoring_loop 相同的匹配函数，
+    统计各阶段耗时、帧率、匹配阈值下的精确率/召回率和内存峰值（无需显示器）
+    
+    dataset_dir 为空时用自带模板生成合成数据集。
+    """
+    import tempfile
+    import tracemalloc
+    
+    engine = ClickerEngine(config_file)
+    config = engine.read_config()
+    engine.apply_config(config)
+    template_paths = [path for path in config.get('template_paths', []) if os.path.exists(path)]
+    if not template_paths:
+        # 自带模板目录中有同名的重复图片，按文件名去重（标注按模板文件名区分）
+        template_paths = list({os.path.basename(path): path for path in bundled_template_paths()}.values())
+    engine.load_templates(template_paths)
+    if not engine.templates:
+        print("❌ 没有可用的模板")
+        return 1
+    
+    if not dataset_dir:
+        dataset_dir = tempfile.mkdtemp(prefix='detection_dataset_')
+        make_detection_dataset(dataset_dir, engine.templates, frames)
+        print("🧪 已生成合成数据集: {} ({} 帧)".format(dataset_dir, frames))
+    dataset = load_detection_dataset(dataset_dir)
+    if not dataset:
+        print("❌ 数据集中没有可用的截图: {}".format(dataset_dir))
+        return 1
+    
+    engine.match_variant = MATCH_MODES.get(engine.match_mode, 'image')
+    engine.frame_source = ReplayFrameSource(frames=[image for name, image, boxes in dataset])
+    
+    def detect_all(image):
+        # 测试模式：检测全部模板，只返回置信度最高的一个（不区分模板，按帧评分）
+        x, y, confidence = engine.find_accept_button_template_fullscreen(image)
+        return [] if x is None else [(None, x, y)]
+    
+    def detect_batch(image):
+        # 批量模式：同一帧检测全部模板
+        return [(match['name'], match['x'], match['y']) for match in engine.match_all_templates_fullscreen(image)]
+    
+    def detect_current(image):
+        # 逐帧轮换模式：每次只检测一个模板，这里对同一帧依次检测每个模板
+        detections = []
+        for index in range(len(engine.templates)):
+            engine.current_template_index = index
+            x, y, confidence, name = engine.find_current_template_match_fullscreen(image)
+            if x is not None:
+                detections.append((name, x, y))
+        return detections
+    
+    modes = [
+        ('all', "测试模式(全部模板取最高)", detect_all),
+        ('batch', "批量检测", detect_batch),
+        ('current', "逐帧轮换", detect_current),
+    ]
+    
+    print("🔬 检测流水线基准测试: {} 帧, {} 个模板, 阈值 {:.2f}, 通道 {}, 金字塔 {}, 多尺度 {}".format(
+        len(dataset), len(engine.templates), engine.match_threshold, engine.match_mode,
+        "开" if engine.pyramid_matching else "关", "开" if engine.multi_scale else "关"))
+    print("{:<10}{:>10}{:>10}{:>10}{:>10}{:>9}{:>8}{:>8}{:>6}{:>6}{:>6}{:>12}".format(
+        "模式", "截图(ms)", "转换(ms)", "匹配(ms)", "P95(ms)", "帧/秒", "精确率", "召回率", "TP", "FP", "FN", "内存峰值(MB)"))
+    
+    tracemalloc.start()
+    for key, label, detect in modes:
+        # 每种模式从相同的初始状态开始（区域缓存、多尺度记忆）
+        engine.roi_cache = RoiCache(ttl=engine.roi_cache.ttl)
+        engine.scale_matcher = MultiScaleMatcher(engine.scale_matcher.scales)
+        engine.frame_source.index = 0
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        
+        stage_times = {'grab': [], 'convert': [], 'match': []}
+        tp = fp = fn = 0
+        started = time.perf_counter()
+        for name, image, boxes in dataset:
+            t0 = time.perf_counter()
+            raw = engine.frame_source.grab_raw()
+            engine.pyramid_matcher.begin_frame()
+            t1 = time.perf_counter()
+            frame = engine.convert_frame(engine.frame_source, raw)
+            t2 = time.perf_counter()
+            detections = detect(frame)
+            t3 = time.perf_counter()
+            
+            stage_times['grab'].append((t1 - t0) * 1000)
+            stage_times['convert'].append((t2 - t1) * 1000)
+            stage_times['match'].append((t3 - t2) * 1000)
+            
+            if key == 'all':
+                # 按帧评分：最高置信度的结果落在任一标注框内为 TP
+                hit = bool(detections) and any(box_contains(box['box'], detections[0][1], detections[0][2]) for box in boxes)
+                tp += int(hit)
+                fp += int(bool(detections) and not hit)
+                fn += int(bool(boxes) and not hit)
+            else:
+                frame_tp, frame_fp, frame_fn = score_template_detections(detections, boxes)
+                tp, fp, fn = tp + frame_tp, fp + frame_fp, fn + frame_fn
+        elapsed = time.perf_counter() - started
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        
+        totals = [sum(values) for values in zip(*stage_times.values())]
+        print("{:<10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>9.1f}{:>8.2f}{:>8.2f}{:>6}{:>6}{:>6}{:>12.1f}".format(
+            key, float(np.mean(stage_times['grab'])), float(np.mean(stage_times['convert'])),
+            float(np.mean(stage_times['match'])), float(np.percentile(totals, 95)), len(dataset) / elapsed,
+            tp / max(tp + fp, 1), tp / max(tp + fn, 1), tp, fp, fn, peak_mb))
+    tracemalloc.stop()
+    
+    for key, label, detect in modes:
+        print("  {}: {}".format(key, label))
+    print("  内存峰值为 Python/NumPy 分配的峰值（tracemalloc，不含 OpenCV 内部缓冲区）")
+    try:
+        import resource
+        print("  进程最大常驻内存: {:.1f} MB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+    except ImportError:
+        pass
+    return 0
+
+
+def load_recorded_session(session_dir):
+    """读取录制会话，返回 (session.json 内容, 事件列表)"""
+    with open(os.path.join(session_dir, SessionRecorder.SESSION_FILE), 'r', encoding='utf-8') as f:
+        session = json.load(f)
+    events = []
+    with open(os.path.join(session_dir, SessionRecorder.EVENTS_FILE), 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    return session, events
+
+
+def replay_decision(engine, mode, image, regions, exclude=()):
+    """用当前代码对一帧重新做决策（与 monitoring_loop 各模式相同的匹配函数），返回 (动作, 模板名, x, y)
+    
+    exclude 为录制时冷却中（跳过匹配）的模板索引。
+    """
+    if mode == 'test':
+        x, y, confidence = engine.find_accept_button_template_fullscreen(image, regions)
+        return ('none', None, None, None) if x is None else ('move', None, x, y)
+    if mode == 'batch':
+        match = engine.select_sequence_match(engine.match_all_templates_fullscreen(image, regions, exclude=exclude))
+        return ('none', None, None, None) if match is None else ('click', match['name'], match['x'], match['y'])
+    x, y, confidence, name = engine.find_current_template_match_fullscreen(image)
+    return ('none', None, None, None) if x is None else ('click', name, x, y)
+
+
+def run_session_replay(session_dir, tolerance=3):
+    """离线回放录制会话：按录制时的设置、模板、截图和变化区域全速重新检测每一帧，
+    与录制的决策逐帧比较，统计检测耗时（无需显示器，不执行点击）
+
+    决策不一致（动作、模板不同或坐标相差超过 tolerance 像素）时返回非零退出码，可用于回归检查。
+    """
+    try:
+        session, events = load_recorded_session(session_dir)
+    except (OSError, ValueError) as e:
+        print("❌ 无法读取录制会话: {}".format(e))
+        return 1
+
+    engine = ClickerEngine()
+    settings = session.get('settings', {})
+    engine.apply_config(settings)
+    engine.load_templates(settings.get('template_paths', []))
+    if not engine.templates:
+        print("❌ 录制会话中的模板文件都不存在: {}".format(settings.get('template_paths', [])))
+        return 1
+    engine.match_variant = MATCH_MODES.get(engine.match_mode, 'image')
+    mode = session.get('mode', 'batch')
+
+    print("🎬 回放会话: {} (模式 {}, 录制于 {}, {} 帧, {} 个模板)".format(
+        session_dir, mode, session.get('started_at', '?'), len(events), len(engine.templates)))
+
+    loaded_name, loaded_image = None, None
+    replayed = skipped = missing = 0
+    mismatches = []
+    tick_times = []
+    started = time.perf_counter()
+    for event in events:
+        if event['action'] in ('skip', 'cooldown'):
+            skipped += 1
+            continue
+
+        # 同一张截图连续被多帧引用（画面静止），只读取一次
+        name = event.get('frame')
+        if name != loaded_name:
+            path = os.path.join(session_dir, name) if name else None
+            loaded_name = name
+            loaded_image = cv2.imread(path) if path and os.path.exists(path) else None
+        if loaded_image is None:
+            missing += 1  # 写入跟不上被丢弃，或超出磁盘预算被删除
+            continue
+
+        regions = None if event.get('regions') is None else [tuple(region) for region in event['regions']]
+        engine.current_template_index = event.get('template_index', 0) % len(engine.templates)
+        engine.capture_origin = tuple(event.get('origin', (0, 0)))
+
+        tick_started = time.perf_counter()
+        frame_source = ReplayFrameSource(frames=[loaded_image])
+        engine.pyramid_matcher.begin_frame()
+        image = engine.convert_frame(frame_source, frame_source.grab_raw())
+        action, template, x, y = replay_decision(engine, mode, image, regions, event.get('cooling', ()))
+        tick_times.append((time.perf_counter() - tick_started) * 1000)
+        replayed += 1
+
+        expected = event['action']
+        same = action == expected and (action == 'none' or (
+            abs(x - event['x']) <= tolerance and abs(y - event['y']) <= tolerance
+            and (template is None or template == event.get('template'))))
+        if not same:
+            mismatches.append((event, action, template, x, y))
+    elapsed = time.perf_counter() - started
+
+    print("回放: {} 帧 | 静止跳过: {} | 缺少截图: {} | 决策不一致: {}".format(replayed, skipped, missing, len(mismatches)))
+    if tick_times:
+        print("检测耗时: 均值 {:.2f} ms, P95 {:.2f} ms, 最大 {:.2f} ms | 回放速度: {:.1f} 帧/秒".format(
+            float(np.mean(tick_times)), float(np.percentile(tick_times, 95)), float(np.max(tick_times)),
+            replayed / max(elapsed, 1e-6)))
+
+    def describe(action, template, x, y):
+        if action == 'none':
+            return "未命中"
+        return "{} {}({}, {})".format(action, template + " " if template else "", x, y)
+
+    for event, action, template, x, y in mismatches[:20]:
+        print("  ❌ 第{}帧 t={:.2f}s {}: 录制 {} -> 回放 {}".format(
+            event['tick'], event['t'], event.get('frame'),
+            describe(event['action'], event.get('template'), event.get('x'), event.get('y')),
+            describe(action, template, x, y)))
+    if len(mismatches) > 20:
+        print("  ... 共 {} 帧不一致".format(len(mismatches)))
+    return 1 if mismatches else 0
+
+
+def run_startup_benchmark(rounds=5, max_import_ms=None):
+    """用 -X importtime 在子进程中导入本程序，统计模块导入耗时，并检查启动时没有加载重量级模块
+    
+    返回非零退出码表示回归：启动时加载了 HEAVY_MODULES 中的模块，或导入耗时中位数超过 max_import_ms。
+    """
+    import subprocess
+    
+    script = os.path.abspath(__file__)
+    code = (
+        "import importlib.util, sys, time\n"
+        "started = time.perf_counter()\n"
+        "spec = importlib.util.spec_from_file_location('cursor_auto_clicker', {script!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        "print('{{:.3f}}'.format((time.perf_counter() - started) * 1000))\n"
+        "print(','.join(name for name in module.HEAVY_MODULES if name in sys.modules))\n"
+    ).format(script=script)
+    
+    load_times = []
+    eager_modules = set()
+    top_imports = {}
+    for _ in range(rounds):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                capture_output=True, text=True, check=True)
+        load_ms, eager = result.stdout.splitlines()[-2:]
+        load_times.append(float(load_ms))
+        eager_modules.update(name for name in eager.split(',') if name)
+        
+        # 只统计顶层导入（importtime 用缩进表示嵌套层级）
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if not name[1:].startswith(' '):
+                name = name.strip()
+                top_imports[name] = max(top_imports.get(name, 0), int(cumulative_us))
+    
+    median_ms = float(np.median(load_times))
+    print("启动导入耗时（{} 次中位数）: {:.1f} ms".format(rounds, median_ms))
+    print("{:<36}{:>14}".format("顶层导入", "累计(ms)"))
+    for name, cumulative_us in sorted(top_imports.items(), key=lambda item: -item[1])[:10]:
+        print("{:<36}{:>14.1f}".format(name, cumulative_us / 1000))
+    
+    failed = False
+    if eager_modules:
+        print("❌ 启动时加载了重量级模块: {}".format(", ".join(sorted(eager_modules))))
+        failed = True
+    if max_import_ms is not None and median_ms > max_import_ms:
+        print("❌ 导入耗时 {:.1f} ms 超过上限 {:.1f} ms".format(median_ms, max_import_ms))
+        failed = True
+    if not failed:
+        print("✅ 启动时未加载重量级模块（{}）".format(", ".join(HEAVY_MODULES)))
+    return 1 if failed else 0
+
+
+def run_control_client(command, config_file):
+    """向正在运行的程序（图形界面或无界面模式）发送控制命令，端口和令牌从配置文件读取，返回进程退出码"""
+    engine = ClickerEngine(config_file)
+    try:
+        engine.apply_config(engine.read_config())
+    except (OSError, ValueError) as e:
+        print("❌ 无法读取配置文件 {}: {}".format(config_file, e))
+        return 1
+    if engine.control_port <= 0:
+        print("❌ 配置文件中没有启用控制端口（control_port）")
+        return 1
+    try:
+        reply = send_control_command(command, engine.control_port, token=engine.control_token)
+    except (OSError, ValueError) as e:
+        print("❌ 无法连接控制端口 {}: {}".format(engine.control_port, e))
+        return 1
+    print(json.dumps(reply, ensure_ascii=False))
+    return 0 if reply.get('ok') else 1
+    
+    
+def run_headless(config_file, perf_trace=None):
+    """无界面模式：按配置文件加载模板并在后台线程持续监听，直到 Ctrl+C 或 SIGTERM 退出（F2 热键和控制端口可暂停/恢复监听）
+    
+    perf_trace 不为空时，停止后把各阶段耗时轨迹导出到该文件（.json 或 .csv）。
+    """
+    engine = ClickerEngine(config_file)
+    engine.setup_logging()
+    quit_event = threading.Event()
+    control = None
+    
+    def request_stop(signum, frame):
+        quit_event.set()
+        
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, request_stop)
+        
+    try:
+        engine.log_message("🖥️ 无界面模式启动 - 配置文件: {}".format(os.path.abspath(config_file)))
+        if not os.path.exists(config_file):
+            engine.log_message("❌ 配置文件不存在: {}".format(config_file))
+            return 1
+        engine.load_config()
+        if not engine.templates:
+            engine.log_message("❌ 配置中没有可用的模板，请先在图形界面中加载模板")
+            return 1
+
+        # 监听在后台线程运行，F2 热键和控制端口可以停止/重新开始；主线程只等待退出信号
+        control = create_control_channel(engine, engine.handle_control_command)
+        engine.start()
+        while not quit_event.wait(1.0):
+            pass
+
+        if engine.running:
+            engine.stop()
+        engine.wait_stopped()
+        if engine.perf_summary():
+            engine.log_message("⏱️ {}".format(engine.perf_summary()))
+        if perf_trace:
+            frames = engine.profiler.export(perf_trace)
+            engine.log_message("💾 已导出性能轨迹: {} ({} 帧)".format(perf_trace, frames))
+        return 0
+    finally:
+        if control is not None:
+            control.close()
+        engine.close()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cursor Auto Accept - 图像匹配监听程序")
+    parser.add_argument('--benchmark-capture', action='store_true',
+                        help='比较各截图后端的截图延迟后退出')
+    parser.add_argument('--benchmark-match-mode', action='store_true',
+                        help='在自带模板上比较各匹配通道（color/gray/edge）的速度和置信度后退出')
+    parser.add_argument('--benchmark-atlas', action='store_true',
+                        help='比较逐模板金字塔匹配与模板图集（相似模板共用粗匹配）的每帧耗时，并校验结果一致后退出')
+    parser.add_argument('--benchmark-parallel', action='store_true',
+                        help='改变工作进程数、模板数和屏幕尺寸，测试多进程匹配的加速比后退出')
+    parser.add_argument('--benchmark-logging', action='store_true',
+                        help='对比同步与异步日志在每个监听周期中的阻塞时间后退出')
+    parser.add_argument('--benchmark-detection', nargs='?', const='', metavar='DATASET',
+                        help='回放带标注的截图目录（含 ground_truth.json，省略时生成合成数据集），'
+                             '统计检测各阶段耗时、帧率、精确率/召回率和内存峰值后退出')
+    parser.add_argument('--benchmark-startup', action='store_true',
+                        help='用 -X importtime 统计程序导入耗时，检查启动时没有加载重量级模块后退出')
+    parser.add_argument('--max-import-ms', type=float, metavar='MS',
+                        help='--benchmark-startup 的导入耗时上限，超过时返回非零退出码')
+    parser.add_argument('--replay-session', metavar='DIR',
+                        help='全速回放录制的会话目录，用当前代码重新检测每帧并与录制的决策比较后退出')
+    parser.add_argument('--headless', action='store_true',
+                        help='无界面模式：不创建窗口，按配置文件直接开始监听（Ctrl+C 停止）')
+    parser.add_argument('--perf-trace', metavar='FILE',
+                        help='无界面模式停止后导出各阶段耗时轨迹（.json 或 .csv）')
+    parser.add_argument('--control', choices=CONTROL_COMMANDS,
+                        help='向正在运行的程序发送控制命令（需在配置中设置 control_port）后退出')
+    parser.add_argument('--config', default='template_config.json', metavar='PATH',
+                        help='配置文件路径（默认 template_config.json）')
+    parser.add_argument('--frames', type=int, default=30, help='基准测试的帧数')
+    parser.add_argument('--replay', metavar='PATH', help='回放截图文件或目录（用于基准测试）')
+    args = parser.parse_args()
+    
+    if args.benchmark_capture:
+        sys.exit(run_capture_benchmark(args.frames, args.replay))
+    if args.benchmark_match_mode:
+        sys.exit(run_match_mode_benchmark())
+    if args.benchmark_atlas:
+        sys.exit(run_atlas_benchmark())
+    if args.benchmark_parallel:
+        sys.exit(run_parallel_benchmark())
+    if args.benchmark_logging:
+        sys.exit(run_logging_benchmark())
+    if args.benchmark_detection is not None:
+        sys.exit(run_detection_benchmark(args.benchmark_detection, args.config, args.frames))
+    if args.benchmark_startup:
+        sys.exit(run_startup_benchmark(max_import_ms=args.max_import_ms))
+    if args.replay_session:
+        sys.exit(run_session_replay(args.replay_session))
+    if args.control:
+        sys.exit(run_control_client(args.control, args.config))
+    
+    enable_dpi_awareness()
+    if args.headless:
+        sys.exit(run_headless(args.config, args.perf_trace))
+    
     print("🖼️ Cursor Auto Accept - 图像匹配监听程序")
     print("=" * 50)
     print("正在启动图形界面...")
     
-    app = CursorTemplateClicker()
+    app = CursorTemplateClicker(args.config)
     app.run() 
\ No newline at end of file
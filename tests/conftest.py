@@ -0,0 +1,31 @@
+"""测试共用夹具：主程序文件名含连字符，不能直接 import，这里按文件路径加载一次供各测试使用"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cursor-auto-clicker-template.py')
+
+
+def load_clicker():
+    """按文件路径导入主程序，注册到 sys.modules（多进程匹配需要按模块名反序列化函数）"""
+    module = sys.modules.get('clicker')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('clicker', SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['clicker'] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def clicker():
+    return load_clicker()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    """在临时目录中运行，模板缓存、日志等按相对路径写入的文件不落到仓库里"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,152 @@
+"""点击调度：在合成屏幕上放入模板，用模拟点击后端检查点击确认、重试和放弃，
+以及逐模板状态机（确认后点击、同一画面复用结果、冷却期内跳过匹配）"""
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def engine(clicker):
+    engine = clicker.ClickerEngine()
+    engine.load_templates(clicker.bundled_template_paths()[:1])
+    assert engine.templates, "没有找到可用于测试的模板图片"
+    engine.match_variant = clicker.MATCH_MODES.get(engine.match_mode, 'image')
+    engine.interval = 0
+    engine.click_cooldown = 0
+    engine.click_dispatcher.verify_timeout = 0.2
+    engine.click_dispatcher.verify_poll = 0.02
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def screens(clicker, engine):
+    """返回 (空屏幕, 放入模板的屏幕, 按钮中心)"""
+    empty = clicker.synthetic_screen(1280, 720, np.random.default_rng(0))
+    screen = empty.copy()
+    template = engine.templates[0]['image']
+    th, tw = template.shape[:2]
+    screen[300:300 + th, 500:500 + tw] = template
+    return empty, screen, (500 + tw // 2, 300 + th // 2)
+
+
+def detect(engine, frame_source):
+    matches = engine.match_all_templates_fullscreen(engine.convert_frame(frame_source, frame_source.grab_raw()))
+    return engine.select_sequence_match(matches)
+
+
+# 点击后第几次按钮消失（0 表示一直不消失）, 期望结果, 期望点击次数（None 表示重试次数 + 1）
+@pytest.mark.parametrize('takes_on, expect_clicked, expect_attempts', [
+    (1, True, 1),      # 第一次点击生效
+    (2, True, 2),      # 第一次点击未生效，重试后生效
+    (0, False, None),  # 按钮一直不消失，重试后放弃
+])
+def test_click_verify_and_retry(clicker, engine, screens, takes_on, expect_clicked, expect_attempts):
+    empty, screen, (button_x, button_y) = screens
+    frame_source = engine.frame_source = clicker.ReplayFrameSource(frames=[screen])
+    
+    def on_click(x, y):
+        if len(backend.clicks) == takes_on:
+            frame_source.frames = [empty]
+            
+    backend = engine.click_dispatcher.backend = clicker.FakeClickBackend(on_click)
+    match = detect(engine, frame_source)
+    assert match is not None
+    
+    clicked = engine.click_button_fullscreen(match['x'], match['y'], engine.templates[match['index']])
+    assert clicked == expect_clicked
+    assert len(backend.clicks) == (expect_attempts or engine.click_dispatcher.retries + 1)
+    assert all(abs(x - button_x) <= 1 and abs(y - button_y) <= 1 for x, y in backend.clicks)
+
+
+def test_state_machine_confirms_then_cools_down(clicker, engine, screens):
+    # 第一帧命中只标记出现，同一画面的第二帧复用结果并确认后点击，冷却期内跳过匹配
+    engine.tracker.confirm_frames = 2
+    engine.click_verify = False
+    engine.click_cooldown = 60
+    frame_source = engine.frame_source = clicker.ReplayFrameSource(frames=[screens[1]])
+    backend = engine.click_dispatcher.backend = clicker.FakeClickBackend()
+    states = []
+    matched = []
+    for tick in range(3):
+        raw = frame_source.grab_raw()
+        signature = engine.change_detector.signature(raw)
+        cooling = engine.tracker.cooling(engine.templates)
+        matches = engine.match_all_templates_fullscreen(engine.convert_frame(frame_source, raw), None, signature, cooling)
+        matched.append(len(matches))
+        match = engine.select_sequence_match(matches)
+        if match is not None:
+            engine.click_confirmed_match(engine.templates[match['index']], match['index'], match['x'], match['y'], match['confidence'])
+        states.append(engine.tracker.state(engine.templates[0]['path']))
+        
+    assert states == [clicker.TemplateTracker.APPEARING, clicker.TemplateTracker.CLICKED, clicker.TemplateTracker.COOLDOWN]
+    assert len(backend.clicks) == 1 and matched == [1, 1, 0]
+    assert engine.tracker.reused == 1 and engine.tracker.skipped == 1
+
+
+def test_click_without_template_is_not_verified(clicker, engine, screens):
+    button_x, button_y = screens[2]
+    backend = engine.click_dispatcher.backend = clicker.FakeClickBackend()
+    assert engine.click_button_fullscreen(button_x, button_y)
+    assert len(backend.clicks) == 1 and engine.last_click['verified'] is None
+
+
+def test_click_interval_blocks_repeat_clicks(clicker, engine, screens):
+    button_x, button_y = screens[2]
+    backend = engine.click_dispatcher.backend = clicker.FakeClickBackend()
+    assert engine.click_button_fullscreen(button_x, button_y)
+    engine.interval = 60
+    assert not engine.click_button_fullscreen(button_x, button_y)
+    assert len(backend.clicks) == 1
+
+
+def test_test_mode_moves_without_clicking(clicker, engine, screens):
+    button_x, button_y = screens[2]
+    backend = engine.click_dispatcher.backend = clicker.FakeClickBackend()
+    assert engine.move_to_button(button_x, button_y, 0.95)
+    assert backend.moves == [(button_x, button_y)] and backend.clicks == []
+
+
+def test_failed_click_backs_off_instead_of_cooling_down(clicker, engine, screens):
+    # 按钮一直不消失：不进入完整冷却，只短暂暂停匹配，之后回到 absent 重新确认
+    engine.click_cooldown = 60
+    engine.click_retry_backoff = 0.5
+    frame_source = engine.frame_source = clicker.ReplayFrameSource(frames=[screens[1]])
+    engine.click_dispatcher.backend = clicker.FakeClickBackend()
+    match = detect(engine, frame_source)
+    key = engine.templates[0]['path']
+    
+    assert not engine.click_button_fullscreen(match['x'], match['y'], engine.templates[0])
+    assert engine.tracker.state(key) == clicker.TemplateTracker.COOLDOWN
+    now = engine.last_click_time
+    assert engine.tracker.cooling(engine.templates, now + 0.1) == [0]
+    assert engine.tracker.cooling(engine.templates, now + 1.0) == []
+    assert engine.tracker.state(key) == clicker.TemplateTracker.ABSENT
+
+
+def test_verified_click_starts_cooldown(clicker, engine, screens):
+    empty, screen, _ = screens
+    engine.click_cooldown = 60
+    frame_source = engine.frame_source = clicker.ReplayFrameSource(frames=[screen])
+    
+    def on_click(x, y):
+        frame_source.frames = [empty]
+        
+    engine.click_dispatcher.backend = clicker.FakeClickBackend(on_click)
+    match = detect(engine, frame_source)
+    assert engine.click_button_fullscreen(match['x'], match['y'], engine.templates[0])
+    assert engine.tracker.state(engine.templates[0]['path']) == clicker.TemplateTracker.CLICKED
+    assert engine.tracker.cooling(engine.templates, engine.last_click_time + 30) == [0]
+
+
+def test_partial_grab_is_unknown_not_gone(clicker, engine, screens):
+    # 确认时截到的区域比模板还小：无法判断，点击一次后不重试，也不当作按钮已消失
+    empty, screen, _ = screens
+    frame_source = engine.frame_source = clicker.ReplayFrameSource(frames=[screen])
+    match = detect(engine, frame_source)
+    frame_source.frames = [screen[:, :match['x']]]  # 按钮右半边在截图之外
+    backend = engine.click_dispatcher.backend = clicker.FakeClickBackend()
+    
+    probe = engine.button_probe(frame_source, engine.templates[0], match['x'], match['y'])
+    assert probe() is None
+    assert engine.click_button_fullscreen(match['x'], match['y'], engine.templates[0])
+    assert len(backend.clicks) == 1 and engine.last_click['verified'] is None
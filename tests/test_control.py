@@ -0,0 +1,87 @@
+"""控制子系统：模拟按键后端的切换和去抖，本地控制端口的命令、令牌校验和关闭，停止时唤醒监听线程"""
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def state():
+    return {'running': False}
+
+
+@pytest.fixture
+def channel(clicker, state):
+    def handler(command):
+        if command == 'toggle':
+            state['running'] = not state['running']
+        elif command in ('start', 'stop'):
+            state['running'] = command == 'start'
+        return {'ok': True, 'running': state['running']}
+        
+    channel = clicker.ControlChannel(handler, print, debounce=0.2)
+    yield channel
+    channel.close()
+
+
+def wait_replies(backend, count, timeout=2.0):
+    deadline = time.time() + timeout
+    while len(backend.replies) < count and time.time() < deadline:
+        time.sleep(0.01)
+    return backend.replies
+
+
+def test_hotkey_toggle_is_debounced(clicker, channel, state):
+    fake = channel.add(clicker.FakeControlBackend())
+    fake.press('toggle')
+    fake.press('toggle')  # 去抖时间内的重复按键应被忽略
+    replies = wait_replies(fake, 2)
+    assert state['running']
+    assert replies[:2] == [{'ok': True, 'running': True}, {'ok': True, 'ignored': 'debounce'}]
+
+
+def test_control_port_commands(clicker, channel, state):
+    server = channel.add(clicker.SocketControlBackend(0, token='secret'))
+    server.ready.wait(2.0)
+    assert server.listening
+    
+    state['running'] = True
+    reply = clicker.send_control_command('stop', server.port, token='secret')
+    assert reply.get('ok') and not state['running']
+    assert clicker.send_control_command('status', server.port, token='secret') == {'ok': True, 'running': False}
+    
+    reply = clicker.send_control_command('start', server.port, token='wrong')
+    assert not reply.get('ok') and not state['running']
+    reply = clicker.send_control_command('jump', server.port, token='secret')
+    assert not reply.get('ok') and 'commands' in reply
+
+
+def test_close_stops_control_threads(clicker, channel):
+    channel.add(clicker.FakeControlBackend())
+    server = channel.add(clicker.SocketControlBackend(0))
+    server.ready.wait(2.0)
+    channel.close()
+    assert not any(thread.is_alive() for thread in channel._threads)
+
+
+def test_wake_interrupts_scheduler_sleep(clicker):
+    # 停止监听时唤醒按采样间隔休眠的监听线程，reload/close 才能及时等到它退出
+    scheduler = clicker.PollScheduler(min_interval=5.0, max_interval=5.0)
+    sleeper = threading.Thread(target=scheduler.wait, daemon=True)
+    sleeper.start()
+    scheduler.wake()
+    sleeper.join(1.0)
+    assert not sleeper.is_alive()
+
+
+def test_start_command_reports_failure(clicker, monkeypatch):
+    # 上一次的监听线程仍未退出时 start 失败：不记录"开始监听"，回复失败
+    engine = clicker.ClickerEngine()
+    messages = []
+    monkeypatch.setattr(engine, 'log_message', messages.append)
+    monkeypatch.setattr(engine, 'wait_stopped', lambda timeout=10: False)
+    engine.templates = [{'name': 'button.png', 'path': 'button.png'}]
+    
+    reply = engine.handle_control_command('start')
+    assert not reply['ok'] and not engine.running
+    assert "🎛️ 控制命令: 开始监听" not in messages
@@ -0,0 +1,21 @@
+"""延迟导入：首次访问属性时才导入，属性读写转发给模块"""
+import types
+
+
+def test_import_on_first_access_and_forward(clicker):
+    proxy = clicker.LazyModule('colorsys')
+    assert object.__getattribute__(proxy, '_module') is None
+    assert proxy.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    module = object.__getattribute__(proxy, '_module')
+    assert isinstance(module, types.ModuleType)
+    
+    # 模块之后新增的属性也能读到，写入的属性落在模块上
+    module.added_later = 1
+    assert proxy.added_later == 1
+    proxy.written = 2
+    assert module.written == 2 and 'written' not in vars(proxy)
+    del module.added_later, module.written
+
+
+def test_unavailable_module(clicker):
+    assert not clicker.LazyModule('module_that_does_not_exist').available()
@@ -0,0 +1,68 @@
+"""日志查看器：增量刷新只追加新内容，日志文件被删除或轮转时重新加载而不是报错"""
+import os
+
+import pytest
+
+
+class FakeText:
+    """只记录文本内容的文本框替身（无需显示器）"""
+    
+    def __init__(self):
+        self.text = ''
+        
+    def cget(self, key):
+        return 'disabled'
+        
+    def config(self, **kwargs):
+        pass
+        
+    def see(self, index):
+        pass
+        
+    def delete(self, start, end):
+        self.text = ''
+        
+    def insert(self, index, text):
+        self.text = text + self.text if index == "1.0" else self.text + text
+        
+    def get(self, start, end):
+        return self.text.split('\n')[0]
+
+
+class Flag:
+    def __init__(self, value):
+        self.value = value
+        
+    def get(self):
+        return self.value
+
+
+@pytest.fixture
+def viewer(clicker, tmp_path):
+    log_file = str(tmp_path / 'test.log')
+    with open(log_file, 'w', encoding='utf-8') as f:
+        f.write("2026-01-01 00:00:00,000 - INFO - 第一行\n")
+    return clicker.LogViewer(FakeText(), log_file, clicker.LogIndex(log_file), Flag(False))
+
+
+def test_refresh_appends_new_lines(viewer):
+    viewer.reload()
+    with open(viewer.log_file, 'a', encoding='utf-8') as f:
+        f.write("2026-01-01 00:00:01,000 - INFO - 第二行\n")
+    viewer.refresh()
+    assert viewer.text_widget.text.count('\n') == 2 and viewer.text_widget.text.endswith("第二行\n")
+
+
+def test_refresh_after_log_deleted(viewer):
+    viewer.reload()
+    os.remove(viewer.log_file)
+    viewer.refresh()
+    assert viewer.text_widget.text == '' and viewer.current_size == 0
+
+
+def test_refresh_during_rotation(viewer):
+    # 当前日志已改名为 .1、新文件尚未创建：重新加载后仍能看到备份中的内容
+    viewer.reload()
+    os.rename(viewer.log_file, viewer.log_file + '.1')
+    viewer.refresh()
+    assert "第一行" in viewer.text_widget.text
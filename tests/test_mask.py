@@ -0,0 +1,97 @@
+"""遮罩匹配：PNG 透明通道和遮罩旁路文件解码为遮罩，模板缓存保留遮罩（修改遮罩文件后重新编译），
+按钮文字每次都不同时带遮罩的模板仍能准确命中，金字塔匹配与全量匹配一致"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+THRESHOLD = 0.8
+
+
+def button(label_seed):
+    """合成按钮：固定的底色、边框和图标，中间的文字区域每次不同（模拟随主题或内容变化的文字）"""
+    image = np.full((32, 120, 3), (200, 120, 40), dtype=np.uint8)
+    cv2.rectangle(image, (0, 0), (119, 31), (250, 250, 250), 2)
+    cv2.circle(image, (16, 16), 8, (20, 220, 20), -1)
+    image[8:24, 32:112] = np.random.default_rng(label_seed).integers(0, 256, size=(16, 80, 3), dtype=np.uint8)
+    return image
+
+
+@pytest.fixture
+def template():
+    return button(0)
+
+
+@pytest.fixture
+def mask(template):
+    mask = np.full(template.shape[:2], 255, dtype=np.uint8)
+    mask[6:26, 30:114] = 0
+    return mask
+
+
+def test_png_alpha_decodes_to_mask(clicker, template, mask):
+    # 四周完全透明的边缘被裁掉，其余透明区域成为遮罩
+    bgra = cv2.copyMakeBorder(cv2.cvtColor(template, cv2.COLOR_BGR2BGRA), 4, 4, 4, 4, cv2.BORDER_CONSTANT, value=0)
+    bgra[4:-4, 4:-4, 3] = mask
+    image, decoded_mask = clicker.decode_template(cv2.imencode('.png', bgra)[1].tobytes())
+    assert image.shape == template.shape and (image == template).all()
+    assert decoded_mask is not None and (decoded_mask == mask).all()
+
+
+def test_opaque_template_has_no_mask(clicker, template):
+    assert clicker.decode_template(cv2.imencode('.png', template)[1].tobytes())[1] is None
+
+
+def test_mask_file_and_template_cache(clicker, template, mask, tmp_path):
+    path = str(tmp_path / 'button.png')
+    cv2.imwrite(path, template)
+    cv2.imwrite(clicker.mask_path_for(path), mask)
+    engine = clicker.ClickerEngine()
+    engine.template_cache = clicker.TemplateCache(str(tmp_path / 'cache'))
+    try:
+        compiled = engine.load_compiled_template(path)
+        assert compiled is not None and engine.template_cache.misses == 1
+        assert (compiled['mask'] == mask).all()
+        
+        # 缓存命中后保留遮罩和各尺度遮罩
+        cached = engine.load_compiled_template(path)
+        assert cached is not None and engine.template_cache.hits == 1
+        assert (cached['mask'] == mask).all() and 'pyramid_mask' in cached
+        assert all(scaled['mask'].shape == scaled['image'].shape[:2] for scaled in cached['scaled'].values())
+        
+        # 修改遮罩文件后重新编译模板（左侧 4 列完全透明，被裁掉）
+        changed = mask.copy()
+        changed[:, :4] = 0
+        cv2.imwrite(clicker.mask_path_for(path), changed)
+        reloaded = engine.load_compiled_template(path)
+        assert engine.template_cache.misses == 2
+        assert reloaded['image'].shape[1] == template.shape[1] - 4
+        
+        # 遮罩文件不会作为模板加载
+        assert engine.load_template_file(clicker.mask_path_for(path), quiet=True) is None
+    finally:
+        engine.close()
+
+
+@pytest.mark.parametrize('trial', range(5))
+def test_masked_match_ignores_variable_text(clicker, template, mask, trial):
+    # 屏幕上的按钮文字与模板不同
+    template_info = {'name': 'button.png', 'path': 'button.png', 'image': template,
+                     **clicker.template_variants(template, mask)}
+    rng = np.random.default_rng(trial)
+    screen = clicker.synthetic_screen(1280, 720, rng)
+    x, y = int(rng.integers(0, 1280 - 120)), int(rng.integers(0, 720 - 32))
+    screen[y:y + 32, x:x + 120] = button(trial + 1)
+    empty = clicker.synthetic_screen(1280, 720, rng)
+    
+    plain_val = clicker.PyramidMatcher.exhaustive_match(screen, template)[0]
+    masked_val, masked_loc = clicker.PyramidMatcher.exhaustive_match(screen, template, mask)
+    empty_val = clicker.PyramidMatcher.exhaustive_match(empty, template, mask)[0]
+    assert masked_val > THRESHOLD and masked_loc == (x, y) and masked_val > plain_val
+    assert np.isfinite(empty_val) and empty_val < THRESHOLD
+    
+    matcher = clicker.PyramidMatcher()
+    matcher.begin_frame()
+    fast_val, fast_loc = matcher.match(screen, template_info, THRESHOLD)
+    assert fast_loc == masked_loc and fast_val == pytest.approx(masked_val, abs=1e-4)
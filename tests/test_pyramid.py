@@ -0,0 +1,35 @@
+"""金字塔匹配：命中判断和坐标必须与全量匹配一致"""
+import numpy as np
+import pytest
+
+THRESHOLD = 0.8
+
+
+@pytest.fixture(scope='module')
+def templates(clicker):
+    templates = clicker.load_template_images(clicker.bundled_template_paths())
+    assert templates, "没有找到可用于校验的模板图片"
+    return templates
+
+
+@pytest.mark.parametrize('trial', range(20))
+def test_pyramid_matches_exhaustive(clicker, templates, trial):
+    rng = np.random.default_rng(trial)
+    screen = clicker.synthetic_screen(1920, 1080, rng)
+    
+    # 偶数轮在随机位置放入一个模板，奇数轮不放（校验未命中时也一致）
+    if trial % 2 == 0:
+        planted = templates[(trial // 2) % len(templates)]['image']
+        th, tw = planted.shape[:2]
+        x = int(rng.integers(0, screen.shape[1] - tw))
+        y = int(rng.integers(0, screen.shape[0] - th))
+        screen[y:y + th, x:x + tw] = planted
+        
+    matcher = clicker.PyramidMatcher()
+    for template_info in templates:
+        exact_val, exact_loc = clicker.PyramidMatcher.exhaustive_match(screen, template_info['image'])
+        fast_val, fast_loc = matcher.match(screen, template_info, THRESHOLD)
+        assert (fast_val > THRESHOLD) == (exact_val > THRESHOLD), template_info['name']
+        if exact_val > THRESHOLD:
+            assert fast_loc == exact_loc, template_info['name']
+            assert fast_val == pytest.approx(exact_val, abs=1e-4), template_info['name']
@@ -0,0 +1,22 @@
+"""区域缓存：命中后在邻域内搜索，邻域第一次未命中就移除缓存"""
+
+
+def test_miss_evicts_entry(clicker):
+    cache = clicker.RoiCache(margin=10)
+    key = ('button.png', 1.0)
+    cache.store(key, (100, 50), (40, 20))
+    assert cache.lookup(key, (720, 1280)) == (90, 40, 150, 80)
+    
+    cache.record(key, True)
+    assert key in cache.entries
+    cache.record(key, False)
+    assert key not in cache.entries and cache.lookup(key, (720, 1280)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_entry_is_dropped(clicker):
+    cache = clicker.RoiCache(ttl=0)
+    key = ('button.png', 1.0)
+    cache.store(key, (100, 50), (40, 20))
+    cache.entries[key] = cache.entries[key][:4] + (0.0,)
+    assert cache.lookup(key, (720, 1280)) is None and key not in cache.entries
@@ -0,0 +1,18 @@
+"""采样调度：CPU 预算只按监听线程消耗的 CPU 时间计算"""
+import time
+
+
+def test_waiting_does_not_count_against_cpu_budget(clicker):
+    scheduler = clicker.PollScheduler(min_interval=0.05, cpu_budget=0.1)
+    scheduler.begin_tick()
+    time.sleep(0.2)  # 模拟截图 I/O 或点击确认的轮询休眠
+    assert scheduler.delay() < 0.5
+
+
+def test_busy_tick_is_throttled_by_cpu_budget(clicker):
+    scheduler = clicker.PollScheduler(min_interval=0.05, cpu_budget=0.5)
+    scheduler.begin_tick()
+    started = time.thread_time()
+    while time.thread_time() - started < 0.1:
+        pass
+    assert scheduler.delay() >= 0.09